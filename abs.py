@@ -6,13 +6,57 @@
 
 import os
 import sys
+import argparse
 from pprint import pprint
 import time
 
 # append the core directory to the path so we can import from it
-sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), 'abs\\core\\')))
-from abs.core.helpers import Helpers
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), 'abs', 'core')))
 from abs.core.depends import Depends
+from abs.core.batch import BatchBuilder
+from abs.core.package import Packager
+from abs.core.watch import WatchSession
+# imported the same way the core modules import them, so they share one profiler and one interactive switch
+from helpers import Helpers
+from profiler import Profiler
+
+
+def resolve_depends(dp: Depends) -> None:
+    """
+    Loads the dependencies from the config, or finds them and writes the config on the first run.
+    """
+    print("[Checking Config]\n")
+    conf = dp.read_config() if dp.cfg_path else None
+    if conf is not None:
+        dp.depend_paths = conf['DEPENDS']
+
+        # a stat per dependency confirms nothing was upgraded or removed since the config was written
+        with Profiler.span("verify fingerprints"):
+            if dp.verify_fingerprints(conf.get('FINGERPRINTS', {})):
+                dp.write_config()
+        pprint(dp.depend_paths)
+
+    else:
+        print("No config found. Starting first time startup procedure...\n\n[Checking Dependencies]\n")
+
+        # probe every dependency at once, results are printed in this order
+        with Profiler.span("check dependencies"):
+            dp.check_depends([
+                ("git --version", "Git", dp.GIT_URL),
+                ("windeployqt.exe --version", "Qt", dp.QT_URL),
+                (["openssl", "version"], "OpenSSL", dp.OSSL_URL),
+                ("node --version", "NodeJS", dp.NODEJS_URL),
+                ("ffmpeg --version", "FFMpeg", dp.FFMPEG_URL),
+                ("mpv placeholder", "MPV", dp.LIBMPV_URL),
+                ("vs placeholder", "VS_Community", dp.VSCOMM_URL),
+                ("cmake --version", "CMake", dp.CMAKE_URL),
+            ])
+
+        print("\n[Checking Dependencies Complete]")
+
+        # Write to config
+        dp.record_fingerprints()
+        dp.write_config()
 
 
 def main():
@@ -20,50 +64,17 @@ def main():
     print("------------------------------ [Automatic Build Script for Stremio] ------------------------------")
 
     try:
-        dp = Depends()
-
-        print("[Checking Config]\n")
-        if dp.cfg_path:
-            dp.depend_paths = dp.read_config()['DEPENDS']
-            pprint(dp.depend_paths)
-
-        else:
-            print("No config found. Starting first time startup procedure...\n\n[Checking Dependencies]\n")
-
-            # check git
-            dp.check_depend("git --version", "Git", dp.GIT_URL)
-
-            # check qt
-            dp.check_depend("windeployqt.exe --version", "Qt", dp.QT_URL)
-
-            # check openssl
-            dp.check_depend(["openssl", "version"], "OpenSSL", dp.OSSL_URL)
-
-            # check nodejs
-            dp.check_depend("node --version", "NodeJS", dp.NODEJS_URL)
-
-            # check ffmpeg
-            dp.check_depend("ffmpeg --version", "FFMpeg", dp.FFMPEG_URL)
-
-            # check libmpv
-            dp.check_depend("mpv placeholder", "MPV", dp.LIBMPV_URL)
+        with Profiler.span("startup"):
+            dp = Depends()
 
-            # check visual studio 2017
-            dp.check_depend("vs placeholder", "VS_Community", dp.VSCOMM_URL)
-
-            # check cmake
-            dp.check_depend("cmake --version", "CMake", dp.CMAKE_URL)
-
-            print("\n[Checking Dependencies Complete]")
-
-            # Write to config
-            dp.write_config()
+        resolve_depends(dp)
         
         print("\n[Config Complete]\n")
         ynp = Helpers.yes_no_prompt("Build Stremio?")
         
         if ynp:
-            dp.build_stremio()
+            with Profiler.span("build"):
+                dp.build_stremio()
             # print("Stremio built successfully.")
             # time.sleep(2)
             # main()
@@ -77,5 +88,124 @@ def main():
             time.sleep(2)
             main()
 
+
+def batch(manifest_path: str, jobs: int = None, results_path: str = 'abs/batch-results.json') -> int:
+    """
+    Builds every entry of a manifest without prompting, see BatchBuilder.load_manifest for the format.
+
+    Returns:
+        int: The exit code, 0 if every build succeeded, 1 if any failed and 2 if the manifest is invalid.
+    """
+    Helpers.interactive = False
+    print("------------------------------ [Automatic Build Script for Stremio: Batch] ------------------------------")
+
+    try:
+        manifest = BatchBuilder.load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"Error! Could not read the manifest {manifest_path}: {e}")
+        return 2
+
+    # the toolchain is resolved once and shared by every build
+    with Profiler.span("startup"):
+        dp = Depends()
+    resolve_depends(dp)
+
+    builder = BatchBuilder(dp, manifest['builds'], workers=jobs or manifest.get('workers', 2),
+                           workspace=manifest.get('workspace', 'abs/batch'))
+    with Profiler.span("batch"):
+        results = builder.run()
+
+    BatchBuilder.write_results(results, results_path)
+    print(f"\n[Batch Complete] {sum(r['status'] == 'ok' for r in results)}/{len(results)} builds succeeded. Results written to {results_path}")
+    return 0 if all(r['status'] == 'ok' for r in results) else 1
+
+
+def watch(src_dir: str = "stremio-shell", poll: bool = False, debounce: float = 0.3) -> int:
+    """
+    Rebuilds and restages the shell whenever its sources change, until interrupted. Nothing is prompted for.
+
+    Returns:
+        int: The exit code, always 0 as watching only ends with Ctrl+C.
+    """
+    Helpers.interactive = False
+    print("------------------------------ [Automatic Build Script for Stremio: Watch] ------------------------------")
+
+    with Profiler.span("startup"):
+        dp = Depends()
+    resolve_depends(dp)
+
+    try:
+        WatchSession(dp, src_dir, debounce=debounce, poll=poll).run()
+    except KeyboardInterrupt:
+        print("\n[Watch Stopped]")
+    return 0
+
+
+def apply_delta(delta: str, base_dir: str, out_dir: str = None) -> int:
+    """
+    Rebuilds a package from the package before it and a delta, without the toolchain.
+
+    Returns:
+        int: The exit code, 0 if the package was rebuilt and 1 if it could not be.
+    """
+    out_dir = out_dir or base_dir
+    print(f"Applying {delta} to {base_dir}...")
+    try:
+        with Profiler.span("apply delta"):
+            stats = Packager.apply_delta(delta, base_dir, out_dir)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error! Could not apply the delta: {e}")
+        return 1
+
+    print(f"Rebuilt {stats['files']} files in {out_dir}, removed {stats['removed']}.")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Automatic Build Script for Stremio")
+    parser.add_argument("--profile", nargs='?', const='abs/profile.json', default=None, metavar="TRACE",
+                        help="time every phase and write a Chrome trace (default: abs/profile.json) and a summary")
+    parser.add_argument("--batch", metavar="MANIFEST", help="build every entry of a JSON manifest without prompting")
+    parser.add_argument("--jobs", type=int, default=None, help="builds to run at once in batch mode (default: the manifest's workers, or 2)")
+    parser.add_argument("--results", default='abs/batch-results.json', help="where batch mode writes its results (default: abs/batch-results.json)")
+    parser.add_argument("--watch", nargs='?', const="stremio-shell", default=None, metavar="SRC_DIR",
+                        help="rebuild and restage whenever the sources change (default: stremio-shell)")
+    parser.add_argument("--poll", action='store_true', help="in watch mode, poll for changes even where inotify is available")
+    parser.add_argument("--debounce", type=float, default=0.3, help="in watch mode, seconds of quiet before rebuilding (default: 0.3)")
+    parser.add_argument("--verify-hashes", action='store_true',
+                        help="also check the SHA-256 of every dependency on startup, not only its size and mtime (or set ABS_FINGERPRINT_HASH=1)")
+    parser.add_argument("--apply-delta", metavar="DELTA", help="rebuild a package from the one before it and a delta, then exit")
+    parser.add_argument("--base", metavar="DIR", help="the unpacked package the delta was made against")
+    parser.add_argument("--out", metavar="DIR", default=None, help="where to rebuild the package (default: update --base in place)")
+    return parser.parse_args(argv)
+
+
 if __name__ == '__main__':
-    main()
+    args = parse_args()
+    if args.profile:
+        Profiler.enable()
+    if args.verify_hashes:
+        # read by every Depends, whichever mode creates it
+        os.environ['ABS_FINGERPRINT_HASH'] = '1'
+
+    code = 0
+    try:
+        if args.apply_delta:
+            if not args.base:
+                print("Error! --apply-delta needs --base, the unpacked package the delta was made against.")
+                code = 2
+            else:
+                code = apply_delta(args.apply_delta, args.base, args.out)
+        elif args.watch:
+            code = watch(args.watch, args.poll, args.debounce)
+        elif args.batch:
+            code = batch(args.batch, args.jobs, args.results)
+        else:
+            main()
+    finally:
+        if args.profile:
+            Profiler.write_trace(args.profile)
+            print(f"\n[Profile] Trace written to {args.profile}\n")
+            Profiler.summary()
+
+    sys.exit(code)
@@ -0,0 +1,172 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import re
+import json
+import time
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+
+from profiler import Profiler
+
+
+@dataclass
+class BuildSpec:
+    """
+    One build listed in a batch manifest.
+    """
+    name: str
+    ref: Optional[str] = None
+    out: str = ""
+
+
+class BatchBuilder:
+    def __init__(self, depends, builds: List[BuildSpec], workers: int = 2, workspace: str = 'abs/batch'):
+        """
+        Builds several Stremio versions in one run, sharing one resolved toolchain, one captured
+        build environment, the local git mirror and the artifact cache between them.
+
+        Args:
+            depends (Depends): The resolved dependencies, shared by every build.
+            builds (list): The builds to run.
+            workers (int): The maximum number of builds running at once.
+            workspace (str): Where the checkouts of each build are kept.
+        """
+        self.depends = depends
+        self.builds = builds
+        self.workers = workers
+        self.workspace = workspace
+
+
+    @staticmethod
+    def load_manifest(path: str) -> dict:
+        """
+        Reads a batch manifest, ie.
+
+            {
+                "workers": 2,
+                "builds": [
+                    {"name": "4.4.159", "ref": "v4.4.159", "out": "dist/4.4.159"},
+                    {"name": "master", "ref": "master", "out": "dist/master"}
+                ]
+            }
+
+        Args:
+            path (str): The manifest file.
+        Returns:
+            dict: The manifest, with its builds as BuildSpecs.
+        Raises:
+            ValueError: If the manifest is malformed.
+        """
+        with open(path) as f:
+            manifest = json.load(f)
+
+        builds, names = [], set()
+        for entry in manifest.get('builds', []):
+            if not isinstance(entry, dict) or not entry.get('name'):
+                raise ValueError(f"Every build in {path} needs a name: {entry}")
+            if entry['name'] in names:
+                raise ValueError(f"Build {entry['name']} is listed twice in {path}")
+
+            names.add(entry['name'])
+            builds.append(BuildSpec(name=entry['name'], ref=entry.get('ref'), out=entry.get('out') or os.path.join('dist', BatchBuilder.safe_name(entry['name']))))
+
+        if not builds:
+            raise ValueError(f"No builds listed in {path}")
+
+        manifest['builds'] = builds
+        return manifest
+
+
+    def prepare(self) -> None:
+        """
+        Does the work every build shares, once, before any of them start.
+        """
+        # fetched once here, every checkout is then made from the mirror without the network
+        try:
+            self.depends.git_mirror().update()
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"(!) Could not update the git mirror: {e}")
+
+        # captured once here, every build then reuses the environment held in memory
+        if self.depends.depend_paths.get('vs_community') and os.path.exists(self.depends.depend_paths['vs_community']):
+            self.depends.toolchain_env().load()
+
+
+    @staticmethod
+    def safe_name(name: str) -> str:
+        return re.sub(r'[^\w.-]', '_', name)
+
+
+    def src_dir(self, spec: BuildSpec) -> str:
+        return os.path.join(self.workspace, 'src', self.safe_name(spec.name))
+
+
+    def build_one(self, spec: BuildSpec) -> dict:
+        """
+        Runs a single build of the batch.
+
+        Returns:
+            dict: The outcome of the build and of each of its steps.
+        """
+        start = time.perf_counter()
+        print(f"[{spec.name}] Building {spec.ref or 'default branch'} into {spec.out}...")
+
+        with Profiler.span(f"batch {spec.name}", 'batch'):
+            steps = self.depends.build_graph(self.src_dir(spec), spec.out, spec.ref).run()
+
+        failed = any(step['status'] in ('failed', 'blocked') for step in steps.values())
+        print(f"[{spec.name}] {'FAILED' if failed else 'OK'}")
+
+        return {
+            'name': spec.name,
+            'ref': spec.ref,
+            'out': spec.out,
+            'status': 'failed' if failed else 'ok',
+            'elapsed': round(time.perf_counter() - start, 3),
+            'steps': {
+                name: {
+                    'status': step['status'],
+                    'elapsed': round(step['elapsed'], 3),
+                    **({'error': str(step['error'])} if step.get('error') else {})
+                }
+                for name, step in steps.items()
+            }
+        }
+
+
+    def run(self) -> List[dict]:
+        """
+        Runs every build, at most self.workers at once.
+
+        Returns:
+            list: The outcome of each build, in manifest order.
+        """
+        self.prepare()
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(self.builds)))) as pool:
+            return list(pool.map(self.build_one, self.builds))
+
+
+    @staticmethod
+    def write_results(results: List[dict], path: str) -> None:
+        """
+        Writes the outcome of a batch as JSON, for whatever started it.
+        """
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        summary = {
+            'ok': all(result['status'] == 'ok' for result in results),
+            'builds': results
+        }
+
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(summary, f, indent=4)
+        os.replace(tmp, path)
@@ -0,0 +1,710 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import shutil
+import zipfile
+import platform
+import subprocess
+import tempfile
+import threading
+import contextlib
+import statistics
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+from typing import Callable, Dict, List, Optional
+
+from helpers import Helpers
+from discovery import DiscoveryIndex
+from stage import Stager
+from nativebuild import CMakeBuild
+from package import Packager
+from deploycache import DeployCache
+from remotecache import RemoteCache
+
+
+class PayloadHandler(BaseHTTPRequestHandler):
+    """
+    Serves synthetic payloads from memory, ie. GET /16777216 returns 16 MiB, with Range support.
+    Faults are injected through the query string: delay=<seconds> before answering, cut=<bytes>
+    to drop the connection after that many bytes, stall=<bytes> to stop sending after that many.
+    """
+    protocol_version = 'HTTP/1.1'
+    payloads = {}
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+    def payload(self) -> Optional[bytes]:
+        match = re.match(r'^/(\d+)(\.\w+)?$', self.path.split('?')[0])
+        if not match:
+            return None
+
+        size = int(match.group(1))
+        if size not in self.payloads:
+            # the same bytes on every request, whichever thread generates them first
+            block = random.Random(0).randbytes(1024 * 1024)
+            self.payloads[size] = (block * (size // len(block) + 1))[:size]
+        return self.payloads[size]
+
+
+    def respond(self, body: bool) -> None:
+        data = self.payload()
+        if data is None:
+            self.send_error(404)
+            return
+
+        query = dict(parse_qsl(urlsplit(self.path).query))
+        time.sleep(float(query.get('delay', 0)))
+
+        start, end, code = 0, len(data) - 1, 200
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start, code = int(match.group(1)), 206
+            end = int(match.group(2)) if match.group(2) else end
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/octet-stream')
+        if 'chunked' in query:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if code == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+        self.end_headers()
+
+        if not body:
+            return
+
+        # no Content-Length, the body is sent in chunks
+        if 'chunked' in query:
+            for i in range(start, end + 1, 1024 * 1024):
+                part = memoryview(data)[i:min(i + 1024 * 1024, end + 1)]
+                self.wfile.write(f"{len(part):x}\r\n".encode())
+                self.wfile.write(part)
+                self.wfile.write(b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        limit = int(query.get('cut', query.get('stall', end - start + 1)))
+        self.wfile.write(memoryview(data)[start:start + min(limit, end - start + 1)])
+        if 'stall' in query:
+            self.wfile.flush()
+            time.sleep(5)
+        if 'cut' in query or 'stall' in query:
+            self.close_connection = True
+
+
+    def do_HEAD(self) -> None:
+        self.respond(body=False)
+
+
+    def do_GET(self) -> None:
+        self.respond(body=True)
+
+
+class CacheHandler(BaseHTTPRequestHandler):
+    """
+    Stands in for a remote build cache: stores whatever is PUT in memory and serves it back on GET.
+    """
+    protocol_version = 'HTTP/1.1'
+    store = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+    def respond(self, body: bool) -> None:
+        with self.lock:
+            data = self.store.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if body:
+            self.wfile.write(data)
+
+
+    def do_HEAD(self) -> None:
+        self.respond(body=False)
+
+
+    def do_GET(self) -> None:
+        self.respond(body=True)
+
+
+    def do_PUT(self) -> None:
+        if 'Content-Length' not in self.headers:
+            self.send_error(411)
+            return
+
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        with self.lock:
+            self.store[self.path] = data
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class LocalServer:
+    def __init__(self, handler=PayloadHandler):
+        """
+        A throwaway HTTP server on a free localhost port, running in a background thread.
+        """
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        return False
+
+
+class Benchmarks:
+    MB = 1024 * 1024
+
+    #  The cheapest real run of abs.py: everything it imports, then argparse prints and exits
+    STARTUP_ARGS = ['abs.py', '--help']
+
+    #  The most abs.py may spend importing, in milliseconds
+    IMPORT_BUDGET_MS = 150.0
+
+    #  Modules only the download and extract paths need, which must not be loaded at startup
+    HEAVY_MODULES = ['requests', 'tqdm', 'py7zr', 'ctypes']
+
+    def __init__(self, repeat: int = 3, quick: bool = False):
+        """
+        Offline benchmarks of the download, extract, discover and stage hot paths.
+
+        Args:
+            repeat (int): How many times each case runs, the median is reported.
+            quick (bool): Use smaller payloads, for a fast smoke run.
+        """
+        self.repeat = repeat
+        self.sizes = [1 * self.MB, 8 * self.MB] if quick else [1 * self.MB, 16 * self.MB, 64 * self.MB]
+        self.tree_roots = 2 if quick else 4
+        self.tree_width = 20 if quick else 60
+        self.results: Dict[str, dict] = {}
+
+
+    @staticmethod
+    @contextlib.contextmanager
+    def quiet():
+        """
+        Silences progress bars and prints while a case is being timed.
+        """
+        sink = io.StringIO()
+        with contextlib.redirect_stdout(sink), contextlib.redirect_stderr(sink):
+            yield
+
+
+    def measure(self, name: str, fn: Callable[[], None], nbytes: int = 0, setup: Optional[Callable[[], None]] = None) -> dict:
+        """
+        Times a case, returning the median of self.repeat runs.
+
+        Args:
+            name (str): The name of the case.
+            fn (callable): The work to time.
+            nbytes (int): The bytes processed per run, to report a throughput.
+            setup (callable): Run before each run, untimed.
+        Returns:
+            dict: The result of the case.
+        """
+        times, cpu = [], []
+        for _ in range(self.repeat):
+            if setup: setup()
+            with self.quiet():
+                start, cpu_start = time.perf_counter(), time.process_time()
+                fn()
+                times.append(time.perf_counter() - start)
+                cpu.append(time.process_time() - cpu_start)
+
+        result = {'seconds': statistics.median(times), 'min': min(times), 'runs': len(times), 'cpu_seconds': statistics.median(cpu)}
+        if nbytes:
+            result['mb_per_sec'] = round(nbytes / result['seconds'] / self.MB, 2)
+            result['cpu_sec_per_gb'] = round(result['cpu_seconds'] / nbytes * 1024 ** 3, 3)
+
+        self.results[name] = result
+        rate = f"{result['mb_per_sec']:>10.1f} MB/s {result['cpu_sec_per_gb']:>8.2f} cpu s/GB" if nbytes else ""
+        print(f"{name:<40} {result['seconds']:>9.4f}s {rate}")
+        return result
+
+
+    def bench_download(self, workdir: str) -> None:
+        out = os.path.join(workdir, 'download', '')
+        os.makedirs(out, exist_ok=True)
+
+        with LocalServer() as server:
+            for size in self.sizes:
+                url = f"{server.url}/{size}"
+                label = f"{size // self.MB}MB"
+                self.measure(f"download_file {label}", lambda: Helpers.download_file(url, 'payload.bin', out_path=out), size)
+                self.measure(f"download_file {label} segments=4", lambda: Helpers.download_file(url, 'payload.bin', out_path=out, segments=4), size)
+                self.measure(f"basic_download {label}", lambda: Helpers.basic_download(url, 'payload.bin', out_path=out), size)
+                self.measure(f"download_file {label} unknown length", lambda: Helpers.download_file(f"{url}?chunked=1", 'payload.bin', out_path=out), size)
+
+            # three mirrors: slow to answer, dropping the connection halfway and stalling halfway
+            size = self.sizes[-1]
+            expected = hashlib.sha256(PayloadHandler.payloads[size]).hexdigest()
+            mirrors = [f"{server.url}/{size}?delay=0.2", f"{server.url}/{size}?cut={size // 2}", f"{server.url}/{size}?stall={size // 3}"]
+
+            def failover(segments: int):
+                hasher = hashlib.sha256()
+                Helpers.download_file(mirrors[1], 'payload.bin', out_path=out, segments=segments, hasher=hasher, mirrors=[mirrors[2], mirrors[0]])
+                if hasher.hexdigest() != expected or Helpers.hash_file(os.path.join(out, 'payload.bin'), hashlib.sha256()).hexdigest() != expected:
+                    raise RuntimeError("Mirror failover produced a corrupt file")
+
+            timeout, Helpers.TIMEOUT = Helpers.TIMEOUT, (2, 0.5)
+            try:
+                self.measure(f"download_file {size // self.MB}MB 3 faulty mirrors", lambda: failover(1), size)
+                self.measure(f"download_file {size // self.MB}MB 3 faulty mirrors segments=4", lambda: failover(4), size)
+            finally:
+                Helpers.TIMEOUT = timeout
+
+
+    def make_tree(self, root: str, files: int, size: int) -> int:
+        """
+        Writes a directory of half-compressible files, returning the total size.
+        """
+        noise = os.urandom(size // 2)
+        for i in range(files):
+            sub = os.path.join(root, 'ffmpeg', 'bin' if i % 4 == 0 else 'doc')
+            os.makedirs(sub, exist_ok=True)
+            with open(os.path.join(sub, f"file{i}.dll"), 'wb') as f:
+                f.write(noise[i:] + bytes(size - len(noise)) + noise[:i])
+        return files * size
+
+
+    def bench_extract(self, workdir: str) -> None:
+        src = os.path.join(workdir, 'archive-src')
+        total = self.make_tree(src, 16, self.sizes[-1] // 16)
+        out = os.path.join(workdir, 'extract', '')
+        os.makedirs(out, exist_ok=True)
+
+        archives = {}
+        archives['zip'] = os.path.join(workdir, 'synthetic.zip')
+        with zipfile.ZipFile(archives['zip'], 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+            for root, _, files in os.walk(src):
+                for name in files:
+                    zf.write(os.path.join(root, name), os.path.relpath(os.path.join(root, name), src))
+
+        try:
+            import py7zr
+            archives['7z'] = os.path.join(workdir, 'synthetic.7z')
+            with py7zr.SevenZipFile(archives['7z'], 'w', filters=[{'id': py7zr.FILTER_LZMA2, 'preset': 1}]) as sz:
+                sz.writeall(os.path.join(src, 'ffmpeg'), 'ffmpeg')
+        except ImportError:
+            print("(!) py7zr not installed, skipping 7z extraction.")
+
+        for kind, archive in archives.items():
+            name = os.path.basename(archive)
+
+            def setup():
+                shutil.rmtree(os.path.join(out, name.rsplit('.', 1)[0]), ignore_errors=True)
+                shutil.copyfile(archive, os.path.join(out, name))
+
+            self.measure(f"install_file {kind}", lambda: Helpers.install_file(name, True, out_path=out), total, setup)
+            self.measure(f"install_file {kind} members=*/bin/*", lambda: Helpers.install_file(name, True, out_path=out, members=['*/bin/*']), total, setup)
+
+        # the same archives downloaded then extracted, against extracted as they stream in
+        with LocalServer() as server:
+            for kind, archive in archives.items():
+                name = os.path.basename(archive)
+                with open(archive, 'rb') as f:
+                    data = f.read()
+                PayloadHandler.payloads[len(data)] = data
+                url = f"{server.url}/{len(data)}.{kind}"
+                extracted = os.path.join(out, name.rsplit('.', 1)[0])
+
+                def clean():
+                    shutil.rmtree(extracted, ignore_errors=True)
+
+                def download_then_install():
+                    Helpers.download_file(url, name, out_path=out)
+                    Helpers.install_file(name, True, out_path=out)
+
+                def streamed():
+                    Helpers.download_file(url, name, out_path=out, extract=True, keep_archive=False)
+                    if sum(len(files) for _, _, files in os.walk(extracted)) != 16:
+                        raise RuntimeError(f"Streamed extraction of {name} is incomplete")
+
+                self.measure(f"download+install_file {kind}", download_then_install, total, clean)
+                self.measure(f"download_file {kind} extract streamed", streamed, total, clean)
+
+
+    def bench_discover(self, workdir: str) -> None:
+        roots = []
+        for r in range(self.tree_roots):
+            root = os.path.join(workdir, 'drives', f"drive{r}")
+            roots.append(root)
+            for d in ('Program Files', 'Program Files (x86)', 'Qt\\Qt5.12.7\\5.12.7', 'Windows'):
+                for i in range(self.tree_width):
+                    os.makedirs(os.path.join(root, *d.split('\\'), f"Vendor{i}", 'bin'), exist_ok=True)
+
+        # one drive has everything installed
+        for rel in ('Program Files/Git/cmd/git.exe', 'Program Files (x86)/OpenSSL-Win32/bin/openssl.exe',
+                    'Program Files/nodejs/node.exe', 'Program Files/CMake/bin/cmake.exe',
+                    'Qt/Qt5.12.7/5.12.7/msvc2017/bin/windeployqt.exe'):
+            path = os.path.join(roots[-1], *rel.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+
+        patterns = {
+            "Git": ["Program Files\\Git\\cmd\\git.exe"],
+            "Qt": ["Qt\\Qt5.12.7\\5.12.7\\msvc*\\bin\\windeployqt.exe"],
+            "OpenSSL": ["Program Files (x86)\\OpenSSL-Win*\\bin\\openssl.exe"],
+            "NodeJS": ["Program Files\\nodejs\\node.exe"],
+            "MPV": ["Program Files\\MPV\\bin\\mpv.exe"],
+            "CMake": ["Program Files\\CMake\\bin\\cmake.exe"]
+        }
+        index_path = os.path.join(workdir, 'discovery.json')
+
+        # what check_path used to do: a glob per dependency per drive
+        import glob
+        def per_pattern_glob():
+            for root in roots:
+                for globs in patterns.values():
+                    for pattern in globs:
+                        glob.glob(os.path.join(root, *DiscoveryIndex.split(pattern)))
+
+        self.measure("discover glob per dependency", per_pattern_glob)
+        self.measure("discover index cold", lambda: DiscoveryIndex(roots, patterns, index_path).load(refresh=True))
+        self.measure("discover index warm", lambda: DiscoveryIndex(roots, patterns, index_path).load())
+
+
+    def bench_stage(self, workdir: str) -> None:
+        src = os.path.join(workdir, 'stage-src')
+        total = self.make_tree(src, 24, self.sizes[-1] // 24)
+        dist = os.path.join(workdir, 'dist')
+
+        def plan(mode: str = 'copy') -> Stager:
+            stager = Stager(dist, mode=mode)
+            stager.add_tree(src, '.')
+            return stager
+
+        def touch_one():
+            with open(os.path.join(src, 'ffmpeg', 'bin', 'file0.dll'), 'r+b') as f:
+                f.write(os.urandom(16))
+
+        self.measure("stage copytree (old path)", lambda: shutil.copytree(src, dist), total, lambda: shutil.rmtree(dist, ignore_errors=True))
+        self.measure("stage cold", lambda: plan().stage(), total, lambda: shutil.rmtree(dist, ignore_errors=True))
+        self.measure("stage warm, nothing changed", lambda: plan().stage())
+        self.measure("stage warm, one file changed", lambda: plan().stage(), setup=touch_one)
+        self.measure("stage cold hardlink", lambda: plan('hardlink').stage(), total, lambda: shutil.rmtree(dist, ignore_errors=True))
+
+
+    def bench_package(self, workdir: str) -> None:
+        dist = os.path.join(workdir, 'dist')
+        total = self.make_tree(dist, 24, self.sizes[-1] // 24)
+        out = os.path.join(workdir, 'packages')
+        count = iter(range(1_000_000))
+
+        def fresh():
+            shutil.rmtree(out, ignore_errors=True)
+
+        def rebuild_exe():
+            # a new stremio.exe on top of unchanged DLLs, the usual difference between two builds
+            with open(os.path.join(dist, 'stremio.exe'), 'wb') as f:
+                f.write(os.urandom(2 * self.MB) + str(next(count)).encode())
+
+        rebuild_exe()
+        total += 2 * self.MB
+        self.measure("package 1 thread", lambda: Packager(dist, out, threads=1).package('bench'), total, fresh)
+        self.measure("package all threads", lambda: Packager(dist, out).package('bench'), total, fresh)
+        self.measure("package + delta, exe changed", lambda: Packager(dist, out).package('bench'), total, rebuild_exe)
+
+        latest = Packager(dist, out).load_latest()
+        delta = os.path.join(out, latest['delta'])
+        print(f"{'delta size':<40} {os.path.getsize(delta) / self.MB:>8.2f}MB of {os.path.getsize(os.path.join(out, latest['package'])) / self.MB:.2f}MB")
+
+        # the tester's side, the latest package unpacked, and a delta from it to the next build (older packages are pruned)
+        base = Packager.unpack(os.path.join(out, latest['package']), os.path.join(workdir, 'base'))
+        rebuild_exe()
+        latest = Packager(dist, out).package('bench')
+        delta = os.path.join(out, latest['delta'])
+        rebuilt = os.path.join(workdir, 'rebuilt')
+
+        self.measure("apply delta", lambda: Packager.apply_delta(delta, base, rebuilt), total, lambda: shutil.rmtree(rebuilt, ignore_errors=True))
+        if Packager.manifest_id(Packager(rebuilt, out).manifest()) != latest['id']:
+            raise AssertionError("the tree rebuilt from the delta does not match the package")
+
+
+    def bench_remote(self, workdir: str) -> None:
+        dist = os.path.join(workdir, 'dist')
+        total = self.make_tree(dist, 24, self.sizes[-1] // 24)
+        pulled = os.path.join(workdir, 'pulled')
+        expected = Packager.manifest_id(Packager(dist, workdir).manifest())
+        key = RemoteCache.key({'rev': 'bench', 'server.js': '4.4.159', 'toolchain': {'qt': '5.12.7'}})
+
+        with LocalServer(CacheHandler) as server:
+            cache = RemoteCache(f"{server.url}/stremio")
+            self.measure("remote lookup miss", lambda: cache.lookup('0' * 64))
+            self.measure("remote push", lambda: cache.push(key, dist), total, CacheHandler.store.clear)
+            self.measure("remote push, package stored", lambda: cache.push(key, dist), total)
+            self.measure("remote pull", lambda: cache.pull(key, pulled), total, lambda: shutil.rmtree(pulled, ignore_errors=True))
+            self.measure("remote pull over a build", lambda: cache.pull(key, pulled), total)
+
+        if Packager.manifest_id(Packager(pulled, workdir).manifest()) != expected:
+            raise AssertionError("the build pulled from the cache does not match the one pushed")
+        CacheHandler.store.clear()
+
+
+    #  Stands in for windeployqt, copying a fake Qt install next to the exe it is given
+    DEPLOY_STUB = """
+import os, sys, shutil
+qt, exe = sys.argv[1], sys.argv[-1]
+shutil.copytree(qt, os.path.dirname(exe), dirs_exist_ok=True)
+"""
+
+    def bench_deploy(self, workdir: str) -> None:
+        qt = os.path.join(workdir, 'qt')
+        total = self.make_tree(qt, 40, self.sizes[-1] // 40)
+        stub = os.path.join(workdir, 'windeployqt_stub.py')
+        with open(stub, 'w') as f:
+            f.write(self.DEPLOY_STUB)
+
+        src = os.path.join(workdir, 'src')
+        os.makedirs(src, exist_ok=True)
+        with open(os.path.join(src, 'main.qml'), 'w') as f:
+            f.write("import QtQuick 2.7\nItem {}\n")
+
+        dist = os.path.join(workdir, 'dist')
+        cache = os.path.join(workdir, 'cache')
+
+        def deployer() -> DeployCache:
+            return DeployCache([sys.executable, stub, qt], dist, exe_name='stremio.exe', qml_dir=src, cache_root=cache, args=["{exe}"])
+
+        def fresh_dist(clear_cache: bool = False):
+            shutil.rmtree(dist, ignore_errors=True)
+            if clear_cache: shutil.rmtree(cache, ignore_errors=True)
+            os.makedirs(dist)
+            with open(os.path.join(dist, 'stremio.exe'), 'wb') as f:
+                f.write(b'MZ not really an exe')
+
+        self.measure("deploy, tool run and recorded", lambda: deployer().deploy(), total, lambda: fresh_dist(True))
+        self.measure("deploy, replayed into a clean dist", lambda: deployer().deploy(), total, fresh_dist)
+        self.measure("deploy, replayed, nothing changed", lambda: deployer().deploy())
+
+        with self.quiet():
+            replayed = deployer().deploy()
+        if not replayed:
+            raise AssertionError("the deployment was not replayed from the cache")
+        for root, _, files in os.walk(qt):
+            for name in files:
+                if not os.path.exists(os.path.join(dist, os.path.relpath(os.path.join(root, name), qt))):
+                    raise AssertionError(f"{name} is missing from the replayed deployment")
+
+
+    def make_cmake_project(self, root: str, units: int) -> None:
+        """
+        Writes a small C project with one source file per unit.
+        """
+        os.makedirs(root, exist_ok=True)
+        sources = []
+        for i in range(units):
+            sources.append(f"unit{i}.c")
+            with open(os.path.join(root, f"unit{i}.c"), 'w') as f:
+                f.write(f"int unit{i}(int x) {{ int s = 0; for (int j = 0; j < x; j++) s += j * {i + 1}; return s; }}\n")
+
+        with open(os.path.join(root, 'main.c'), 'w') as f:
+            f.write(''.join(f"int unit{i}(int);\n" for i in range(units)))
+            f.write("int main(void) { return " + " + ".join(f"unit{i}(0)" for i in range(units)) + "; }\n")
+
+        with open(os.path.join(root, 'CMakeLists.txt'), 'w') as f:
+            f.write(f"cmake_minimum_required(VERSION 3.10)\nproject(sample C)\nadd_executable(sample main.c {' '.join(sources)})\n")
+
+
+    def bench_native(self, workdir: str) -> None:
+        if not shutil.which('cmake'):
+            print("(!) cmake not installed, skipping the native build.")
+            return
+
+        src = os.path.join(workdir, 'sample')
+        self.make_cmake_project(src, 16 if self.tree_roots < 4 else 64)
+
+        def build(jobs: int) -> CMakeBuild:
+            return CMakeBuild(src, os.path.join(workdir, f"sample-build-j{jobs}"), {"CMAKE_BUILD_TYPE": "Release"}, jobs=jobs,
+                              runner=lambda args, **kwargs: subprocess.run(args, stdout=subprocess.DEVNULL, **kwargs))
+
+        def touch_one():
+            with open(os.path.join(src, 'unit0.c'), 'a') as f:
+                f.write("\n")
+
+        for jobs in sorted({1, os.cpu_count() or 1}):
+            clean = lambda: shutil.rmtree(build(jobs).build_dir, ignore_errors=True)
+            self.measure(f"cmake cold, -j{jobs}", lambda: build(jobs).build(), setup=clean)
+            self.measure(f"cmake warm, nothing changed, -j{jobs}", lambda: build(jobs).build())
+            self.measure(f"cmake warm, one file changed, -j{jobs}", lambda: build(jobs).build(), setup=touch_one)
+
+
+    @classmethod
+    def import_profile(cls) -> tuple:
+        """
+        Runs abs.py --help in a fresh interpreter under -X importtime, so what is timed is what
+        abs.py really imports, sys.path setup included.
+
+        Returns:
+            tuple: The seconds spent importing, the seconds the whole run took and the heavy modules that got loaded.
+        """
+        repo = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+        start = time.perf_counter()
+        sp = subprocess.run([sys.executable, '-X', 'importtime'] + cls.STARTUP_ARGS, cwd=repo, capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - start
+
+        # only the top level imports that come after site are ours, nested ones are in their cumulative time
+        total, ours, loaded = 0, False, set()
+        for line in sp.stderr.splitlines():
+            parts = line.split('|')
+            if len(parts) != 3 or not parts[1].strip().isdigit():
+                continue
+            loaded.add(parts[2].strip())
+            if parts[2].startswith('  '):
+                continue
+            if ours:
+                total += int(parts[1])
+            elif parts[2].strip() == 'site':
+                ours = True
+
+        heavy = [m for m in cls.HEAVY_MODULES if any(name == m or name.startswith(m + '.') for name in loaded)]
+        return total / 1e6, wall, heavy
+
+
+    def bench_startup(self, workdir: str) -> None:
+        times, walls, heavy = [], [], []
+        for _ in range(self.repeat):
+            seconds, wall, heavy = self.import_profile()
+            times.append(seconds)
+            walls.append(wall)
+
+        result = {'seconds': statistics.median(times), 'min': min(times), 'runs': len(times), 'heavy_modules': heavy,
+                  'process_seconds': statistics.median(walls)}
+        self.results['startup imports'] = result
+        print(f"{'startup imports':<40} {result['seconds']:>9.4f}s  ({result['process_seconds']:.4f}s for abs.py --help)"
+              f"{' (loads ' + ', '.join(heavy) + ')' if heavy else ''}")
+
+
+    @staticmethod
+    def check_startup(current: dict, budget_ms: float) -> List[str]:
+        """
+        Fails startup that goes over its import time budget or loads a heavy module.
+
+        Args:
+            current (dict): The results of this run.
+            budget_ms (float): The most abs.py may spend importing, in milliseconds.
+        Returns:
+            list: A description of each failure, empty if there were none.
+        """
+        result = current['results'].get('startup imports')
+        if not result:
+            return []
+
+        failures = []
+        if result['seconds'] * 1000 > budget_ms:
+            failures.append(f"startup imports: {result['seconds'] * 1000:.1f}ms is over the {budget_ms:.0f}ms budget")
+        if result.get('heavy_modules'):
+            failures.append(f"startup imports: loads {', '.join(result['heavy_modules'])}, which should only load when needed")
+        return failures
+
+
+    def run(self, only: Optional[List[str]] = None) -> dict:
+        """
+        Runs the suites in a temporary directory.
+
+        Args:
+            only (list): The suites to run (startup, download, extract, discover, stage, deploy, package, remote, native), None for all.
+        Returns:
+            dict: The results with some details of the machine they came from.
+        """
+        suites = {
+            'startup': self.bench_startup,
+            'download': self.bench_download,
+            'extract': self.bench_extract,
+            'discover': self.bench_discover,
+            'stage': self.bench_stage,
+            'deploy': self.bench_deploy,
+            'package': self.bench_package,
+            'remote': self.bench_remote,
+            'native': self.bench_native
+        }
+
+        with tempfile.TemporaryDirectory(prefix='abs-bench-') as workdir:
+            for name, suite in suites.items():
+                if only and name not in only:
+                    continue
+                print(f"\n[{name}]")
+                suite(os.path.join(workdir, name))
+
+        return {
+            'meta': {
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'time': time.strftime('%Y-%m-%d %H:%M:%S')
+            },
+            'results': self.results
+        }
+
+
+    @staticmethod
+    def compare(current: dict, baseline: dict, threshold: float = 0.2, min_delta: float = 0.002) -> List[str]:
+        """
+        Flags every case that got slower than the baseline by more than the threshold.
+
+        Args:
+            current (dict): The results of this run.
+            baseline (dict): The stored baseline results.
+            threshold (float): The allowed slowdown, ie. 0.2 for 20%.
+            min_delta (float): Slowdowns smaller than this many seconds are timer noise, not regressions.
+        Returns:
+            list: A description of each regression, empty if there were none.
+        """
+        regressions = []
+        print(f"\n{'case':<40} {'baseline':>10} {'current':>10} {'change':>8}")
+
+        for name, result in current['results'].items():
+            base = baseline.get('results', {}).get(name)
+            if not base:
+                print(f"{name:<40} {'-':>10} {result['seconds']:>9.4f}s {'new':>8}")
+                continue
+
+            change = result['seconds'] / base['seconds'] - 1 if base['seconds'] > 0 else 0.0
+            slower = result['seconds'] - base['seconds']
+            flag = " REGRESSION" if change > threshold and slower > min_delta else ""
+            print(f"{name:<40} {base['seconds']:>9.4f}s {result['seconds']:>9.4f}s {change:>+7.1%}{flag}")
+
+            if flag:
+                regressions.append(f"{name}: {base['seconds']:.4f}s -> {result['seconds']:.4f}s ({change:+.1%})")
+
+        return regressions
+
+
+    @staticmethod
+    def save(results: dict, path: str) -> None:
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,236 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import time
+import fnmatch
+import hashlib
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from profiler import Profiler
+
+
+@dataclass
+class Step:
+    """
+    A named build step. A step is up to date, and skipped, when its outputs exist and the
+    stamp of its inputs, key and dependencies is the same as the last time it ran.
+    Steps without inputs or key always run. A step whose skip callable returns True when
+    its turn comes is not run either, and reported as 'cached'.
+    """
+    name: str
+    action: Callable[[], None]
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    deps: List[str] = field(default_factory=list)
+    key: str = ""
+    exclude: List[str] = field(default_factory=list)
+    skip: Optional[Callable[[], bool]] = None
+
+
+class BuildGraph:
+    def __init__(self, stamp_path: str, workers: int = 4):
+        """
+        Runs build steps in dependency order, independent steps concurrently, skipping
+        any step that is up to date.
+
+        Args:
+            stamp_path (str): Where to keep the input stamps of each step.
+            workers (int): The maximum number of steps running at once.
+        """
+        self.stamp_path = stamp_path
+        self.workers = workers
+        self.steps: Dict[str, Step] = {}
+        self.lock = threading.Lock()
+
+
+    def add(self, name: str, action: Callable[[], None], **kwargs) -> Step:
+        """
+        Adds a step to the graph. See Step for the keyword arguments.
+        """
+        step = Step(name=name, action=action, **kwargs)
+        self.steps[name] = step
+        return step
+
+
+    def load_stamps(self) -> dict:
+        try:
+            with open(self.stamp_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+    def save_stamps(self, stamps: dict) -> None:
+        if os.path.dirname(self.stamp_path): os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+        tmp = f"{self.stamp_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(stamps, f, indent=4)
+        os.replace(tmp, self.stamp_path)
+
+
+    @staticmethod
+    def hash_inputs(hasher, paths: List[str], exclude: List[str]) -> None:
+        """
+        Folds the path, size and mtime of every input file into a hash, walking directories.
+        """
+        def excluded(name: str) -> bool:
+            return any(fnmatch.fnmatch(name, pattern) for pattern in exclude)
+
+        for path in sorted(paths):
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs[:] = sorted(d for d in dirs if not excluded(d))
+                    for name in sorted(files):
+                        if not excluded(name):
+                            st = os.stat(os.path.join(root, name))
+                            hasher.update(f"{os.path.join(root, name)}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+            elif os.path.exists(path):
+                st = os.stat(path)
+                hasher.update(f"{path}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+            else:
+                hasher.update(f"{path}|missing\n".encode())
+
+
+    def stamp(self, step: Step, dep_stamps: Dict[str, str]) -> str:
+        hasher = hashlib.sha256(step.key.encode())
+        self.hash_inputs(hasher, step.inputs, step.exclude)
+        for dep in sorted(step.deps):
+            hasher.update(f"{dep}={dep_stamps.get(dep, '')}\n".encode())
+        return hasher.hexdigest()
+
+
+    def order(self) -> List[str]:
+        """
+        Returns the step names in dependency order.
+
+        Raises:
+            ValueError: If a step depends on an unknown step or the steps form a cycle.
+        """
+        ordered, visiting, done = [], set(), set()
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name not in self.steps:
+                raise ValueError(f"Unknown build step: {name}")
+            if name in visiting:
+                raise ValueError(f"Build steps form a cycle at: {name}")
+
+            visiting.add(name)
+            for dep in self.steps[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            ordered.append(name)
+
+        for name in self.steps:
+            visit(name)
+        return ordered
+
+
+    def dependents(self, names: Iterable[str]) -> Set[str]:
+        """
+        Returns the given steps and every step that depends on them, directly or not.
+        """
+        found = set(names)
+        for name in self.order():
+            if any(dep in found for dep in self.steps[name].deps):
+                found.add(name)
+        return found
+
+
+    def run(self, only: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        """
+        Runs the graph.
+
+        Args:
+            only (iterable): Run just these steps, the others are taken as they were left by the last run.
+        Returns:
+            dict: For each step, its status ('ran', 'skipped', 'cached', 'failed' or 'blocked'),
+                  how long it took and the error if it failed.
+        """
+        order = self.order()
+        stamps = self.load_stamps()
+        new_stamps: Dict[str, str] = {}
+        results: Dict[str, dict] = {}
+        pending = list(order)
+
+        if only is not None:
+            only = set(only)
+            for name in order:
+                if name not in only:
+                    new_stamps[name] = stamps.get(name, "")
+                    results[name] = {'status': 'skipped', 'elapsed': 0.0}
+                    pending.remove(name)
+
+        def execute(step: Step) -> dict:
+            stamp = self.stamp(step, new_stamps)
+            up_to_date = (step.inputs or step.key) and stamps.get(step.name) == stamp and all(os.path.exists(o) for o in step.outputs)
+
+            start = time.perf_counter()
+            if up_to_date:
+                result = {'status': 'skipped'}
+            elif step.skip is not None and step.skip():
+                # produced elsewhere, the stamp is left as it was so a later local run still sees the step as stale
+                result = {'status': 'cached', 'elapsed': time.perf_counter() - start}
+                with self.lock:
+                    new_stamps[step.name] = stamps.get(step.name, "")
+                return result
+            else:
+                try:
+                    with Profiler.span(step.name, 'build'):
+                        step.action()
+                    result = {'status': 'ran'}
+                except Exception as e:
+                    result = {'status': 'failed', 'error': e}
+
+            result['elapsed'] = time.perf_counter() - start
+            with self.lock:
+                if result['status'] != 'failed':
+                    new_stamps[step.name] = stamp
+                    stamps[step.name] = stamp
+                    self.save_stamps(stamps)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            running = {}
+            while pending or running:
+                for name in list(pending):
+                    deps = self.steps[name].deps
+                    if any(results.get(d, {}).get('status') in ('failed', 'blocked') for d in deps):
+                        results[name] = {'status': 'blocked', 'elapsed': 0.0}
+                        pending.remove(name)
+                    elif all(d in results for d in deps):
+                        running[pool.submit(execute, self.steps[name])] = name
+                        pending.remove(name)
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[running.pop(future)] = future.result()
+
+        return {name: results[name] for name in order}
+
+
+    @staticmethod
+    def report(results: Dict[str, dict]) -> None:
+        """
+        Prints which steps ran and which were skipped.
+        """
+        print("Build steps:")
+        for name, result in results.items():
+            line = f"  {name}".ljust(24, '.') + f" {result['status'].upper()} ({result['elapsed']:.2f}s)"
+            if result.get('error'):
+                line += f": {result['error']}"
+            print(line)
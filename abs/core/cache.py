@@ -0,0 +1,308 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import contextlib
+
+from collections import Counter
+from typing import Optional
+
+from config import FileLock
+from helpers import Helpers
+from extract import Extractor
+from transfer import CountingHash
+
+
+class ArtifactCache:
+    #  Blobs used more recently than this are never evicted, a fetch in another process may still be placing them
+    IN_USE_GRACE = 15 * 60
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 20 * 1024 ** 3):
+        """
+        A content-addressed cache of downloaded artifacts shared by every workspace.
+        Blobs are stored by their SHA-256 and looked up by the url they came from. The index
+        is shared by every process on the host, it is only read and written under a file lock.
+
+        Args:
+            cache_dir (str): Where to keep the cache, defaults to $ABS_CACHE_DIR or ~/.abs/cache.
+            max_bytes (int): The size the cache is trimmed to, least recently used first.
+        """
+        self.cache_dir = cache_dir or os.environ.get('ABS_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.abs', 'cache')
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.index_path = os.path.join(self.cache_dir, 'index.json')
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.file_lock = FileLock(os.path.join(self.cache_dir, 'index.lock'))
+
+        #  Blobs the fetches of this process are using, never evicted
+        self.busy = Counter()
+
+        if not os.path.exists(self.objects_dir): os.makedirs(self.objects_dir)
+        self.index = self.load_index()
+
+
+    def load_index(self) -> dict:
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'urls': {}, 'objects': {}}
+
+
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Holds the cache against other threads and processes, with the index as it is on disk.
+        """
+        with self.lock, self.file_lock:
+            self.index = self.load_index()
+            yield
+
+
+    def save_index(self) -> None:
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=4)
+        os.replace(tmp, self.index_path)
+
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest)
+
+
+    def lookup(self, url: str, sha256: Optional[str] = None) -> Optional[dict]:
+        """
+        Finds the cached entry for a url. The blob is checked against the size and mtime it had
+        when it was last hashed, and only hashed again if those changed and the artifact is pinned.
+
+        Args:
+            url (str): The url the artifact was downloaded from.
+            sha256 (str): The digest the artifact is pinned to, if any.
+        Returns:
+            dict | None: The entry, or None if the artifact is not cached (or no longer matches its pin).
+        """
+        with self.locked():
+            entry = self.index['urls'].get(url)
+            if not entry or not os.path.exists(self.blob_path(entry['sha256'])):
+                return None
+            if sha256 and entry['sha256'] != sha256.lower():
+                return None
+
+            # entries from before sizes were recorded may hold a truncated download, they are fetched again
+            blob = self.blob_path(entry['sha256'])
+            obj = self.index['objects'].setdefault(entry['sha256'], {'size': entry.get('size')})
+            st = os.stat(blob)
+            intact = entry.get('size') == st.st_size
+            if intact and sha256 and obj.get('mtime') != st.st_mtime_ns:
+                intact = Helpers.hash_file(blob, hashlib.sha256()).hexdigest() == entry['sha256']
+                obj['mtime'] = st.st_mtime_ns
+            if not intact:
+                print(f"(!) Cached {entry['filename']} [{entry['sha256'][:12]}] is damaged, downloading it again...")
+                self.drop(entry['sha256'])
+                self.save_index()
+                return None
+
+            obj['atime'] = time.time()
+            self.save_index()
+            return entry
+
+
+    def put(self, url: str, path: str, digest: str, filename: str, is_archive: bool, size: int) -> None:
+        """
+        Adds a downloaded file to the cache and trims the cache back under its size cap.
+
+        Args:
+            url (str): The url the file was downloaded from.
+            path (str): The downloaded file.
+            digest (str): The SHA-256 of the file.
+            filename (str): The filename the download was saved as.
+            is_archive (bool): Whether the file is an archive.
+            size (int): The bytes that were downloaded and hashed.
+        Raises:
+            ValueError: If the file on disk is not the size that was downloaded.
+        """
+        if os.path.getsize(path) != size:
+            raise ValueError(f"{path} is {os.path.getsize(path)} bytes but {size} were downloaded, not caching it")
+
+        with self.locked():
+            blob = self.blob_path(digest)
+            if not os.path.exists(blob) or os.path.getsize(blob) != size:
+                if os.path.exists(blob): os.remove(blob)
+                Helpers.link_or_copy(path, blob)
+
+            # the download was hashed as it arrived, so the blob as it is now is known to match
+            self.index['objects'][digest] = {'size': size, 'atime': time.time(), 'mtime': os.stat(blob).st_mtime_ns}
+            self.index['urls'][url] = {'sha256': digest, 'filename': filename, 'is_archive': is_archive, 'size': size}
+            self.evict(keep=digest)
+            self.save_index()
+
+
+    def drop(self, digest: str) -> None:
+        """
+        Removes a blob and every url pointing at it.
+        """
+        self.index['objects'].pop(digest, None)
+        self.index['urls'] = {url: e for url, e in self.index['urls'].items() if e['sha256'] != digest}
+        try:
+            os.remove(self.blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Removes the least recently used blobs until the cache fits in max_bytes. Blobs a fetch
+        may be using, in this process or (going by IN_USE_GRACE) in another, are kept even if
+        that leaves the cache over max_bytes for a while.
+
+        Args:
+            keep (str): A digest that must not be evicted, ie. the one just added.
+        """
+        objects = self.index['objects']
+        total = sum(obj['size'] for obj in objects.values())
+
+        recent = time.time() - self.IN_USE_GRACE
+        for digest in sorted(objects, key=lambda d: objects[d].get('atime', 0)):
+            if total <= self.max_bytes:
+                break
+            if digest == keep or self.busy[digest] or objects[digest].get('atime', 0) > recent:
+                continue
+
+            print(f"Evicting {digest[:12]} from the artifact cache...")
+            total -= objects.pop(digest)['size']
+            try:
+                os.remove(self.blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+        self.index['urls'] = {url: e for url, e in self.index['urls'].items() if e['sha256'] in objects}
+
+
+    def fetch(self, url: str, out_filename: str, out_path: str = '.\\abs\\stremio-depends\\', sha256: Optional[str] = None,
+              extract: bool = False, members: Optional[list] = None, keep_archive: bool = True, **kwargs) -> tuple:
+        """
+        Places an artifact in out_path, from the cache if it is there, otherwise by downloading it.
+        Downloads are written straight into the cache, hashed as they stream in and checked against
+        the pinned digest. Archives extracted on the way are extracted into a staging directory,
+        which only replaces Helpers.extract_dir() once the download is complete and matches its pin.
+
+        Args:
+            url (str): The url to download the file from.
+            out_filename (str): The filename to save the file as.
+            out_path (str): The directory to save the file in.
+            sha256 (str): The digest the artifact is pinned to, if any.
+            extract (bool): Extract archives into Helpers.extract_dir(), as they download on a miss.
+            members (list): When extracting, fnmatch patterns of the members to extract.
+            keep_archive (bool): When extracting, also place the archive in out_path. The cache keeps it either way.
+            kwargs: Passed on to Helpers.download_file.
+        Returns:
+            tuple: The filename and whether it is an archive, as returned by Helpers.download_file.
+        Raises:
+            ValueError: If the download does not match its pinned digest.
+        """
+        if not os.path.exists(out_path): os.makedirs(out_path)
+        staging = tempfile.mkdtemp(prefix='.abs-fetch-', dir=out_path)
+        digest = None
+        try:
+            entry = self.lookup(url, sha256)
+            if entry:
+                print(f"Using cached {entry['filename']} [{entry['sha256'][:12]}]")
+                filename, is_archive, digest = entry['filename'], entry['is_archive'], entry['sha256']
+                self.use(digest)
+                if extract and is_archive:
+                    Extractor().extract(self.blob_path(digest), Helpers.extract_dir(filename, os.path.join(staging, '')), members, filename)
+            else:
+                filename, is_archive, digest = self.download(url, out_filename, sha256, staging, extract=extract, members=members, **kwargs)
+
+            if extract and is_archive:
+                self.place_extracted(filename, staging, out_path)
+            if keep_archive or not (extract and is_archive):
+                self.place_blob(digest, filename, is_archive, out_path)
+        finally:
+            if digest: self.release(digest)
+            shutil.rmtree(staging, ignore_errors=True)
+
+        return (filename, is_archive)
+
+
+    def download(self, url: str, out_filename: str, sha256: Optional[str], extract_to: str, **kwargs) -> tuple:
+        """
+        Downloads an artifact into the cache. The archive is written to a temporary file among the
+        blobs, which becomes the blob once it checks out, so it is never copied.
+
+        Returns:
+            tuple: The filename, whether it is an archive and the digest, marked in use (see use()).
+        """
+        incoming = tempfile.mkdtemp(prefix='.incoming-', dir=self.objects_dir)
+        try:
+            hasher = CountingHash(hashlib.sha256())
+            filename, is_archive = Helpers.download_file(url, out_filename, out_path=os.path.join(incoming, ''), hasher=hasher,
+                                                         keep_archive=True, extract_to=os.path.join(extract_to, ''), **kwargs)
+            digest = hasher.hexdigest()
+
+            # whatever was extracted on the way is still in staging, and is thrown away with it
+            if sha256 and digest != sha256.lower():
+                raise ValueError(f"Checksum mismatch for {url}: expected {sha256}, got {digest}")
+
+            self.use(digest)
+            try:
+                self.put(url, os.path.join(incoming, filename), digest, filename, is_archive, hasher.size)
+            except BaseException:
+                self.release(digest)
+                raise
+        finally:
+            shutil.rmtree(incoming, ignore_errors=True)
+
+        return (filename, is_archive, digest)
+
+
+    def use(self, digest: str) -> None:
+        with self.lock:
+            self.busy[digest] += 1
+
+
+    def release(self, digest: str) -> None:
+        with self.lock:
+            self.busy[digest] -= 1
+            if self.busy[digest] <= 0:
+                del self.busy[digest]
+
+
+    def place_blob(self, digest: str, filename: str, is_archive: bool, out_path: str) -> None:
+        target = f"{out_path}{filename}"
+        if os.path.lexists(target): os.remove(target)
+        # archives are only ever read and share the blob, anything else (ie. an installer) gets a copy it may write to
+        if is_archive:
+            Helpers.link_or_copy(self.blob_path(digest), target)
+        else:
+            shutil.copyfile(self.blob_path(digest), target)
+
+
+    @staticmethod
+    def place_extracted(filename: str, staging: str, out_path: str) -> None:
+        """
+        Replaces the extraction directory of an archive with the one extracted into staging.
+        """
+        staged = Helpers.extract_dir(filename, os.path.join(staging, ''))
+        final = Helpers.extract_dir(filename, out_path)
+        if os.path.exists(final): shutil.rmtree(final)
+        if os.path.exists(staged):
+            os.rename(staged, final)
+        else:
+            os.makedirs(final)
+
+
+    def clear(self) -> None:
+        with self.locked():
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.objects_dir)
+            self.index = {'urls': {}, 'objects': {}}
@@ -0,0 +1,258 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import time
+import threading
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class FileLock:
+    def __init__(self, path: str, timeout: float = 30.0):
+        """
+        An advisory lock on a file, shared by every process on the host. msvcrt on Windows, fcntl elsewhere.
+
+        Args:
+            path (str): The lock file, created if it does not exist.
+            timeout (float): Seconds to wait for another process to let go before giving up.
+        """
+        self.path = path
+        self.timeout = timeout
+        self.handle = None
+
+
+    def __enter__(self):
+        if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.handle = open(self.path, 'a+b')
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            try:
+                if os.name == 'nt':
+                    import msvcrt
+                    self.handle.seek(0)
+                    msvcrt.locking(self.handle.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    import fcntl
+                    fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.handle.close()
+                    raise TimeoutError(f"Timed out after {self.timeout}s waiting for the lock on {self.path}")
+                time.sleep(0.05)
+
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            self.handle.close()
+        return False
+
+
+class ConfigStore:
+    #  The schema written by this version of the script
+    SCHEMA_VERSION = 2
+
+    def __init__(self, path: str = 'abs/abs.json', lock_timeout: float = 30.0):
+        """
+        The config file, read once and kept in memory. Changes are queued and written together by
+        flush(), which merges them into whatever is on disk under a lock and replaces the file
+        atomically, so parallel runs sharing one config never see or leave a half written file.
+
+        Args:
+            path (str): The config file.
+            lock_timeout (float): Seconds to wait for another run to finish writing.
+        """
+        self.path = path
+        self.lock = FileLock(f"{path}.lock", lock_timeout)
+        self.thread_lock = threading.Lock()
+        self.data: Optional[dict] = None
+        self.pending: List[Tuple[str, str, Optional[str], Any]] = []
+
+        #  Upgrades a config from the version it is keyed by to the next one
+        self.migrations: Dict[int, Callable[[dict], None]] = {
+            1: self.migrate_1
+        }
+
+
+    @staticmethod
+    def migrate_1(data: dict) -> None:
+        # version 1 configs only had DEPENDS, fingerprints are backfilled from it by stat, not by probing
+        data.setdefault('DEPENDS', {})
+        data.setdefault('FINGERPRINTS', {})
+
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+
+    def read(self) -> Optional[dict]:
+        """
+        Reads the config from disk. A file that does not parse (ie. cut short by a crash or broken by
+        hand) is moved aside to <path>.corrupt-<timestamp> and treated as missing.
+
+        Returns:
+            dict | None: The config, or None if there is none.
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError(f"expected an object, got {type(data).__name__}")
+            return data
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            backup = f"{self.path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+            print(f"(!) {self.path} could not be read ({e}), moving it to {backup}...")
+            try:
+                os.replace(self.path, backup)
+            except FileNotFoundError:
+                pass
+            return None
+
+
+    def migrate(self, data: dict, report: bool = True) -> bool:
+        """
+        Brings a config up to SCHEMA_VERSION in place.
+
+        Returns:
+            bool: True if anything was migrated.
+        Raises:
+            ValueError: If the config was written by a newer version of the script.
+        """
+        version = data.get('SCHEMA', 1)
+        if version > self.SCHEMA_VERSION:
+            raise ValueError(f"{self.path} has schema version {version}, this script only knows up to {self.SCHEMA_VERSION}")
+
+        for from_version in range(version, self.SCHEMA_VERSION):
+            if report: print(f"Migrating config from schema version {from_version} to {from_version + 1}...")
+            self.migrations[from_version](data)
+
+        data['SCHEMA'] = self.SCHEMA_VERSION
+        return version != self.SCHEMA_VERSION
+
+
+    def load(self, refresh: bool = False) -> dict:
+        """
+        Returns the config, reading it from disk the first time. Older configs are migrated
+        and written back straight away.
+
+        Args:
+            refresh (bool): Read it from disk again.
+        Returns:
+            dict: The config, empty if there is none yet.
+        """
+        with self.thread_lock:
+            if self.data is not None and not refresh:
+                return self.data
+
+            data = self.read()
+            if data is None:
+                self.data = {'SCHEMA': self.SCHEMA_VERSION}
+                return self.data
+
+            self.data = data
+            migrated = self.migrate(data)
+
+        if migrated:
+            self.flush(force=True)
+        return self.data
+
+
+    def get(self, section: str, default: Any = None) -> Any:
+        return self.load().get(section, default)
+
+
+    def set(self, section: str, key: str, value: Any) -> None:
+        """
+        Queues a change to a single key of a section, ie. set('DEPENDS', 'git', 'git').
+        """
+        self.load()
+        with self.thread_lock:
+            self.data.setdefault(section, {})[key] = value
+            self.pending.append(('set', section, key, value))
+
+
+    def replace(self, section: str, value: Any) -> None:
+        """
+        Queues a change of a whole section.
+        """
+        self.load()
+        with self.thread_lock:
+            self.data[section] = value
+            self.pending.append(('replace', section, None, value))
+
+
+    def write(self, data: dict) -> None:
+        if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(data, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        Writes the queued changes. Under the lock the file is read again and the changes are
+        applied on top, so keys written by another run in the meantime are kept.
+
+        Args:
+            force (bool): Write even if nothing is queued.
+        Returns:
+            bool: True if the file was written.
+        """
+        with self.thread_lock:
+            if not self.pending and not force:
+                return False
+
+            with self.lock:
+                data = self.read()
+                if data is None:
+                    data = dict(self.data or {})
+                else:
+                    self.migrate(data, report=False)
+
+                for op, section, key, value in self.pending:
+                    if op == 'set':
+                        data.setdefault(section, {})[key] = value
+                    else:
+                        data[section] = value
+
+                data['SCHEMA'] = self.SCHEMA_VERSION
+                self.write(data)
+
+            self.data = data
+            self.pending = []
+            return True
+
+
+    def reset(self) -> None:
+        """
+        Deletes the config.
+        """
+        with self.thread_lock, self.lock:
+            if self.exists():
+                os.remove(self.path)
+            self.data = None
+            self.pending = []
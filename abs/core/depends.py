@@ -7,17 +7,30 @@
 import os
 import sys
 import glob
-import string
 import time
-import json
 import subprocess
 import shutil
 
 from pprint import pprint
 from typing import Union
-from ctypes import windll
 
 from helpers import Helpers
+from probe import Probe
+from downloader import DownloadManager
+from cache import ArtifactCache
+from discovery import DiscoveryIndex
+from fingerprint import Fingerprint
+from stage import Stager
+from buildgraph import BuildGraph
+from toolenv import ToolchainEnv
+from nativebuild import CMakeBuild
+from gitmirror import GitMirror
+from package import Packager
+from deploycache import DeployCache
+from remotecache import RemoteCache
+from drives import Drives
+from config import ConfigStore
+from profiler import Profiler
 
 
 class Depends:
@@ -48,7 +61,49 @@ class Depends:
         self.CMAKE_URL = "https://github.com/Kitware/CMake/releases/download/v3.26.0/cmake-3.26.0-windows-x86_64.msi"
         # [---------------------------------------------------------BUILD DEPENDENCIES---------------------------------------------------------] #
 
-        self.drives = []
+        #  Stremio shell source
+        self.STREMIO_URL = "https://github.com/Stremio/stremio-shell.git"
+
+        #  Archive members we actually use, everything else in the archive is skipped on extraction
+        self.EXTRACT_MEMBERS = {
+            "FFMpeg": ["*/bin/*"],
+            "MPV": ["libmpv-2.dll"]
+        }
+
+        #  Default install paths, relative to the root of each drive. Wildcards are allowed in any component
+        self.DISCOVERY_PATTERNS = {
+            "Git": ["Program Files\\Git\\cmd\\git.exe"],
+            "Qt": ["Qt\\Qt5.12.7\\5.12.7\\msvc*\\bin\\windeployqt.exe"],
+            "Qt_WebEngine": ["Qt\\Qt5.12.7\\installerResources\\qt.qt5.5127.qtwebengine*"],
+            "Qt_MSVC": ["Qt\\Qt5.12.7\\installerResources\\qt.qt5.5127.win32_msvc*"],
+            "OpenSSL": ["Program Files (x86)\\OpenSSL-Win*\\bin\\openssl.exe"],
+            "NodeJS": ["Program Files\\nodejs\\node.exe"],
+            "MPV": ["Program Files\\MPV\\bin\\mpv.exe"],
+            "VS_Community": ["Program Files (x86)\\Microsoft Visual Studio\\2017\\Community\\VC\\Auxiliary\\Build\\vcvars32.bat"],
+            "CMake": ["Program Files\\CMake\\bin\\cmake.exe"]
+        }
+
+        #  Arguments that make each dependency print its version, None if it has no version check
+        self.VERSION_ARGS = {
+            "openssl": ["version"],
+            "mpv": None,
+            "vs_community": None
+        }
+
+        #  Optional SHA-256 pins, keyed by url. Downloads that do not match their pin are rejected.
+        self.ARTIFACT_SHA256 = {}
+
+        #  Other hosts serving the same artifact, keyed by url. The fastest to answer is used and the
+        #  rest take over, from where the transfer stopped, if it fails or stalls
+        self.ARTIFACT_MIRRORS = {
+            self.QT_URL: ["https://download.qt.io/archive/qt/5.12/5.12.7/qt-opensource-windows-x86-5.12.7.exe"],
+            self.LIBMPV_URL: ["https://downloads.sourceforge.net/project/mpv-player-windows/libmpv/mpv-dev-i686-20230312-git-9880b06.7z"],
+            self.NODEJS_URL: ["https://nodejs.org/download/release/v8.17.0/win-x86/node.exe"]
+        }
+
+        # the dependencies whose versions decide what a build produces, git only fetches the sources
+        self.BUILD_CACHE_TOOLCHAIN = ["qt", "openssl", "vs_community", "nodejs", "ffmpeg", "mpv", "cmake"]
+
         self.depend_paths = {
             "git": "",
             "qt": "",
@@ -59,17 +114,74 @@ class Depends:
             "mpv": ""
         }
         self.ljust = 50
+        self.probe_timeout = 10.0
+        self.probe_results = {}
+        self.defer_downloads = False
+        self.pending_downloads = []
+        self.download_workers = 4
+        self.download_segments = 4
+        self.cache = ArtifactCache(max_bytes=20 * 1024 ** 3)
+        self.fingerprints = {}
+        # also hash every dependency and check the hash on startup, catching changes that keep size and mtime
+        self.fingerprint_hash = os.environ.get('ABS_FINGERPRINT_HASH', '') not in ('', '0')
+        self.stage_mode = 'hardlink'
+        self.build_workers = 4
+        self.toolenv = None
+        self.mirror = None
+        self.clone_mode = 'partial'
+        self.submodule_jobs = 8
+        self.cmake_generator = None
+        self.cmake_jobs = None
+        self.compiler_launcher = 'auto'
+        self.package_level = 10
+        self.deploy_tool = None
+        self.deploy_args = None
+        self.deploy_cache_root = 'abs/deploy-cache'
+        self.package_threads = None
+        self.package_keep_deltas = Packager.KEEP_DELTAS
+        # a shared build cache, ie. http://cache.local:8080/stremio, off if unset
+        self.build_cache_url = os.environ.get('ABS_BUILD_CACHE')
+        self.build_cache_push = True
+        self.build_cache_keys = {}
+        # the package the package step left for each dist dir, pushed to the build cache as it is
+        self.built_packages = {}
+        self.build_cache_hits = set()
         
         # set the path to the config file if it exists, otherwise set to None
-        self.cfg_path = glob.glob('./abs/abs.json')[0] if len(glob.glob('./abs/abs.json')) > 0 else None 
+        self.config = ConfigStore('abs/abs.json')
+        self.cfg_path = self.config.path if self.config.exists() else None
 
         # do this in the instantiation instead of everytime we check a depend
-        d_bitmask = windll.kernel32.GetLogicalDrives()
-            
-        for letter in string.ascii_uppercase:
-            if d_bitmask & 1:
-                self.drives.append(letter)
-            d_bitmask >>= 1
+        self.drives = Drives.letters()
+
+        # one pass over every drive finds all the dependencies, repeat runs answer from abs/discovery.json
+        self.discovery = DiscoveryIndex(Drives.roots(), self.DISCOVERY_PATTERNS)
+
+
+    def check_depends(self, checks: list) -> list:
+        """
+        Checks if several programs are installed, probing all of them at once.
+
+        Args:
+            checks (list): (pgm_args, pgm_name, pgm_url) tuples, as passed to check_depend.
+        Returns:
+            list: The ProbeResult of each check, in the order given.
+        """
+
+        with Profiler.span("probe dependencies", 'probe'):
+            results = Probe(timeout=self.probe_timeout).run([(pgm_name, pgm_args) for pgm_args, pgm_name, _ in checks])
+
+        # report in the order given once every probe has finished, so the output stays readable.
+        # anything the user asks us to grab is queued and downloaded together afterwards
+        self.defer_downloads = True
+        try:
+            for (_, pgm_name, pgm_url), result in zip(checks, results):
+                self.report_probe(result, pgm_url)
+        finally:
+            self.defer_downloads = False
+
+        self.fetch_pending()
+        return results
 
 
     def check_depend(self, pgm_args: Union[str, list], pgm_name: str, pgm_url: str) -> None:
@@ -82,114 +194,95 @@ class Depends:
             pgm_out_filename (str): The filename to save the program as.
         """
 
-        try:
-            time.sleep(0.15)
-            print(f"Checking if {pgm_name} is installed...".ljust(self.ljust, '.'), end='')
-            if type(pgm_args) == str:
-                pgm_args = pgm_args.split()
+        self.report_probe(Probe(timeout=self.probe_timeout).run_one(pgm_name, pgm_args), pgm_url)
 
-            sp_pgm = subprocess.run(pgm_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-            if sp_pgm.returncode == 0:
-                print(f"OK: " + sp_pgm.stdout.decode().split('\n')[0].strip())
-                self.depend_paths[pgm_name.lower()] = pgm_args[0] 
-        
-        except FileNotFoundError:
-            print(f"NO: {pgm_name} not on path...\n\nSearching default install paths on all drives...")
-            self.verify_depend(pgm_name, pgm_url)
+    def report_probe(self, result, pgm_url: str, search: bool = True) -> None:
+        """
+        Prints the result of a probe, falling back to searching the drives if the program was not found.
+
+        Args:
+            result (ProbeResult): The result of probing the program.
+            pgm_url (str): The URL to the program download.
+            search (bool): Whether to search the drives if the program was not found.
+        """
+
+        self.probe_results[result.name.lower()] = result
+        print(f"Checking if {result.name} is installed...".ljust(self.ljust, '.'), end='')
+
+        if result.found:
+            print(f"OK: {result.version} ({result.elapsed:.2f}s)")
+            self.depend_paths[result.name.lower()] = result.args[0]
+
+        elif not search:
+            print(f"NO: {result.name} {result.error}...")
+
+        else:
+            print(f"NO: {result.name} {'not on path' if result.error == 'not found' else result.error}...\n\nSearching default install paths on all drives...")
+            self.verify_depend(result.name, pgm_url)
 
 
     def verify_depend(self, pgm_name: str, pgm_url: str) -> None:
-        # verify depend: Git
-        if pgm_name == "Git":
-            self.check_path(pgm_name, pgm_url, ":\\Program Files\\Git")
+        # verify depend: FFMpeg, only ever looked for relative to the working directory
+        if pgm_name == "FFMpeg":
+            self.check_path(pgm_name, pgm_url, "ffmpeg.exe")
 
         # verify depend: Qt
-        # TODO: could be refactored to be more generic?
         elif pgm_name == "Qt":
             # not going to use the self.check_path() method here because it's a bit different
-            qt_path_struct = ":\\Qt\\Qt5.12.7\\5.12.7"
-            qt_path_struct_addons = ":\\Qt\\Qt5.12.7\\installerResources"
+            for qt_path in self.discovery.find("Qt"):
+                root = self.discovery.root_of(qt_path)
 
-            for drive_letter in self.drives:
-                qt_webe = glob.glob(f"{drive_letter}{qt_path_struct_addons}\\qt.qt5.5127.qtwebengine*")  # wildcard for webengine
-                qt_msvc = glob.glob(f"{drive_letter}{qt_path_struct_addons}\\qt.qt5.5127.win32_msvc*")  # wildcard for msvc
-                qt_msvc_bin = glob.glob(f"{drive_letter}{qt_path_struct}\\msvc*")  # wildcard for BASE_DIR/msvc/bin
-                
                 # check if default qt 5.12.7 install path exists "C:\Qt\Qt5.12.7\5.12.7\msvc2017\bin\"
-                if len(glob.glob(f"{qt_msvc_bin[0]}\\bin\\windeployqt.exe")) > 0:
-                    self.depend_paths[pgm_name.lower()] = f"{qt_msvc_bin[0]}\\bin\\windeployqt.exe"
-                    print(f"Found {pgm_name}! [{self.depend_paths[pgm_name.lower()]}]\n\nVerifying Qt Addons...")
-                    
-                    if len(qt_webe) > 0 and len(qt_msvc) > 0:
-                        print("Qt WebEngine: OK\nQt MSVC:      OK\n")
-                    else:
-                        print("One of the following: [Qt WebEngine, Qt MSVC (32 Bit)] were missing from your Qt installation...\nPlease correct this and try again.")
-                    
-                    print("Checking if Qt is installed...".ljust(self.ljust, '.') + f"OK: {self.depend_paths[pgm_name.lower()]}")
-                    break
+                self.depend_paths[pgm_name.lower()] = qt_path
+                print(f"Found {pgm_name}! [{self.depend_paths[pgm_name.lower()]}]\n\nVerifying Qt Addons...")
+                
+                if self.discovery.find("Qt_WebEngine", root) and self.discovery.find("Qt_MSVC", root):
+                    print("Qt WebEngine: OK\nQt MSVC:      OK\n")
+                else:
+                    print("One of the following: [Qt WebEngine, Qt MSVC (32 Bit)] were missing from your Qt installation...\nPlease correct this and try again.")
+                
+                print("Checking if Qt is installed...".ljust(self.ljust, '.') + f"OK: {self.depend_paths[pgm_name.lower()]}")
+                break
             else:
                 self.depend_not_found(pgm_name, pgm_url)
 
-        # verify depend: OpenSSL
-        elif pgm_name == "OpenSSL":
-            self.check_path(pgm_name, pgm_url, ":\\Program Files (x86)\\OpenSSL-Win*\\bin\\openssl.exe")
-
-        # verify depend: NodeJS
-        elif pgm_name == "NodeJS":
-            self.check_path(pgm_name, pgm_url, ":\\Program Files\\nodejs\\node.exe")
-
-        # verify depend: FFMpeg
-        elif pgm_name == "FFMpeg":
-            self.check_path(pgm_name, pgm_url, "ffmpeg.exe")
-
-        # verify depend: MPV
-        elif pgm_name == "MPV":
-            self.check_path(pgm_name, pgm_url, ":\\Program Files\\MPV\\bin\\mpv.exe")
-
-        # verify depend: VS Community version 2017
-        elif pgm_name == "VS_Community":
-            self.check_path(pgm_name, pgm_url, ":\\Program Files (x86)\\Microsoft Visual Studio\\2017\\Community\\VC\\Auxiliary\\Build\\vcvars32.bat")
-        
-        # verify depend: CMake
-        elif pgm_name == "CMake":
-            self.check_path(pgm_name, pgm_url, ":\\Program Files\\CMake\\bin\\cmake.exe")
+        # verify depend: everything else, from the discovery index
+        elif pgm_name in self.DISCOVERY_PATTERNS:
+            self.check_path(pgm_name, pgm_url)
 
 
-    def check_path(self, pgm_name: str, pgm_url: str, path_struct: str) -> None:
+    def check_path(self, pgm_name: str, pgm_url: str, path_struct: str = None) -> None:
         """
-        Checks if a specific path exists on any drive.
+        Checks if a program exists in its default install path on any drive.
 
         Args:
             pgm_name (str): The name of the program.
             pgm_url (str): The URL to the program download.
-            path_struct (str): The path structure to check.
+            path_struct (str): A relative path to check instead of the discovery index.
         """
 
-        current_drive = ""
-        for drive_letter in self.drives:
-            current_drive += f"{drive_letter}:\\, " if drive_letter != self.drives[-1] else f"{drive_letter}:\\"
-            print(f"Checking {current_drive} for {pgm_name}...", end='\r')
-            time.sleep(0.05)
-            
-            # if the path doesnt start with the colon, its likely a relative path
-            if not path_struct.startswith(":"):
+        print(f"Checking {', '.join(self.discovery.roots)} for {pgm_name}...")
+        
+        # relative paths are checked directly, everything else is answered by the discovery index
+        with Profiler.span(f"check_path {pgm_name}", 'discovery'):
+            if path_struct:
                 path_to_check = glob.glob(f"{path_struct}")
             else:
-                path_to_check = glob.glob(f"{drive_letter}{path_struct}")
+                path_to_check = self.discovery.find(pgm_name)
 
-            if len(path_to_check) > 0:
-                self.depend_paths[pgm_name.lower()] = path_to_check[0]
-                print(f"\n\nFound {pgm_name}! [{self.depend_paths[pgm_name.lower()]}]\n")
+        if len(path_to_check) > 0:
+            self.depend_paths[pgm_name.lower()] = path_to_check[0]
+            print(f"\nFound {pgm_name}! [{self.depend_paths[pgm_name.lower()]}]\n")
 
-                # VERIFY: depending on the program, checking the versin could be --version or just version
-                if pgm_name in ['OpenSSL']:
-                    pgm_args = [f"{self.depend_paths[pgm_name.lower()]}", "version"]
-                else:
-                    pgm_args = [f"{self.depend_paths[pgm_name.lower()]}", "--version"]
+            # VERIFY: depending on the program, checking the versin could be --version or just version
+            if pgm_name in ['OpenSSL']:
+                pgm_args = [f"{self.depend_paths[pgm_name.lower()]}", "version"]
+            else:
+                pgm_args = [f"{self.depend_paths[pgm_name.lower()]}", "--version"]
 
-                self.check_depend(pgm_args, pgm_name, pgm_url)
-                break
+            # already found on disk, so do not search again if the version check fails
+            self.report_probe(Probe(timeout=self.probe_timeout).run_one(pgm_name, pgm_args), pgm_url, search=False)
 
         else:
             print('\n')
@@ -199,7 +292,8 @@ class Depends:
     def depend_not_found(self, pgm_name: str, pgm_url: str):
         print(f"{pgm_name} not found on any drive.")
 
-        if Helpers.ynp("Is it installed anywhere else?"):
+        # unattended runs fetch whatever is missing
+        if Helpers.ynp("Is it installed anywhere else?", default=False):
             while True:
                 pgm_path = input("Enter the path to the program: ")
                 if os.path.exists(pgm_path):
@@ -209,12 +303,20 @@ class Depends:
                     print(f"Could not find {pgm_name} at: {pgm_path}")
 
         else:
-            if Helpers.ynp("Would you like me to grab it?"):
+            if Helpers.ynp("Would you like me to grab it?", default=True):
+                if self.defer_downloads:
+                    print(f"Queued {pgm_name} for download.\n")
+                    self.pending_downloads.append((pgm_name, pgm_url))
+                    return
+
                 # have dlf return params and do the install here, so we can set the path
-                dlf = Helpers.download_file(pgm_url, f"{pgm_name}.exe")
+                # archives are extracted as they download, the only copy of the archive is the one in the cache
+                dlf = self.cache.fetch(pgm_url, f"{pgm_name}.exe", sha256=self.ARTIFACT_SHA256.get(pgm_url),
+                                       segments=self.download_segments, mirrors=self.ARTIFACT_MIRRORS.get(pgm_url),
+                                       extract=True, members=self.EXTRACT_MEMBERS.get(pgm_name), keep_archive=False)
                 
                 # dlf returns tuple with filename and file type
-                insf = Helpers.install_file(dlf[0], dlf[1])
+                insf = Helpers.install_file(dlf[0], dlf[1], members=self.EXTRACT_MEMBERS.get(pgm_name), extracted=True)
 
                 # if install file didnt return none
                 if insf:
@@ -224,46 +326,171 @@ class Depends:
                 print(f"Please install it manually and try again as the script may now break.\nSee: {pgm_url}")
 
 
+    def fetch_pending(self) -> None:
+        """
+        Downloads every queued dependency at once, installing each as soon as it arrives.
+        """
+
+        if not self.pending_downloads:
+            return
+
+        print(f"\n[Downloading {len(self.pending_downloads)} Dependencies]\n")
+        manager = DownloadManager(max_workers=self.download_workers, segments=self.download_segments, cache=self.cache)
+        for pgm_name, pgm_url in self.pending_downloads:
+            manager.add(pgm_name, pgm_url, f"{pgm_name}.exe", sha256=self.ARTIFACT_SHA256.get(pgm_url), mirrors=self.ARTIFACT_MIRRORS.get(pgm_url),
+                        extract=True, members=self.EXTRACT_MEMBERS.get(pgm_name), keep_archive=False)
+        self.pending_downloads = []
+
+        for job in manager.run():
+            if job.error:
+                print(f"Please install {job.name} manually and try again as the script may now break.\nSee: {job.url}")
+                continue
+
+            insf = Helpers.install_file(job.filename, job.is_archive, members=self.EXTRACT_MEMBERS.get(job.name), extracted=True)
+
+            # if install file didnt return none
+            if insf:
+                self.depend_paths[job.name.lower()] = insf
+
+
+    def record_fingerprints(self) -> None:
+        """
+        Fingerprints every resolved dependency (path, version, size, mtime) for the config.
+        """
+
+        for name, path in self.depend_paths.items():
+            result = self.probe_results.get(name)
+            fp = Fingerprint.take(path, result.version if result and result.found else "", self.fingerprint_hash)
+            if fp:
+                self.fingerprints[name] = fp
+
+
+    def verify_fingerprints(self, fingerprints: dict) -> bool:
+        """
+        Confirms the dependencies recorded in the config are still there and unchanged. Each one
+        costs a single stat, plus a hash of the file when fingerprint_hash is on, and only those
+        whose fingerprint changed are probed again.
+
+        Args:
+            fingerprints (dict): The fingerprints read from the config.
+        Returns:
+            bool: True if any fingerprint changed and the config should be rewritten.
+        """
+
+        self.fingerprints = dict(fingerprints)
+        changed = [name for name, fp in fingerprints.items()
+                   if not Fingerprint.matches(fp) or (self.fingerprint_hash and not Fingerprint.verify_hash(fp))]
+
+        # configs written before fingerprints (or their hashes) existed get them now, without a probe
+        added = False
+        for name, path in self.depend_paths.items():
+            fp = None
+            if name not in fingerprints:
+                fp = Fingerprint.take(path, "", self.fingerprint_hash)
+            elif self.fingerprint_hash and name not in changed and 'sha256' not in fingerprints[name]:
+                fp = Fingerprint.take(fingerprints[name]['path'], fingerprints[name].get('version', ""), True)
+            if fp:
+                self.fingerprints[name] = fp
+                added = True
+
+        if not changed:
+            return added
+
+        # anything that still exists is probed again, all at once
+        probes = []
+        settled = set()
+        for name in changed:
+            fp = fingerprints[name]
+            if not os.path.exists(fp['path']):
+                print(f"{name} is no longer at {fp['path']}...")
+                continue
+
+            version_args = self.VERSION_ARGS.get(name, ["--version"])
+            if version_args is not None:
+                probes.append((name, [fp['path']] + version_args))
+            else:
+                self.fingerprints[name] = Fingerprint.take(fp['path'], fp.get('version', ""), self.fingerprint_hash)
+                settled.add(name)
+                print(f"{name} changed, refreshed fingerprint.")
+
+        for result in Probe(timeout=self.probe_timeout).run(probes):
+            self.probe_results[result.name] = result
+            if result.found:
+                print(f"{result.name} changed: {fingerprints[result.name].get('version') or '?'} -> {result.version}")
+                self.fingerprints[result.name] = Fingerprint.take(result.args[0], result.version, self.fingerprint_hash)
+                settled.add(result.name)
+            else:
+                print(f"{result.name} changed and no longer runs ({result.error})...")
+
+        # removed or broken dependencies are searched for again
+        for name in changed:
+            if name in settled:
+                continue
+
+            self.fingerprints.pop(name, None)
+            pgm_name, pgm_url = next(((key, url) for key, url in self.depend_urls().items() if key.lower() == name), (name, ""))
+            print(f"Searching for {pgm_name} again...")
+            self.verify_depend(pgm_name, pgm_url)
+            self.record_fingerprints()
+
+        return True
+
+
+    def depend_urls(self) -> dict:
+        return {
+            "Git": self.GIT_URL,
+            "Qt": self.QT_URL,
+            "OpenSSL": self.OSSL_URL,
+            "NodeJS": self.NODEJS_URL,
+            "FFMpeg": self.FFMPEG_URL,
+            "MPV": self.LIBMPV_URL,
+            "VS_Community": self.VSCOMM_URL,
+            "CMake": self.CMAKE_URL
+        }
+
+
     def get_all_paths(self) -> None:
         return self.depend_paths
 
 
     @staticmethod
     def reset_config(config_path) -> None:
-        os.remove(config_path)
+        ConfigStore(config_path).reset()
 
 
     def write_config(self, key = None, value = None):
-        print("\nChecking for existing config...")
-
-        if self.cfg_path and key != None:
-            print("Existing config found. Reading...")
-            conf = json.load(open(self.cfg_path))
-            conf['DEPENDS'][key] = value
-            
+        """
+        Writes a single dependency path to the config, or every path and fingerprint if no key is given.
+        """
+        if key != None:
             print(f"Writing key/val: [{key} -> {value}] to config file...")
-            json.dump(conf, open(self.cfg_path, 'w'), indent=4)
+            self.config.set('DEPENDS', key, value)
         else:
-            # check to see if the abs path exists, otherwise create it
-            if not os.path.exists('abs'): os.mkdir('abs')
+            print(f"{'Updating' if self.config.exists() else 'Generating'} config ({self.config.path})...")
+            self.config.replace('DEPENDS', dict(self.get_all_paths()))
+            self.config.replace('FINGERPRINTS', dict(self.fingerprints))
 
-            # generate the default config, which will be everything we've done in the program so far
-            print("No configuration file was found. Generating default...")
-            default = {
-                'DEPENDS': self.get_all_paths()
-            }
+        self.config.flush()
+        self.cfg_path = self.config.path
 
-            # write the default config to the abs.json file
-            json.dump(default, open('./abs/abs.json', 'w'), indent=4)
 
-
-    def read_config(self, filename='abs.json', filepath = './abs/'):
-        if len(glob.glob(f"{filepath}{filename}")) > 0:
-            print(f"Config ({filename}) found. Reading...")
-            conf = json.load(open(f'{filepath}{filename}'))
-            return conf
-        else:
+    def read_config(self) -> dict:
+        """
+        Returns the config, read from disk once and migrated to the current schema if it is older.
+        None if it could not be read.
+        """
+        if not self.config.exists():
             print("Error! No configuration file was found. Please run the script again to generate one.\n(This should never fire, reproduce this error and report it to the developer.)")
+            return None
+
+        print(f"Config ({os.path.basename(self.config.path)}) found. Reading...")
+        conf = self.config.load()
+
+        # a config that could not be read was moved aside, the first time setup writes a new one
+        if not self.config.exists():
+            self.cfg_path = None
+            return None
+        return conf
 
 
     @staticmethod
@@ -276,81 +503,298 @@ class Depends:
                 return f"{path}\\{path_var}.exe" # windows only
 
 
-    def build_stremio(self):
-        print("Building Stremio...\nCloning Stremio repo...")
-        # subprocess.run(["git", "clone", "--recursive", "https://github.com/Stremio/stremio-shell.git"])
-        print("\ndone.\n")
+    def resolve_depend(self, name: str) -> str:
+        """
+        Returns the absolute path of a dependency, resolving bare commands on the PATH.
+        """
+        return Fingerprint.resolve(self.depend_paths[name]) or self.depend_paths[name]
 
-        print("Setting up build environment...")
-        os.chdir("stremio-shell") # since we just chdir'd into stremio-shell paths get shifted -> ../{whatever} ???
-        
-        # # TODO: DYNAMIC CHECK, DO NOT LEAVE HARD CODED
-        # sys.path.append("C:\\Qt\\Qt5.12.7\\5.12.7\\msvc2017\\bin")
-        # sys.path.append("C:\\OpenSSL-Win32\\bin")
 
-        # input(os.getcwd())
-        vcvars_out = subprocess.check_output(f'"{self.depend_paths["vs_community"]}" && \
-                  FOR /F "usebackq delims== tokens=2" %i IN (`type stremio.pro ^| find "VERSION=4"`) DO set package_version=%i && echo %i', shell=True)
-        
-        strem_ver = vcvars_out.decode('utf-8').splitlines()[-1]
+    @staticmethod
+    def read_stremio_version(src_dir: str) -> str:
+        """
+        Pulls the Stremio package version (ie. VERSION=4.4.159) out of stremio.pro.
+        """
+        with open(os.path.join(src_dir, 'stremio.pro')) as f:
+            for line in f:
+                if "VERSION=4" in line:
+                    return line.split('=')[1].strip()
+
+
+    def git_mirror(self) -> GitMirror:
+        """
+        Returns the local mirror of the Stremio shell and its submodules, kept in abs\\git.
+        """
+        if self.mirror is None:
+            self.mirror = GitMirror(self.STREMIO_URL, jobs=self.submodule_jobs)
+        return self.mirror
+
+
+    def clone_stremio(self, src_dir: str, ref: str = None) -> None:
+        """
+        Checks out the Stremio shell with its submodules, from the local mirror.
+
+        Args:
+            src_dir (str): The workspace to check it out in, created if it does not exist.
+            ref (str): A branch, tag or commit to check out, the default branch if None.
+        """
+        print(f"Checking out Stremio repo{f' at {ref}' if ref else ''}...")
+        self.git_mirror().workspace(src_dir, ref, self.clone_mode)
+
+
+    def download_serverjs(self, src_dir: str) -> None:
+        strem_ver = self.read_stremio_version(src_dir)
         print(f"Pulled Stremio package version: {strem_ver}")
-        
+
+        # through the artifact cache, so builds of the same version download it once
         serverjs_url = f"https://s3-eu-west-1.amazonaws.com/stremio-artifacts/four/v{strem_ver}/server.js"
-        if not os.path.exists("server.js"): Helpers.basic_download(serverjs_url, "server.js")
-        print("\ndone.\n")
+        self.cache.fetch(serverjs_url, "server.js", out_path=os.path.join(src_dir, ''), is_archive=False)
+
+
+    def toolchain_env(self) -> ToolchainEnv:
+        """
+        Returns the visual studio environment, captured from vcvars32.bat once and cached on disk.
+        """
+        if self.toolenv is None or self.toolenv.script != os.path.abspath(self.depend_paths["vs_community"]):
+            self.toolenv = ToolchainEnv(self.depend_paths["vs_community"])
+        return self.toolenv
 
+
+    def cmake_cache_vars(self) -> dict:
         # TODO: ensure the qt5dir path is not hardcoded and automatically grabbed somewhere in the initial instantiantion of the config items
+        return {
+            "CMAKE_PREFIX_PATH": "C:\\Qt\\Qt5.12.7\\5.12.7\\msvc2017\\lib\\cmake\\Qt5",
+            "CMAKE_BUILD_TYPE": "Release"
+        }
+
+
+    @staticmethod
+    def build_dir_for(src_dir: str) -> str:
+        """
+        The persistent out of tree build directory of a checkout, ie. stremio-shell-build.
+        """
+        return f"{os.path.normpath(src_dir)}-build"
+
+
+    def cmake_build(self, src_dir: str) -> CMakeBuild:
+        """
+        The cmake build of a checkout, in the visual studio environment. Ninja or jom are used
+        when installed, NMake (one file at a time) otherwise.
+        """
+        env = self.toolchain_env()
+        return CMakeBuild(src_dir, self.build_dir_for(src_dir), self.cmake_cache_vars(), generator=self.cmake_generator,
+                          default_generator="NMake Makefiles", jobs=self.cmake_jobs, launcher=self.compiler_launcher,
+                          runner=env.run, which=env.which)
+
+
+    def build_shell(self, src_dir: str) -> None:
         print("Building the Stremio Shell...")
-        subprocess.run(f'"{self.depend_paths["vs_community"]}" && cmake -G\"NMake Makefiles\" -DCMAKE_PREFIX_PATH="C:\\Qt\\Qt5.12.7\\5.12.7\\msvc2017\\lib\\cmake\\Qt5" -DCMAKE_BUILD_TYPE=Release . && cmake --build ..', shell=True)
-        # os.system(f'"{self.depend_paths["vs_community"]}" && ')
-        print("\ndone.\n")
 
-        print("Building solution directory structure...")
-        if not os.path.exists("abs-dist-win"): 
-            os.mkdir("abs-dist-win")
-        else:
-            # otherwise, clean the directory
-            shutil.rmtree("abs-dist-win")
-            os.mkdir("abs-dist-win")
-
-        # OK
-        print("Copying .\\stremio.exe -> abs-dist-win\\stremio.exe...")
-        shutil.copyfile('stremio.exe', 'abs-dist-win\\stremio.exe')
-        print("\ndone.\n")
-        
-        # OK
-        print("Copying C:\\Windows\\System32\\msvcr120.dll -> abs-dist-win\\msvcr120.dll...")
-        shutil.copyfile('C:\\Windows\\System32\\msvcr120.dll', 'abs-dist-win\\msvcr120.dll')
-        print("\ndone.\n")
-        
-        # ..\abs\stremio-depends\MPV\libmpv-2.dll
-        # input(self.depend_paths['mpv'] + " : " + os.getcwd())
-        print(f"Copying ..\\{self.depend_paths['mpv']} -> abs-dist-win\\{self.depend_paths['mpv']}...")
-        shutil.copyfile(f"..\\{self.depend_paths['mpv']}", f'abs-dist-win\\' + self.depend_paths["mpv"].split("\\")[-1].replace("2", "1").replace("lib", ""))
-        print("\ndone.\n")
-        
-        print("Copying .\\windows\\DS\\* -> abs-dist-win\\DS\\*...")
-        shutil.copytree('windows\\DS', 'abs-dist-win\\DS')
-        print("\ndone.\n")
-        
-        print("Copying server.js -> abs-dist-win\\server.js...")
-        shutil.copyfile('server.js', 'abs-dist-win\\server.js')
-        print("\ndone.\n")
-        
-        print(f"Copying .\\{self.depend_paths['openssl'].replace('openssl.exe', 'libcrypto-1_1.dll')} -> abs-dist-win\\libcrypto-1_1.dll...")
-        shutil.copyfile(f"{self.depend_paths['openssl'].replace('openssl.exe', 'libcrypto-1_1.dll')}", 'abs-dist-win\\libcrypto-1_1.dll')
-        print("\ndone.\n")
-        
-        print(f"Copying {self.where_is_path_var('node')} -> abs-dist-win\\node.exe...")
-        shutil.copyfile(f"{self.where_is_path_var('node')}", 'abs-dist-win\\node.exe')
-        print("\ndone.\n")
-        
-        print(f"Copying ..\\{self.depend_paths['ffmpeg']} -> abs-dist-win\\ffmpeg.exe...")
-        shutil.copyfile(f"..\\{self.depend_paths['ffmpeg']}", 'abs-dist-win\\ffmpeg.exe')
-        print("\ndone.\n")
-        
+        # left behind by the old in-source builds, cmake would pick it up instead of the build dir
+        if os.path.exists(os.path.join(src_dir, 'CMakeCache.txt')):
+            os.remove(os.path.join(src_dir, 'CMakeCache.txt'))
+
+        self.cmake_build(src_dir).build()
+
+
+    def stage_dist(self, src_dir: str, dist_dir: str = None) -> None:
+        print("Staging solution directory structure...")
+        # only files that changed since the last build are copied, in parallel
+        stager = Stager(dist_dir or os.path.join(src_dir, "abs-dist-win"), mode=self.stage_mode)
+        stager.add(os.path.join(self.build_dir_for(src_dir), 'stremio.exe'), 'stremio.exe')
+        stager.add('C:\\Windows\\System32\\msvcr120.dll', 'msvcr120.dll')
+        # abs\stremio-depends\MPV\libmpv-2.dll
+        stager.add(self.resolve_depend('mpv'), self.depend_paths["mpv"].split("\\")[-1].replace("2", "1").replace("lib", ""))
+        stager.add_tree(os.path.join(src_dir, 'windows', 'DS'), 'DS')
+        stager.add(os.path.join(src_dir, 'server.js'), 'server.js')
+        stager.add(f"{self.depend_paths['openssl'].replace('openssl.exe', 'libcrypto-1_1.dll')}", 'libcrypto-1_1.dll')
+        stager.add(f"{self.where_is_path_var('node')}", 'node.exe')
+        stager.add(self.resolve_depend('ffmpeg'), 'ffmpeg.exe')
+
+        stats = stager.stage()
+        print(f"Staged: {stats['copied']} copied, {stats['skipped']} unchanged, {stats['removed']} removed.")
+
+
+    def deploy_qt(self, src_dir: str, dist_dir: str = None) -> None:
         print("Deploying QT Dependencies...")
-        os.system(f"{self.depend_paths['qt']} --qmldir . abs-dist-win\\stremio.exe")
-        print("\ndone.\n")
+        # windeployqt only runs when the Qt install, the QML or the exe's DLL imports changed, otherwise its last output is replayed
+        deployer = DeployCache(self.deploy_tool or [self.depend_paths['qt']], dist_dir or os.path.join(src_dir, "abs-dist-win"),
+                               qml_dir=src_dir, cache_root=self.deploy_cache_root, args=self.deploy_args,
+                               version=self.fingerprints.get('qt', {}).get('version', ""), mode=self.stage_mode,
+                               runner=self.toolchain_env().run)
+        deployer.deploy()
+
+
+    @staticmethod
+    def packages_dir_for(dist_dir: str) -> str:
+        """
+        Where the packages of a distribution directory are kept, ie. abs-dist-win-packages.
+        """
+        return f"{os.path.normpath(dist_dir)}-packages"
+
+
+    def package_dist(self, src_dir: str, dist_dir: str = None) -> None:
+        print("Packaging the build...")
+        dist_dir = dist_dir or os.path.join(src_dir, "abs-dist-win")
+        packager = Packager(dist_dir, self.packages_dir_for(dist_dir), level=self.package_level, threads=self.package_threads,
+                            keep_deltas=self.package_keep_deltas)
+        self.built_packages.pop(dist_dir, None)
+
+        result = packager.package(f"stremio-{self.read_stremio_version(src_dir)}")
+        latest = packager.load_latest()
+        if latest:
+            self.built_packages[dist_dir] = os.path.join(packager.out_dir, latest['package'])
+        if result is None:
+            return
+
+        print(f"Package: {os.path.join(packager.out_dir, result['package'])}")
+        if 'delta' in result:
+            stats = result['delta_stats']
+            print(f"Delta: {os.path.join(packager.out_dir, result['delta'])} "
+                  f"({stats['chunks']} new chunks, {stats['bytes'] / 1024 ** 2:.1f} MB, {stats['reused']} reused)")
+
+
+    def build_cache_parts(self, src_dir: str) -> dict:
+        """
+        Everything that decides what a build of src_dir produces, for the remote build cache key.
+
+        Returns:
+            dict | None: The parts of the key, None if the checkout has local changes and must be built here.
+        """
+        rev = GitMirror.git(["-C", src_dir, "rev-parse", "HEAD"], capture=True).strip()
+        # untracked files are left out, the build only compiles what stremio.pro and CMakeLists.txt name
+        if GitMirror.git(["-C", src_dir, "status", "--porcelain", "--untracked-files=no"], capture=True).strip():
+            return None
+
+        # the reported version, or the size for dependencies that report none, never paths or mtimes as they differ per machine
+        toolchain = {}
+        for name in self.BUILD_CACHE_TOOLCHAIN:
+            fp = self.fingerprints.get(name)
+            if fp:
+                toolchain[name] = fp.get('version') or f"size:{fp.get('size')}"
+
+        return {
+            'rev': rev,
+            'server.js': self.read_stremio_version(src_dir),
+            'toolchain': toolchain,
+            'cmake': self.cmake_cache_vars(),
+            'deploy': self.deploy_args
+        }
+
+
+    def remote_cache(self) -> RemoteCache:
+        return RemoteCache(self.build_cache_url, level=self.package_level, threads=self.package_threads)
+
+
+    def remote_fetch(self, src_dir: str, dist_dir: str) -> None:
+        """
+        Pulls the build of this revision and toolchain from the remote build cache into dist_dir.
+        On a hit the build steps are skipped, on a miss remote_store() uploads the result.
+        """
+        self.build_cache_hits.discard(dist_dir)
+        self.build_cache_keys.pop(dist_dir, None)
+
+        parts = self.build_cache_parts(src_dir)
+        if parts is None:
+            print("The checkout has local changes, building without the remote build cache.")
+            return
+        key = RemoteCache.key(parts)
+        self.build_cache_keys[dist_dir] = (key, parts)
+
+        # the cache is only ever a shortcut, whatever goes wrong the build carries on locally
+        try:
+            entry = self.remote_cache().pull(key, dist_dir)
+        except Exception as e:
+            print(f"(!) Could not pull from the build cache {self.build_cache_url}: {e}")
+            return
+
+        if entry is None:
+            print(f"No cached build for {key[:12]}, building locally...")
+            return
+        self.build_cache_hits.add(dist_dir)
+        print(f"Pulled build {key[:12]} from the build cache ({entry['files']} files, {entry['size'] / 1024 ** 2:.1f} MB).")
+
+
+    def remote_store(self, dist_dir: str) -> None:
+        """
+        Uploads a build that missed the remote build cache.
+        """
+        if not self.build_cache_push or dist_dir in self.build_cache_hits or dist_dir not in self.build_cache_keys:
+            return
+
+        key, parts = self.build_cache_keys[dist_dir]
+        try:
+            entry = self.remote_cache().push(key, dist_dir, parts, package=self.built_packages.get(dist_dir))
+        except Exception as e:
+            print(f"(!) Could not push to the build cache {self.build_cache_url}: {e}")
+            return
+        print(f"Pushed build {key[:12]} to the build cache ({entry['size'] / 1024 ** 2:.1f} MB).")
+
+
+    def build_graph(self, src_dir: str = "stremio-shell", dist_dir: str = None, ref: str = None) -> BuildGraph:
+        """
+        Describes the build as named steps with their inputs, outputs and dependencies.
+
+        Args:
+            src_dir (str): The stremio-shell checkout to build.
+            dist_dir (str): Where to stage the build, src_dir\\abs-dist-win if None.
+            ref (str): The branch or tag to clone, the default branch if None.
+        Returns:
+            BuildGraph: The build, ready to run.
+        """
+        dist_dir = dist_dir or os.path.join(src_dir, "abs-dist-win")
+        graph = BuildGraph(os.path.join(src_dir, ".abs-build.json"), workers=self.build_workers)
+
+        # an existing checkout of the default branch is left alone (delete stremio.pro to update it), an asked for ref always runs
+        graph.add("clone", lambda: self.clone_stremio(src_dir, ref), outputs=[os.path.join(src_dir, "stremio.pro")],
+                  key="" if ref else "default branch")
+
+        # on a hit in the remote build cache, everything up to the package is skipped
+        build_deps = ["clone"]
+        cached = None
+        if self.build_cache_url:
+            graph.add("remote-fetch", lambda: self.remote_fetch(src_dir, dist_dir), deps=["clone"])
+            build_deps = ["clone", "remote-fetch"]
+            cached = lambda: dist_dir in self.build_cache_hits
+
+        # server.js only depends on the version in stremio.pro, so it downloads while cmake builds
+        graph.add("server.js", lambda: self.download_serverjs(src_dir), deps=build_deps, skip=cached,
+                  inputs=[os.path.join(src_dir, "stremio.pro")], outputs=[os.path.join(src_dir, "server.js")])
+
+        graph.add("cmake", lambda: self.build_shell(src_dir), deps=build_deps, skip=cached,
+                  inputs=[src_dir], outputs=[os.path.join(self.build_dir_for(src_dir), "stremio.exe")],
+                  key=repr((self.cmake_cache_vars(), self.cmake_generator, self.cmake_jobs, self.compiler_launcher)),
+                  exclude=[".git", "abs-dist-win", "CMakeFiles", "CMakeCache.txt", "Makefile", "*.cmake", "*_autogen",
+                           "*.exe", "*.obj", "*.ilk", "*.pdb", "*.lib", "*.exp", "server.js", ".abs-build.json*",
+                           "abs-dist-win-packages"])
+
+        # the stager does its own change detection, so it always runs
+        graph.add("stage", lambda: self.stage_dist(src_dir, dist_dir), deps=["cmake", "server.js"], skip=cached)
+
+        graph.add("windeployqt", lambda: self.deploy_qt(src_dir, dist_dir), deps=["stage"],
+                  inputs=[os.path.join(dist_dir, "stremio.exe")], outputs=[os.path.join(dist_dir, "Qt5Core.dll")],
+                  key=repr((self.deploy_tool or self.depend_paths['qt'], self.deploy_args)), skip=cached)
+
+        # the packager compares against the last package itself, so it always runs
+        graph.add("package", lambda: self.package_dist(src_dir, dist_dir), deps=["windeployqt"])
+
+        # uploads the package the package step wrote, instead of compressing the build a second time
+        if self.build_cache_url:
+            graph.add("remote-store", lambda: self.remote_store(dist_dir), deps=["package"])
+
+        return graph
+
+
+    def build_stremio(self, src_dir: str = "stremio-shell") -> dict:
+        print("Building Stremio...\n")
+
+        results = self.build_graph(src_dir).run()
+        print()
+        BuildGraph.report(results)
+
+        if any(result['status'] in ('failed', 'blocked') for result in results.values()):
+            print("\nBuild failed! See the steps above.")
+        else:
+            print(f"\nBuild complete! You can find the build in the {os.path.join(src_dir, 'abs-dist-win')} directory.")
 
-        print("Build complete! You can find the build in the stremio-shell\\abs-dist-win directory.")
\ No newline at end of file
+        return results
@@ -0,0 +1,268 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import shutil
+import struct
+import hashlib
+import tempfile
+import subprocess
+
+from typing import Callable, Dict, List, Optional
+
+from fingerprint import Fingerprint
+from helpers import Helpers
+from profiler import Profiler
+from stage import Stager
+
+
+class DeployCache:
+    #  windeployqt's arguments, {qml_dir} and {exe} are filled in
+    DEFAULT_ARGS = ["--qmldir", "{qml_dir}", "{exe}"]
+
+    #  Files under the qml dir that decide which QML modules get deployed
+    QML_FILES = ('.qml', '.js', 'qmldir')
+
+    #  Directories under the qml dir that never hold the app's QML
+    QML_EXCLUDE = ('.git', 'node_modules', 'abs-dist-win', 'abs-dist-win-packages', 'CMakeFiles')
+
+    #  Written into the dist dir to track the replayed files, see Stager
+    MANIFEST_NAME = '.abs-deploy.json'
+
+    #  Files in the dist dir that are never part of a deployment
+    SKIP = ('.abs-stage.json', MANIFEST_NAME, '.abs-tmp')
+
+    def __init__(self, tool: List[str], dist_dir: str, exe_name: str = 'stremio.exe', qml_dir: str = '.', cache_root: str = 'abs/deploy-cache',
+                 args: Optional[List[str]] = None, version: str = "", mode: str = 'hardlink', runner: Optional[Callable] = None):
+        """
+        Runs a Qt deployment tool (windeployqt) once per combination of tool, QML and DLL imports,
+        and records the files it produced. Later deployments with the same inputs replay the
+        recorded files into the dist dir with hardlinks or copies instead of running the tool.
+
+        Args:
+            tool (list): The command of the deployment tool, ie. ["C:\\Qt\\...\\windeployqt.exe"] or ["python", "stub.py"].
+            dist_dir (str): The directory stremio.exe was staged into.
+            exe_name (str): The binary to deploy for, relative to dist_dir.
+            qml_dir (str): The directory the tool scans for QML imports.
+            cache_root (str): Where the recorded deployments are kept.
+            args (list): The tool's arguments, DEFAULT_ARGS if None.
+            version (str): The version the tool reported, folded into the key.
+            mode (str): How replayed files are placed: 'copy', 'hardlink' or 'reflink'.
+            runner (callable): Runs a command like subprocess.run, ie. ToolchainEnv.run.
+        """
+        self.tool = list(tool)
+        self.dist_dir = dist_dir
+        self.exe = os.path.join(dist_dir, exe_name)
+        self.qml_dir = qml_dir
+        self.cache_root = cache_root
+        self.args = list(args or self.DEFAULT_ARGS)
+        self.version = version
+        self.mode = mode
+        self.runner = runner or subprocess.run
+
+
+    @staticmethod
+    def pe_imports(path: str) -> List[str]:
+        """
+        Reads the DLLs a PE binary imports, delay loaded ones included.
+
+        Returns:
+            list: The DLL names, lower case and sorted.
+        Raises:
+            ValueError: If the file is not a PE binary.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        try:
+            if data[:2] != b'MZ':
+                raise ValueError(f"{path} is not a PE binary")
+            pe = struct.unpack_from('<I', data, 0x3c)[0]
+            if data[pe:pe + 4] != b'PE\0\0':
+                raise ValueError(f"{path} is not a PE binary")
+
+            coff = pe + 4
+            sections, opt_size = struct.unpack_from('<H', data, coff + 2)[0], struct.unpack_from('<H', data, coff + 16)[0]
+            opt = coff + 20
+            pe32_plus = struct.unpack_from('<H', data, opt)[0] == 0x20b
+            num_dirs = struct.unpack_from('<I', data, opt + (108 if pe32_plus else 92))[0]
+            dirs = opt + (112 if pe32_plus else 96)
+
+            # VirtualSize, VirtualAddress, SizeOfRawData, PointerToRawData of every section
+            table = [struct.unpack_from('<IIII', data, opt + opt_size + i * 40 + 8) for i in range(sections)]
+        except struct.error as e:
+            raise ValueError(f"{path} is not a valid PE binary: {e}")
+
+        def offset(rva: int) -> int:
+            for vsize, va, raw_size, raw in table:
+                if va <= rva < va + max(vsize, raw_size):
+                    return raw + rva - va
+            raise ValueError(f"RVA {rva:#x} is outside every section of {path}")
+
+        names = set()
+        # the import directory (20 byte descriptors, name at +12) and the delay import directory (32 bytes, name at +4)
+        for index, size, name_at in ((1, 20, 12), (13, 32, 4)):
+            if index >= num_dirs:
+                continue
+            rva = struct.unpack_from('<I', data, dirs + index * 8)[0]
+            if not rva:
+                continue
+
+            pos = offset(rva)
+            while pos + size <= len(data) and any(data[pos:pos + size]):
+                name = offset(struct.unpack_from('<I', data, pos + name_at)[0])
+                names.add(data[name:data.index(b'\0', name)].decode('ascii', 'replace').lower())
+                pos += size
+
+        return sorted(names)
+
+
+    def binary_key(self) -> str:
+        """
+        What the tool sees of the binary: its imports. Binaries that are not PE (ie. a stub
+        on Linux) are keyed by their whole contents instead.
+        """
+        try:
+            return json.dumps(self.pe_imports(self.exe))
+        except ValueError:
+            return f"sha256:{Helpers.hash_file(self.exe, hashlib.sha256()).hexdigest()}"
+
+
+    def qml_hash(self) -> str:
+        """
+        Hashes the contents of the QML under qml_dir, which the tool scans for imports.
+        """
+        hasher = hashlib.sha256()
+        for root, dirs, files in os.walk(self.qml_dir):
+            dirs[:] = sorted(d for d in dirs if d not in self.QML_EXCLUDE and not d.endswith('-build'))
+            for name in sorted(files):
+                if not name.endswith(self.QML_FILES):
+                    continue
+                path = os.path.join(root, name)
+                hasher.update(f"{os.path.relpath(path, self.qml_dir).replace(os.sep, '/')}\n".encode())
+                with open(path, 'rb') as f:
+                    hasher.update(hashlib.sha256(f.read()).digest())
+        return hasher.hexdigest()
+
+
+    def tool_fingerprint(self) -> list:
+        # the command and any file it names (ie. the stub script) by path, size and mtime
+        return [Fingerprint.take(part) if i == 0 or os.path.isfile(part) else part for i, part in enumerate(self.tool)]
+
+
+    def key(self) -> str:
+        """
+        The cache key of a deployment: the tool, its arguments, the QML and the binary's imports.
+        """
+        parts = {
+            'tool': self.tool_fingerprint(),
+            'version': self.version,
+            'args': self.args,
+            'exe': os.path.basename(self.exe),
+            'qml': self.qml_hash(),
+            'imports': self.binary_key()
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+
+
+    def entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_root, key)
+
+
+    def record(self, key: str) -> List[str]:
+        """
+        Runs the tool against a copy of the binary in an empty staging directory and stores
+        everything it produced there under the key. The dist dir is never scanned for what
+        changed: the tool skips files it considers up to date, which would leave them out.
+
+        Returns:
+            list: The produced files, relative to the dist dir.
+        """
+        # assembled under a temporary name, a parallel build recording the same key keeps whichever lands first
+        os.makedirs(self.cache_root, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=f"{key}.", dir=self.cache_root)
+        try:
+            staging = os.path.join(tmp, 'files')
+            exe_rel = os.path.relpath(self.exe, self.dist_dir)
+            exe = os.path.join(staging, exe_rel)
+            os.makedirs(os.path.dirname(exe))
+            shutil.copy2(self.exe, exe)
+
+            cmd = self.tool + [arg.format(qml_dir=os.path.abspath(self.qml_dir), exe=os.path.abspath(exe)) for arg in self.args]
+            with Profiler.span("deploy tool", 'subprocess', args=cmd):
+                self.runner(cmd, check=True)
+            os.remove(exe)
+
+            produced = []
+            for root, _, names in os.walk(staging):
+                for name in names:
+                    rel = os.path.relpath(os.path.join(root, name), staging)
+                    if not rel.endswith(self.SKIP):
+                        produced.append(rel)
+            produced.sort()
+
+            with open(os.path.join(tmp, 'entry.json'), 'w') as f:
+                json.dump({'files': produced, 'tool': self.tool, 'args': self.args}, f, indent=4)
+
+            try:
+                os.rename(tmp, self.entry_dir(key))
+            except OSError:
+                pass
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        return produced
+
+
+    def load_entry(self, key: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.entry_dir(key), 'entry.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def replay(self, key: str, entry: dict) -> dict:
+        """
+        Places the recorded files of a deployment into the dist dir.
+
+        Returns:
+            dict: Counts of files copied, skipped and removed, see Stager.stage.
+        """
+        stager = Stager(self.dist_dir, mode=self.mode, link_threshold=0, manifest_name=self.MANIFEST_NAME)
+        for rel in entry['files']:
+            stager.add(os.path.join(self.entry_dir(key), 'files', rel), rel)
+        return stager.stage()
+
+
+    def deploy(self) -> bool:
+        """
+        Deploys the Qt dependencies of the binary, from the cache when the same deployment was recorded before.
+
+        Returns:
+            bool: True if it was replayed from the cache, False if the tool was run.
+        """
+        key = self.key()
+        entry = self.load_entry(key)
+
+        with Profiler.span("deploy qt", 'deploy', key=key, cached=entry is not None):
+            if entry is None:
+                print(f"No recorded deployment for {key}, running {' '.join(self.tool)}...")
+                self.record(key)
+                entry = self.load_entry(key)
+                if entry is None:
+                    raise OSError(f"Could not record the deployment in {self.entry_dir(key)}")
+                hit = False
+            else:
+                hit = True
+
+            # recorded files are placed through the stager either way, so the dist dir never holds the tool's own copies
+            stats = self.replay(key, entry)
+
+        print(f"Deployed {len(entry['files'])} files {'from the cache' if hit else 'with the tool'} "
+              f"({stats['copied']} placed, {stats['skipped']} unchanged, {stats['removed']} removed).")
+        return hit
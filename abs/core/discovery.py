@@ -0,0 +1,175 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import re
+import json
+import fnmatch
+import hashlib
+
+from typing import Dict, List, Optional
+
+from profiler import Profiler
+
+
+class DiscoveryIndex:
+    def __init__(self, roots: List[str], patterns: Dict[str, List[str]], index_path: Optional[str] = 'abs/discovery.json'):
+        """
+        Finds installed dependencies by walking the candidate install roots once, matching
+        every dependency's path pattern in the same pass. The result is saved to disk along
+        with the mtime of every directory looked at, so repeat runs answer from the index
+        until one of those directories changes.
+
+        Args:
+            roots (list): The directories to search, ie. ["C:\\\\", "D:\\\\"].
+            patterns (dict): Dependency name -> path patterns relative to a root. Components may
+                             use fnmatch wildcards, ie. "Program Files (x86)\\\\OpenSSL-Win*\\\\bin\\\\openssl.exe".
+            index_path (str): Where to keep the index, None to keep it in memory only.
+        """
+        self.roots = list(roots)
+        self.patterns = patterns
+        self.index_path = index_path
+        self.index = None
+
+
+    @staticmethod
+    def split(pattern: str) -> List[str]:
+        return [part for part in re.split(r'[\\/]+', pattern) if part]
+
+
+    def patterns_key(self) -> str:
+        return hashlib.sha256(json.dumps([self.roots, self.patterns], sort_keys=True).encode()).hexdigest()
+
+
+    def build_trie(self) -> dict:
+        """
+        Merges every pattern into one tree of path components, so directories shared
+        by several patterns (ie. "Program Files") are only listed once.
+        """
+        trie = {'children': {}, 'names': []}
+        for name, patterns in self.patterns.items():
+            for pattern in patterns:
+                node = trie
+                for part in self.split(pattern):
+                    node = node['children'].setdefault(part, {'children': {}, 'names': []})
+                node['names'].append(name)
+        return trie
+
+
+    def scan(self) -> dict:
+        """
+        Walks every root once with os.scandir, matching all patterns at the same time.
+
+        Returns:
+            dict: The index, with the matches for each dependency and the mtime of every directory listed.
+        """
+        index = {'key': self.patterns_key(), 'dirs': {}, 'matches': {name: [] for name in self.patterns}}
+        trie = self.build_trie()
+
+        def walk(root: str, path: str, node: dict) -> None:
+            try:
+                index['dirs'][path] = os.stat(path).st_mtime_ns
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                # record missing directories too, so creating them invalidates the index
+                index['dirs'].setdefault(path, None)
+                return
+
+            for entry in entries:
+                for part, child in node['children'].items():
+                    if not fnmatch.fnmatch(entry.name, part):
+                        continue
+
+                    for name in child['names']:
+                        index['matches'][name].append([root, entry.path])
+
+                    if child['children'] and entry.is_dir():
+                        walk(root, entry.path, child)
+
+        with Profiler.span("discovery scan", 'discovery', roots=self.roots) as span:
+            for root in self.roots:
+                walk(root, root, trie)
+            span.set(dirs=len(index['dirs']))
+
+        return index
+
+
+    def is_fresh(self, index: dict) -> bool:
+        """
+        Checks a saved index still describes the disk, using one stat per directory it listed.
+        """
+        if index.get('key') != self.patterns_key():
+            return False
+
+        for path, mtime in index['dirs'].items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                if mtime is not None:
+                    return False
+
+        return True
+
+
+    def load(self, refresh: bool = False) -> dict:
+        """
+        Loads the index from disk if it is still fresh, otherwise rescans and saves it.
+
+        Args:
+            refresh (bool): Rescan even if the saved index is fresh.
+        Returns:
+            dict: The index.
+        """
+        if self.index is not None and not refresh:
+            return self.index
+
+        if not refresh and self.index_path and os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+                if self.is_fresh(index):
+                    self.index = index
+                    return self.index
+            except (OSError, ValueError):
+                pass
+
+        self.index = self.scan()
+
+        if self.index_path:
+            if os.path.dirname(self.index_path): os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            tmp = f"{self.index_path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.index, f, indent=4)
+            os.replace(tmp, self.index_path)
+
+        return self.index
+
+
+    def find(self, name: str, root: Optional[str] = None) -> List[str]:
+        """
+        Returns every path matching a dependency's patterns.
+
+        Args:
+            name (str): The name of the dependency.
+            root (str): Only return matches under this root.
+        Returns:
+            list: The matching paths, in root order.
+        """
+        matches = self.load()['matches'].get(name, [])
+        return [path for match_root, path in matches if root is None or match_root == root]
+
+
+    def root_of(self, path: str) -> Optional[str]:
+        """
+        Returns the root a matched path was found under.
+        """
+        for matches in self.load()['matches'].values():
+            for match_root, match_path in matches:
+                if match_path == path:
+                    return match_root
+        return None
@@ -0,0 +1,179 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from helpers import Helpers
+
+
+@dataclass
+class DownloadJob:
+    """
+    A single artifact queued for download.
+    """
+    name: str
+    url: str
+    out_filename: str
+    out_path: str = '.\\abs\\stremio-depends\\'
+    filename: str = ""
+    is_archive: bool = True
+    sha256: Optional[str] = None
+    mirrors: Optional[List[str]] = None
+    extract: bool = False
+    members: Optional[List[str]] = None
+    keep_archive: bool = True
+    error: Optional[Exception] = None
+
+
+class AggregateProgress:
+    def __init__(self, desc: str = "Downloading"):
+        """
+        One progress bar shared by every download running at once.
+
+        Args:
+            desc (str): The description shown next to the bar.
+        """
+        from tqdm import tqdm
+
+        self.lock = threading.Lock()
+        self.pbar = tqdm(unit='B', unit_scale=True, total=0, desc=desc, colour="green")
+
+
+    def add_total(self, n: int) -> None:
+        """
+        Grows the expected total once a download knows its size.
+        """
+        with self.lock:
+            self.pbar.total += n
+            self.pbar.refresh()
+
+
+    def update(self, n: int) -> None:
+        with self.lock:
+            self.pbar.update(n)
+
+
+    def write(self, msg: str) -> None:
+        """
+        Prints a message without breaking the progress bar.
+        """
+        with self.lock:
+            self.pbar.write(msg)
+
+
+    def close(self) -> None:
+        self.pbar.close()
+
+
+class DownloadManager:
+    def __init__(self, max_workers: int = 4, session = None, segments: int = 1, cache = None):
+        """
+        Downloads queued artifacts with bounded concurrency over one pooled session.
+
+        Args:
+            max_workers (int): The maximum number of downloads running at once.
+            session (requests.Session): The session to download with, one is created if not given.
+            segments (int): The number of ranged segments to split each download into.
+            cache (ArtifactCache): A cache to serve artifacts from and store them in.
+        """
+        self.max_workers = max_workers
+        self.segments = segments
+        self.cache = cache
+        self.session = session or self.make_session(max_workers * segments)
+        self.jobs = []
+
+
+    @staticmethod
+    def make_session(pool_size: int):
+        """
+        Creates a session whose connection pool is large enough for every worker.
+
+        Args:
+            pool_size (int): The number of connections to keep per host.
+        Returns:
+            requests.Session: The session.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+
+    def add(self, name: str, url: str, out_filename: str, out_path: str = '.\\abs\\stremio-depends\\', sha256: Optional[str] = None, mirrors: Optional[List[str]] = None,
+            extract: bool = False, members: Optional[List[str]] = None, keep_archive: bool = True) -> DownloadJob:
+        """
+        Queues an artifact for download.
+
+        Args:
+            name (str): The name of the program.
+            url (str): The url to download the file from.
+            out_filename (str): The filename to save the file as.
+            out_path (str): The directory to save the file in.
+            sha256 (str): The digest the artifact is pinned to, if any.
+            mirrors (list): Other urls serving the same artifact.
+            extract (bool): Extract the artifact as it downloads, if it is an archive.
+            members (list): When extracting, fnmatch patterns of the members to extract.
+            keep_archive (bool): When extracting, also save the archive in out_path.
+        Returns:
+            DownloadJob: The queued job.
+        """
+        job = DownloadJob(name=name, url=url, out_filename=out_filename, out_path=out_path, sha256=sha256, mirrors=mirrors,
+                          extract=extract, members=members, keep_archive=keep_archive)
+        self.jobs.append(job)
+        return job
+
+
+    def fetch(self, job: DownloadJob, progress: AggregateProgress) -> DownloadJob:
+        import requests
+
+        try:
+            if self.cache:
+                job.filename, job.is_archive = self.cache.fetch(
+                    job.url, job.out_filename, out_path=job.out_path, sha256=job.sha256,
+                    session=self.session, progress=progress, segments=self.segments, mirrors=job.mirrors,
+                    extract=job.extract, members=job.members, keep_archive=job.keep_archive
+                )
+            else:
+                job.filename, job.is_archive = Helpers.download_file(
+                    job.url, job.out_filename, out_path=job.out_path, session=self.session, progress=progress, segments=self.segments, mirrors=job.mirrors,
+                    extract=job.extract, members=job.members, keep_archive=job.keep_archive
+                )
+            progress.write(f"Download of {job.filename} complete.")
+        except (requests.RequestException, OSError, ValueError) as e:
+            job.error = e
+            progress.write(f"(!) Download of {job.out_filename} failed: {e}")
+
+        return job
+
+
+    def run(self) -> Iterator[DownloadJob]:
+        """
+        Downloads every queued job, yielding each one as soon as it finishes so it
+        can be installed while the rest are still downloading.
+
+        Yields:
+            DownloadJob: A finished job, check its error attribute before using it.
+        """
+        jobs, self.jobs = self.jobs, []
+        if not jobs:
+            return
+
+        progress = AggregateProgress(desc=f"Downloading {len(jobs)} file(s)")
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+                futures = [pool.submit(self.fetch, job, progress) for job in jobs]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            progress.close()
@@ -0,0 +1,45 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import string
+
+from typing import List
+
+
+class Drives:
+    """
+    Where to look for installed programs, per platform. Platform specific modules (ctypes.windll)
+    are only imported on the platform that has them, and only when asked.
+    """
+
+    @staticmethod
+    def letters() -> List[str]:
+        """
+        Returns the letters of every logical drive, ie. ['C', 'D']. Empty off Windows.
+        """
+        if os.name != 'nt':
+            return []
+
+        from ctypes import windll
+
+        letters = []
+        d_bitmask = windll.kernel32.GetLogicalDrives()
+        for letter in string.ascii_uppercase:
+            if d_bitmask & 1:
+                letters.append(letter)
+            d_bitmask >>= 1
+        return letters
+
+
+    @staticmethod
+    def roots() -> List[str]:
+        """
+        Returns the root of every drive, ie. ['C:\\', 'D:\\'], or ['/'] off Windows.
+        """
+        if os.name != 'nt':
+            return ['/']
+        return [f"{letter}:\\" for letter in Drives.letters()]
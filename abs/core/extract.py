@@ -0,0 +1,484 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import zlib
+import struct
+import fnmatch
+import zipfile
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+
+class Extractor:
+    def __init__(self, workers: Optional[int] = None, processes: bool = False):
+        """
+        Extracts zip and 7z archives using every core.
+
+        Args:
+            workers (int): The number of zip extraction threads, defaults to the cpu count.
+            processes (bool): Let py7zr decompress 7z blocks in processes rather than threads.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+
+
+    @staticmethod
+    def select(names: List[str], members: Optional[List[str]]) -> List[str]:
+        """
+        Picks the archive members matching any of the given patterns.
+
+        Args:
+            names (list): Every member name in the archive.
+            members (list): fnmatch patterns, ie. "*/bin/*" or "libmpv-2.dll". None selects everything.
+        Returns:
+            list: The selected member names.
+        """
+        if members is None:
+            return names
+
+        # archives always use forward slashes, but allow patterns written windows style
+        patterns = [m.replace('\\', '/') for m in members]
+        return [name for name in names if any(fnmatch.fnmatchcase(name, p) for p in patterns)]
+
+
+    def extract(self, archive: str, out_dir: str, members: Optional[List[str]] = None, filename: Optional[str] = None) -> str:
+        """
+        Extracts an archive, picking the zip or 7z engine from its extension.
+
+        Args:
+            archive (str): The archive to extract.
+            out_dir (str): The directory to extract into.
+            members (list): fnmatch patterns of the members to extract, None for everything.
+            filename (str): The name whose extension picks the engine, when the archive is stored under another (ie. a cache blob).
+        Returns:
+            str: The output directory.
+        """
+        if (filename or archive).endswith(".7z"):
+            return self.extract_7z(archive, out_dir, members)
+        return self.extract_zip(archive, out_dir, members)
+
+
+    @staticmethod
+    def safe_target(out_dir: str, name: str) -> Optional[str]:
+        """
+        Where an archive member goes, None for names that would escape out_dir.
+        """
+        parts = name.replace('\\', '/').split('/')
+        if '..' in parts or name.startswith('/') or ':' in parts[0]:
+            return None
+        return os.path.join(out_dir, *parts)
+
+
+    @staticmethod
+    def safe_members(out_dir: str, names: List[str]) -> List[str]:
+        """
+        Drops the member names that would escape out_dir (ie. "../evil.dll"), with a warning for each.
+        """
+        safe = []
+        for name in names:
+            if Extractor.safe_target(out_dir, name):
+                safe.append(name)
+            else:
+                print(f"(!) Skipping archive member {name}, it would be extracted outside of {out_dir}")
+        return safe
+
+
+    def stream(self, filename: str, out_dir: str, members: Optional[List[str]] = None, spool: bool = True):
+        """
+        A writable sink that extracts an archive while it downloads. Zip archives are extracted
+        member by member as their bytes arrive. 7z archives need to be seeked, so they are
+        spooled to a bounded buffer first, which only happens when spool is set.
+
+        Args:
+            filename (str): The name of the archive, its extension picks the format.
+            out_dir (str): The directory to extract into.
+            members (list): fnmatch patterns of the members to extract, None for everything.
+            spool (bool): Spool 7z archives. When the archive is being written to disk anyway, extracting it from there is cheaper.
+        Returns:
+            ZipStream | SpooledArchive | None: The sink, None if the archive is better extracted once it is on disk.
+        """
+        if filename.endswith('.zip'):
+            return ZipStream(out_dir, members)
+        if filename.endswith('.7z') and spool:
+            return SpooledArchive(filename, out_dir, members, self)
+        return None
+
+
+    def extract_zip(self, archive: str, out_dir: str, members: Optional[List[str]] = None) -> str:
+        """
+        Extracts a zip archive, spreading its members across worker threads. zlib releases
+        the GIL while inflating, so each thread gets its own handle and decompresses in parallel.
+        """
+        with zipfile.ZipFile(archive, 'r') as zip_ref:
+            infos = {info.filename: info for info in zip_ref.infolist()}
+
+        selected = [infos[name] for name in self.safe_members(out_dir, self.select(list(infos), members))]
+
+        # create every directory up front so the workers never race on makedirs
+        for info in selected:
+            target = self.safe_target(out_dir, info.filename)
+            os.makedirs(target if info.is_dir() else os.path.dirname(target), exist_ok=True)
+
+        files = [info for info in selected if not info.is_dir()]
+        if not files:
+            return out_dir
+
+        # deal the largest members out first, each to the least loaded worker
+        shares = [[] for _ in range(min(self.workers, len(files)))]
+        loads = [0] * len(shares)
+        for info in sorted(files, key=lambda i: i.compress_size, reverse=True):
+            idx = loads.index(min(loads))
+            shares[idx].append(info)
+            loads[idx] += info.compress_size
+
+        def work(share):
+            with zipfile.ZipFile(archive, 'r') as zip_ref:
+                for info in share:
+                    zip_ref.extract(info, out_dir)
+
+        with ThreadPoolExecutor(max_workers=len(shares)) as pool:
+            list(pool.map(work, shares))
+
+        return out_dir
+
+
+    def extract_7z(self, archive: str, out_dir: str, members: Optional[List[str]] = None) -> str:
+        """
+        Extracts a 7z archive. Opened by filename, py7zr decompresses each solid block
+        concurrently, and blocks holding none of the selected members are skipped entirely.
+        """
+        # py7zr pulls in every compression library it supports, so it is only loaded for 7z archives
+        import py7zr
+
+        with py7zr.SevenZipFile(archive, 'r', mp=self.processes) as zip_ref:
+            self.extract_opened_7z(zip_ref, out_dir, members)
+
+        return out_dir
+
+
+    @staticmethod
+    def extract_opened_7z(zip_ref, out_dir: str, members: Optional[List[str]] = None) -> None:
+        """
+        Extracts the selected members of an open py7zr.SevenZipFile, skipping any that would escape out_dir.
+        """
+        names = zip_ref.getnames()
+        targets = Extractor.safe_members(out_dir, Extractor.select(names, members))
+        if len(targets) == len(names):
+            zip_ref.extractall(out_dir)
+        else:
+            zip_ref.extract(out_dir, targets=targets)
+
+
+class ZipStream:
+    #  Local file header, data descriptor and the records that follow the last member
+    LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+    LOCAL_SIG = b'PK\x03\x04'
+    DESCRIPTOR_SIG = b'PK\x07\x08'
+    END_SIGS = (b'PK\x01\x02', b'PK\x05\x06', b'PK\x06\x06')
+
+    #  The methods that can be inflated without seeking: stored and deflate
+    METHODS = (0, 8)
+
+    def __init__(self, out_dir: str, members: Optional[List[str]] = None, max_buffered: int = 32 * 1024 * 1024):
+        """
+        Extracts a zip archive from a stream of its bytes, by reading the local header in front
+        of each member instead of the central directory at the end. Bytes are handed to a worker
+        thread, so inflating overlaps with whatever produces them (ie. the download), and written
+        ones are copied once, into the buffer the worker takes them from.
+
+        Args:
+            out_dir (str): The directory to extract into.
+            members (list): fnmatch patterns of the members to extract, None for everything.
+            max_buffered (int): Bytes written but not yet taken by the worker, bounding the memory used.
+        Raises:
+            ValueError: From write() or close(), if the archive uses something that cannot be
+            streamed (encryption, another compression method, a stored member of unknown size) or is corrupt.
+        """
+        self.out_dir = out_dir
+        self.members = members
+        self.max_buffered = max_buffered
+        self.incoming = bytearray()
+        self.ended = False
+        self.cond = threading.Condition()
+        self.error: Optional[BaseException] = None
+        self.extracted: List[str] = []
+
+        self.buf = bytearray()
+        self.state = 'header'
+        self.member = None
+
+        self.worker = threading.Thread(target=self.work, name='zip-stream', daemon=True)
+        self.worker.start()
+
+
+    def write(self, data) -> int:
+        # data may be a view of a buffer the caller reuses, so it is copied before returning
+        with self.cond:
+            while len(self.incoming) >= self.max_buffered and not self.error:
+                self.cond.wait()
+            if self.error:
+                raise self.error
+            self.incoming += data
+            self.cond.notify_all()
+        return len(data)
+
+
+    def end(self) -> None:
+        with self.cond:
+            self.ended = True
+            self.cond.notify_all()
+
+
+    def close(self) -> None:
+        """
+        Waits for the worker to finish the archive.
+
+        Raises:
+            ValueError: If the archive could not be extracted, or ended early.
+        """
+        self.end()
+        self.worker.join()
+        if self.error:
+            raise self.error
+        if self.state not in ('header', 'done'):
+            self.discard()
+            raise ValueError("The zip archive ended in the middle of a member")
+
+
+    def abort(self) -> None:
+        """
+        Stops the worker and discards the member being written.
+        """
+        self.error = self.error or ValueError("aborted")
+        self.end()
+        self.worker.join()
+        self.discard()
+
+
+    def work(self) -> None:
+        while True:
+            with self.cond:
+                while not self.incoming and not self.ended:
+                    self.cond.wait()
+                if not self.incoming:
+                    return
+                data, self.incoming = self.incoming, bytearray()
+                self.cond.notify_all()
+            if self.error:
+                continue
+
+            try:
+                # taken over as it is when nothing of the last one is left
+                if self.buf:
+                    self.buf += data
+                else:
+                    self.buf = data
+                while self.step():
+                    pass
+            except Exception as e:
+                self.error = e if isinstance(e, ValueError) else ValueError(f"Could not extract the zip stream: {e}")
+                self.discard()
+
+
+    def discard(self) -> None:
+        if self.member and self.member.get('file'):
+            self.member['file'].close()
+            os.remove(self.member['tmp'])
+        self.member = None
+
+
+    def step(self) -> bool:
+        """
+        Consumes what it can of the buffer.
+
+        Returns:
+            bool: True if it made progress and should be called again.
+        """
+        if self.state == 'header':
+            return self.read_header()
+        if self.state == 'data':
+            return self.read_data()
+        if self.state == 'descriptor':
+            return self.read_descriptor()
+
+        # past the last member, the central directory is not needed
+        self.buf.clear()
+        return False
+
+
+    def read_header(self) -> bool:
+        if len(self.buf) < 4:
+            return False
+        if bytes(self.buf[:4]) in self.END_SIGS:
+            self.state = 'done'
+            return True
+        if bytes(self.buf[:4]) != self.LOCAL_SIG:
+            raise ValueError("Not a zip stream, or a member header is corrupt")
+        if len(self.buf) < self.LOCAL_HEADER.size:
+            return False
+
+        _, _, flags, method, _, _, crc, csize, usize, name_len, extra_len = self.LOCAL_HEADER.unpack_from(self.buf)
+        end = self.LOCAL_HEADER.size + name_len + extra_len
+        if len(self.buf) < end:
+            return False
+
+        name = bytes(self.buf[self.LOCAL_HEADER.size:self.LOCAL_HEADER.size + name_len]).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = bytes(self.buf[self.LOCAL_HEADER.size + name_len:end])
+        del self.buf[:end]
+
+        zip64 = False
+        pos = 0
+        while pos + 4 <= len(extra):
+            tag, size = struct.unpack_from('<HH', extra, pos)
+            if tag == 0x0001:
+                zip64 = True
+                values = list(struct.unpack_from(f"<{size // 8}Q", extra, pos + 4))
+                if usize == 0xFFFFFFFF and values: usize = values.pop(0)
+                if csize == 0xFFFFFFFF and values: csize = values.pop(0)
+            pos += 4 + size
+
+        if flags & 0x1:
+            raise ValueError(f"{name} is encrypted")
+        if method not in self.METHODS:
+            raise ValueError(f"{name} uses compression method {method}, which cannot be streamed")
+        descriptor = bool(flags & 0x8)
+        if descriptor and method == 0:
+            raise ValueError(f"{name} is stored without its size, it cannot be streamed")
+
+        member = {'name': name, 'method': method, 'crc': crc, 'csize': csize, 'usize': usize, 'zip64': zip64,
+                  'descriptor': descriptor, 'left': csize, 'crc_now': 0, 'size_now': 0, 'read': 0,
+                  'inflate': zlib.decompressobj(-15) if method == 8 else None, 'file': None}
+
+        target = Extractor.safe_target(self.out_dir, name)
+        if target is None:
+            print(f"(!) Skipping archive member {name}, it would be extracted outside of {self.out_dir}")
+        elif Extractor.select([name], self.members):
+            if name.endswith('/'):
+                os.makedirs(target, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                member['target'], member['tmp'] = target, f"{target}.abs-tmp"
+                member['file'] = open(member['tmp'], 'wb')
+
+        self.member = member
+        self.state = 'data'
+        return True
+
+
+    def emit(self, data: bytes) -> None:
+        member = self.member
+        member['crc_now'] = zlib.crc32(data, member['crc_now'])
+        member['size_now'] += len(data)
+        if member['file']:
+            member['file'].write(data)
+
+
+    def read_data(self) -> bool:
+        member = self.member
+        if not member['descriptor'] and member['left'] == 0:
+            self.finish()
+            return True
+        if not self.buf:
+            return False
+
+        if member['descriptor']:
+            # the size is only in the descriptor after the data, so inflate until deflate says the member is over
+            data = bytes(self.buf)
+            self.buf.clear()
+            self.emit(member['inflate'].decompress(data))
+            member['read'] += len(data) - len(member['inflate'].unused_data)
+            if member['inflate'].eof:
+                self.buf[:0] = member['inflate'].unused_data
+                self.state = 'descriptor'
+            return member['inflate'].eof
+
+        take = min(len(self.buf), member['left'])
+        data = bytes(self.buf[:take])
+        del self.buf[:take]
+        member['left'] -= take
+        self.emit(member['inflate'].decompress(data) if member['inflate'] else data)
+
+        if member['left'] == 0:
+            if member['inflate']:
+                self.emit(member['inflate'].flush())
+            self.finish()
+        return True
+
+
+    def read_descriptor(self) -> bool:
+        member = self.member
+        sig = 4 if bytes(self.buf[:4]) == self.DESCRIPTOR_SIG else 0
+        size = 20 if member['zip64'] else 12
+        if len(self.buf) < sig + size:
+            return False
+
+        fmt = '<IQQ' if member['zip64'] else '<III'
+        member['crc'], csize, member['usize'] = struct.unpack_from(fmt, self.buf, sig)
+        del self.buf[:sig + size]
+        if csize != member['read']:
+            raise ValueError(f"{member['name']} is corrupt: its descriptor says {csize} compressed bytes, {member['read']} were read")
+        self.finish()
+        return True
+
+
+    def finish(self) -> None:
+        member = self.member
+        if member['crc_now'] != member['crc'] or member['size_now'] != member['usize']:
+            raise ValueError(f"{member['name']} is corrupt: CRC or size mismatch")
+
+        if member['file']:
+            member['file'].close()
+            os.replace(member['tmp'], member['target'])
+            self.extracted.append(member['name'])
+
+        self.member = None
+        self.state = 'header'
+
+
+class SpooledArchive:
+    def __init__(self, filename: str, out_dir: str, members: Optional[List[str]] = None, extractor: Optional[Extractor] = None,
+                 max_memory: int = 64 * 1024 * 1024):
+        """
+        Collects an archive that has to be seeked (7z) without writing it to disk if it fits in
+        max_memory, then extracts it once it is complete.
+
+        Args:
+            filename (str): The name of the archive.
+            out_dir (str): The directory to extract into.
+            members (list): fnmatch patterns of the members to extract, None for everything.
+            extractor (Extractor): The extractor to use.
+            max_memory (int): Bytes kept in memory before the buffer spills to a temporary file.
+        """
+        self.filename = filename
+        self.out_dir = out_dir
+        self.members = members
+        self.extractor = extractor or Extractor()
+        self.spool = tempfile.SpooledTemporaryFile(max_size=max_memory, prefix='abs-', suffix=os.path.splitext(filename)[1])
+
+
+    def write(self, data) -> int:
+        return self.spool.write(data)
+
+
+    def close(self) -> None:
+        import py7zr
+
+        try:
+            self.spool.seek(0)
+            with py7zr.SevenZipFile(self.spool, 'r', mp=self.extractor.processes) as zip_ref:
+                Extractor.extract_opened_7z(zip_ref, self.out_dir, self.members)
+        except py7zr.exceptions.ArchiveError as e:
+            raise ValueError(f"Could not extract {self.filename}: {e}")
+        finally:
+            self.spool.close()
+
+
+    def abort(self) -> None:
+        self.spool.close()
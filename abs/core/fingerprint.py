@@ -0,0 +1,91 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import shutil
+import hashlib
+
+from typing import Optional
+
+from helpers import Helpers
+
+
+class Fingerprint:
+
+    @staticmethod
+    def resolve(path: str) -> Optional[str]:
+        """
+        Resolves a recorded dependency path, which may be a bare command on the PATH (ie. "git").
+
+        Args:
+            path (str): The recorded path.
+        Returns:
+            str | None: The absolute path of the file, or None if it does not exist.
+        """
+        if not path:
+            return None
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+
+        found = shutil.which(path)
+        return os.path.abspath(found) if found else None
+
+
+    @staticmethod
+    def take(path: str, version: str = "", with_hash: bool = False) -> Optional[dict]:
+        """
+        Fingerprints a dependency so later runs can tell whether it changed.
+
+        Args:
+            path (str): The recorded path of the dependency.
+            version (str): The version string the dependency reported.
+            with_hash (bool): Also store the SHA-256 of the file.
+        Returns:
+            dict | None: The fingerprint, or None if the path could not be resolved.
+        """
+        resolved = Fingerprint.resolve(path)
+        if not resolved:
+            return None
+
+        st = os.stat(resolved)
+        fp = {
+            'path': resolved,
+            'version': version,
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns
+        }
+        if with_hash:
+            fp['sha256'] = Helpers.hash_file(resolved, hashlib.sha256()).hexdigest()
+
+        return fp
+
+
+    @staticmethod
+    def matches(fp: dict) -> bool:
+        """
+        Checks a fingerprint against the disk with a single stat call.
+
+        Args:
+            fp (dict): The fingerprint.
+        Returns:
+            bool: True if the file is still there with the same size and mtime.
+        """
+        try:
+            st = os.stat(fp['path'])
+        except (OSError, KeyError, TypeError):
+            return False
+
+        return st.st_size == fp.get('size') and st.st_mtime_ns == fp.get('mtime')
+
+
+    @staticmethod
+    def verify_hash(fp: dict) -> bool:
+        """
+        Checks the stored hash of a fingerprint, for callers that want more than size and mtime.
+        """
+        if 'sha256' not in fp:
+            return True
+        return Helpers.hash_file(fp['path'], hashlib.sha256()).hexdigest() == fp['sha256']
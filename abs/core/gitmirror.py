@@ -0,0 +1,220 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import re
+import posixpath
+import threading
+import subprocess
+
+from typing import Dict, List, Optional
+
+from profiler import Profiler
+
+
+class GitMirror:
+    #  How workspaces are created from the mirror
+    MODES = ('partial', 'shallow', 'full', 'worktree')
+
+    def __init__(self, url: str, mirror_root: str = 'abs/git', jobs: int = 8):
+        """
+        Keeps a local bare mirror of a repository and of its submodules, and creates workspaces
+        from it, so the network is only used for an incremental fetch.
+
+        Args:
+            url (str): The upstream repository.
+            mirror_root (str): Where the mirrors are kept.
+            jobs (int): Submodules fetched at once.
+        """
+        self.url = url
+        self.mirror_root = mirror_root
+        self.jobs = jobs
+        self.mirror_dir = os.path.abspath(os.path.join(mirror_root, self.mirror_name(url)))
+        self.updated = set()
+        self.lock = threading.Lock()
+
+
+    @staticmethod
+    def mirror_name(url: str) -> str:
+        name = re.sub(r'\.git$', '', url.rstrip('/\\')).replace('\\', '/').split('/')[-1]
+        return re.sub(r'[^\w.-]', '_', name) + '.git'
+
+
+    @staticmethod
+    def file_url(path: str) -> str:
+        """
+        A file:// url for a local repository. Plain paths make git ignore --depth and --filter.
+        """
+        return 'file://' + ('/' if os.name == 'nt' else '') + os.path.abspath(path).replace('\\', '/')
+
+
+    @staticmethod
+    def git(args: List[str], cwd: Optional[str] = None, capture: bool = False) -> str:
+        """
+        Runs a git command, raising CalledProcessError if it fails.
+        """
+        # submodules are cloned from local mirrors, which git refuses by default since 2.38.1
+        with Profiler.span(f"git {args[0] if args[0] != '-C' else args[2]}", 'subprocess', args=args):
+            sp = subprocess.run(["git", "-c", "protocol.file.allow=always"] + args, cwd=cwd, check=True,
+                                stdout=subprocess.PIPE if capture else None)
+        return sp.stdout.decode(errors='replace') if capture else ""
+
+
+    def update_one(self, url: str, mirror_dir: str) -> None:
+        """
+        Clones a bare mirror, or fetches what changed since the last time. Each mirror is updated once per run.
+        """
+        if mirror_dir in self.updated:
+            return
+
+        if os.path.exists(os.path.join(mirror_dir, 'HEAD')):
+            print(f"Fetching {url}...")
+            self.git(["--git-dir", mirror_dir, "fetch", "--prune", "--quiet", "origin"])
+        else:
+            print(f"Mirroring {url}...")
+            os.makedirs(os.path.dirname(mirror_dir), exist_ok=True)
+            self.git(["clone", "--mirror", "--quiet", url, mirror_dir])
+            # lets workspaces clone from it with --filter
+            self.git(["--git-dir", mirror_dir, "config", "uploadpack.allowFilter", "true"])
+            self.git(["--git-dir", mirror_dir, "config", "uploadpack.allowAnySHA1InWant", "true"])
+
+        self.updated.add(mirror_dir)
+
+
+    def resolve_url(self, url: str) -> str:
+        """
+        Resolves a relative submodule url (ie. ../libmpv.git) against the upstream url.
+        """
+        if not url.startswith(('./', '../')):
+            return url
+        if '://' in self.url:
+            scheme, path = self.url.split('://', 1)
+            return f"{scheme}://{posixpath.normpath(posixpath.join(path, url))}"
+        return os.path.normpath(os.path.join(self.url, url))
+
+
+    def submodules(self, ref: Optional[str] = None) -> Dict[str, str]:
+        """
+        Reads the submodules of a ref from the mirror's .gitmodules.
+
+        Returns:
+            dict: The upstream url of each submodule, by name.
+        """
+        try:
+            out = self.git(["--git-dir", self.mirror_dir, "config", "--blob", f"{ref or 'HEAD'}:.gitmodules",
+                            "--get-regexp", r"^submodule\..*\.url$"], capture=True)
+        except subprocess.CalledProcessError:
+            return {}
+
+        modules = {}
+        for line in out.splitlines():
+            key, url = line.split(' ', 1)
+            modules[key[len('submodule.'):-len('.url')]] = self.resolve_url(url.strip())
+        return modules
+
+
+    def submodule_mirror(self, name: str) -> str:
+        return os.path.abspath(os.path.join(self.mirror_root, 'modules', self.mirror_name(name)))
+
+
+    def update(self, ref: Optional[str] = None) -> None:
+        """
+        Brings the mirror and the mirrors of the submodules used by ref up to date.
+        """
+        with self.lock:
+            self.update_one(self.url, self.mirror_dir)
+            for name, url in self.submodules(ref).items():
+                self.update_one(url, self.submodule_mirror(name))
+
+
+    def checkout_submodules(self, dest: str, ref: Optional[str] = None) -> None:
+        """
+        Points the workspace's submodules at their mirrors and checks them all out at once.
+        """
+        modules = self.submodules(ref)
+        if not modules:
+            return
+
+        self.git(["-C", dest, "submodule", "init", "--quiet"])
+        for name in modules:
+            self.git(["-C", dest, "config", f"submodule.{name}.url", self.file_url(self.submodule_mirror(name))])
+        self.git(["-C", dest, "submodule", "update", "--recursive", "--quiet", "--jobs", str(self.jobs)])
+
+
+    def local_changes(self, dest: str) -> List[str]:
+        """
+        The tracked files of a workspace with uncommitted changes, untracked files (ie. build outputs) aside.
+        """
+        status = self.git(["-C", dest, "status", "--porcelain", "--untracked-files=no"], capture=True)
+        return [line[3:] for line in status.splitlines() if line.strip()]
+
+
+    def workspace(self, dest: str, ref: Optional[str] = None, mode: str = 'partial') -> bool:
+        """
+        Creates a workspace at ref from the mirror, or moves an existing one to ref. An existing
+        workspace with uncommitted changes is never overwritten: it is left as it is when no ref
+        was asked for, and refused when one was.
+
+        Args:
+            dest (str): The workspace directory.
+            ref (str): A branch, tag or commit, the default branch if None.
+            mode (str): 'partial' (--filter=blob:none), 'shallow' (--depth 1), 'full' or 'worktree'.
+        Returns:
+            bool: True if the workspace was created or updated, False if it was left alone.
+        Raises:
+            ValueError: If mode is unknown, or ref was asked for over uncommitted changes.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown workspace mode: {mode}, expected one of {', '.join(self.MODES)}")
+
+        exists = os.path.exists(os.path.join(dest, '.git'))
+        if exists:
+            changed = self.local_changes(dest)
+            if changed and ref:
+                raise ValueError(f"{dest} has uncommitted changes ({', '.join(changed[:5])}), refusing to check out {ref} over them")
+            if changed:
+                print(f"{dest} has uncommitted changes ({', '.join(changed[:5])}), leaving it as it is.")
+                return False
+
+        self.update(ref)
+        target = ref or 'HEAD'
+
+        with Profiler.span(f"workspace {os.path.basename(os.path.normpath(dest))}", 'git', mode=mode, ref=target):
+            if exists:
+                print(f"Updating workspace {dest} to {target}...")
+                # the tree is clean, so --force only matters for files an explicitly asked for ref replaces
+                force = ["--force"] if ref else []
+                if mode == 'worktree':
+                    # HEAD inside a worktree is its own, the mirror's is what the default branch points at
+                    commit = self.git(["--git-dir", self.mirror_dir, "rev-parse", f"{target}^{{commit}}"], capture=True).strip()
+                    self.git(["-C", dest, "checkout", "--quiet", *force, "--detach", commit])
+                else:
+                    depth = ["--depth", "1"] if mode == 'shallow' else []
+                    self.git(["-C", dest, "fetch", "--quiet", *depth, "origin", target])
+                    self.git(["-C", dest, "checkout", "--quiet", *force, "--detach", "FETCH_HEAD"])
+
+            elif mode == 'worktree':
+                print(f"Adding worktree {dest} at {target}...")
+                self.git(["--git-dir", self.mirror_dir, "worktree", "prune"])
+                self.git(["--git-dir", self.mirror_dir, "worktree", "add", "--quiet", "--force", "--detach", os.path.abspath(dest), target])
+
+            else:
+                print(f"Creating workspace {dest} at {target} ({mode})...")
+                args = ["clone", "--quiet", "--no-checkout"]
+                if mode == 'partial':
+                    args += ["--filter=blob:none"]
+                elif mode == 'shallow':
+                    args += ["--depth", "1"]
+                self.git(args + [self.file_url(self.mirror_dir), dest])
+
+                # branches, tags and commits alike are fetched by name and checked out detached
+                if ref:
+                    self.git(["-C", dest, "fetch", "--quiet", *(["--depth", "1"] if mode == 'shallow' else []), "origin", ref])
+                    target = 'FETCH_HEAD'
+                self.git(["-C", dest, "checkout", "--quiet", "--force", "--detach", target])
+
+            self.checkout_submodules(dest, ref)
+        return True
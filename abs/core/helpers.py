@@ -6,15 +6,28 @@
 
 import os
 import re
+import json
+import shutil
+import time
+import threading
 import subprocess
-import zipfile
-import requests
-import py7zr
 
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
+
+# requests and tqdm are imported where they are used, runs that only build never pay for them
+from extract import Extractor
+from mirrors import Mirrors
+from transfer import Transfer, ThrottledProgress, DownloadTarget
+from profiler import Profiler
 
 
 class Helpers:
+    #  Set to False for unattended runs, prompts then take their default answer instead of blocking on input()
+    interactive = True
+
+    #  Seconds to wait for a connection, and for the next bytes of a transfer before it counts as stalled
+    TIMEOUT = (10, 30)
 
     @staticmethod
     def cls() -> None:
@@ -25,18 +38,27 @@ class Helpers:
 
 
     @staticmethod
-    def yes_no_prompt(prompt: str) -> bool:
+    def yes_no_prompt(prompt: str, default: bool = None) -> bool:
         """
         Prompts the user for a yes or no answer given a prompt.
 
         Args:
             prompt (str): The prompt to display to the user.
+            default (bool): The answer used when running non-interactively.
         Returns:
             bool: True if the user answered yes, False if the user answered no.
+        Raises:
+            RuntimeError: If running non-interactively and the prompt has no default.
         """
         yes = ["yes", "y"]
         no = ["no", "n"]
 
+        if not Helpers.interactive:
+            if default is None:
+                raise RuntimeError(f"Cannot answer \"{prompt}\" when running non-interactively.")
+            print(f"{prompt}\nYes/No: {'yes' if default else 'no'} (non-interactive)")
+            return default
+
         while True:
             answer = input(f"{prompt}\nYes/No: ").lower()
             if answer in yes:
@@ -48,76 +70,402 @@ class Helpers:
 
 
     @staticmethod
-    def download_file(url, out_filename: str, is_archive = True, out_path: str = '.\\abs\\stremio-depends\\'):
+    def pause(prompt: str) -> None:
+        """
+        Waits for the user to press enter, does nothing when running non-interactively.
+        """
+        if Helpers.interactive:
+            input(prompt)
+
+
+    @staticmethod
+    def archive_filename(r, out_filename: str, is_archive: bool = True) -> tuple:
+        """
+        Works out the filename and archive type of a download from its response.
+
+        Args:
+            r (requests.Response): The response of the download.
+            out_filename (str): The filename to save the file as.
+            is_archive (bool): Whether the file could be an archive.
+        Returns:
+            tuple: The (possibly renamed) filename and whether it is an archive.
+        """
+        try:
+            if ".zip" in r.headers['Content-Type'] or ".zip" in r.request.url:
+                out_filename = out_filename.replace(".exe", ".zip")
+            elif ".7z" in r.headers['Content-Type'] or ".7z" in r.request.url:
+                out_filename = out_filename.replace(".exe", ".7z")
+            else:
+                is_archive = False
+
+        except KeyError as e:
+            print(f"(!) {e} not found in headers... Assuming file is not an archive.")
+
+        return (out_filename, is_archive)
+
+
+    @staticmethod
+    def download_file(url, out_filename: str, is_archive = True, out_path: str = '.\\abs\\stremio-depends\\', session = None, progress = None, segments: int = 1, hasher = None, mirrors: list = None,
+                      extract: bool = False, members: list = None, keep_archive: bool = True, extract_to: str = None):
         """
         Downloads a file from a given url.
 
         Args:
             url (str): The url to download the file from.
             out_filename (str): The filename to save the file as.
+            session (requests.Session): A session to reuse pooled connections from.
+            progress (AggregateProgress): A shared progress display to report to instead of a per-file bar.
+            segments (int): Split the file into this many ranges fetched in parallel, if the server allows it.
+            hasher (hashlib._Hash): A hash object updated with the bytes of the file.
+            mirrors (list): Other urls serving the same file. The fastest is used and the others take over if it fails.
+            extract (bool): Extract archives into Helpers.extract_dir() as they download. Zip members are written as
+                            their bytes arrive, so such downloads use a single stream rather than segments.
+            members (list): When extracting, fnmatch patterns of the members to extract. None extracts everything.
+            keep_archive (bool): When extracting, also save the archive itself. Without it a zip never touches the disk
+                                 and a 7z is held in a bounded buffer.
+            extract_to (str): The directory Helpers.extract_dir() is resolved against, out_path if None.
+        Returns:
+            tuple: The (possibly renamed) filename and whether it is an archive.
+        """
+        with Profiler.span(f"download {out_filename}", 'download', url=url, segments=segments) as span:
+            if out_path and not os.path.exists(out_path): os.makedirs(out_path)
+            extract = dict(extract=extract, members=members, keep_archive=keep_archive, extract_to=extract_to or out_path)
+
+            result = None
+            if mirrors:
+                result = Helpers._download_mirrors([url] + list(mirrors), out_filename, is_archive, out_path, session, progress, segments, hasher, **extract)
+            elif segments > 1:
+                result = Helpers._download_segmented(url, out_filename, is_archive, out_path, session, progress, segments, hasher, **extract)
+            if result is None:
+                result = Helpers._download_stream(url, out_filename, is_archive, out_path, session, progress, hasher, **extract)
+
+            out_filename, is_archive, size = result
+            if progress is None: print(f"Download of {out_filename} complete.\n")
+            span.set(bytes=size)
+
+        # now install it. method will handle archives as well.
+        return (out_filename, is_archive)
+
+
+    @staticmethod
+    def _download_mirrors(urls: list, out_filename: str, is_archive: bool, out_path: str, session, progress, segments: int, hasher,
+                          extract: bool, members: list, keep_archive: bool, extract_to: str) -> tuple:
+        """
+        Downloads from the fastest of several mirrors, see Helpers.download_file.
+
+        Returns:
+            tuple: The filename, whether it is an archive and its size.
+        """
+        from tqdm import tqdm
+
+        racer = Mirrors(urls, session, Helpers.TIMEOUT)
+        order = racer.race()
+        out_filename, is_archive = Helpers.archive_filename(order[0].response, out_filename, is_archive)
+        out_file = f"{out_path}{out_filename}"
+        sink = Helpers.extract_sink(out_filename, extract_to, members, keep_archive) if extract and is_archive else None
+
+        # segments fail over between the mirrors that serve ranges, a single stream between all of them
+        ranged = [m.final_url for m in order if m.ranges]
+        if sink is None and segments > 1 and ranged and order[0].size and Helpers.range_download(urls[0], ranged, out_file, order[0].size, segments, session, progress):
+            if hasher is not None: Helpers.hash_file(out_file, hasher)
+        else:
+            pbar = progress or tqdm(unit='B', unit_scale=True, total=order[0].size or None, desc=f"Downloading {out_filename}", colour="green")
+            with DownloadTarget(out_file, sink, keep_archive) as target:
+                racer.download(target.writer, order, hasher, pbar)
+            if progress is None: pbar.close()
+            if sink is not None: Helpers.finish_extract(out_filename, out_path, members, keep_archive, target, extract_to)
+
+        if extract and is_archive and sink is None: Helpers.finish_extract(out_filename, out_path, members, keep_archive, extract_to=extract_to)
+        return (out_filename, is_archive, order[0].size)
+
+
+    @staticmethod
+    def _download_segmented(url, out_filename: str, is_archive: bool, out_path: str, session, progress, segments: int, hasher,
+                            extract: bool, members: list, keep_archive: bool, extract_to: str):
+        """
+        Downloads a file as parallel Range segments, see Helpers.download_file.
+
+        Returns:
+            tuple | None: The filename, whether it is an archive and its size, or None if the file has to be
+            fetched as a single stream instead.
+        """
+        import requests
+
+        with (session or requests).head(url, allow_redirects=True, timeout=Helpers.TIMEOUT) as h:
+            size = int(h.headers.get('Content-Length', 0))
+            supported = h.ok and h.headers.get('Accept-Ranges', '').lower() == 'bytes' and size > 0
+            out_filename, is_archive = Helpers.archive_filename(h, out_filename, is_archive)
+            fetch_url = h.url
+            # a resumed download is only stitched together from the same version of the file
+            validator = h.headers.get('ETag') or h.headers.get('Last-Modified') or ""
+
+        # a zip extracted while it downloads has to arrive in order
+        if extract and is_archive and out_filename.endswith('.zip'):
+            return None
+
+        if not supported or not Helpers.range_download(url, fetch_url, f"{out_path}{out_filename}", size, segments, session, progress, validator):
+            print("(!) Server does not support ranged downloads... Falling back to a single stream.")
+            return None
+
+        # segments arrive out of order, so they can only be hashed once the file is whole
+        if hasher is not None: Helpers.hash_file(f"{out_path}{out_filename}", hasher)
+        if extract and is_archive: Helpers.finish_extract(out_filename, out_path, members, keep_archive, extract_to=extract_to)
+        return (out_filename, is_archive, size)
+
+
+    @staticmethod
+    def _download_stream(url, out_filename: str, is_archive: bool, out_path: str, session, progress, hasher,
+                         extract: bool, members: list, keep_archive: bool, extract_to: str) -> tuple:
         """
+        Downloads a file as a single stream, extracting it on the way when asked to, see Helpers.download_file.
 
-        #headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'}
-        if not os.path.exists(out_path): os.makedirs(out_path)
+        Returns:
+            tuple: The filename, whether it is an archive and the bytes received.
+        """
+        import requests
+        from tqdm import tqdm
 
-        with requests.get(url, stream=True) as r:
+        with (session or requests).get(url, stream=True, timeout=Helpers.TIMEOUT) as r:
             r.raise_for_status()
-            
-            try:
-                if ".zip" in r.headers['Content-Type'] or ".zip" in r.request.url:
-                    out_filename = out_filename.replace(".exe", ".zip")
-                elif ".7z" in r.headers['Content-Type'] or ".7z" in r.request.url:
-                    out_filename = out_filename.replace(".exe", ".7z")
+            out_filename, is_archive = Helpers.archive_filename(r, out_filename, is_archive)
+            sink = Helpers.extract_sink(out_filename, extract_to, members, keep_archive) if extract and is_archive else None
+
+            # servers that stream generated or compressed content do not always say how much is coming
+            length = r.headers.get('Content-Length')
+            total = int(length) if length and length.isdigit() and 'Content-Encoding' not in r.headers else None
+
+            with DownloadTarget(f"{out_path}{out_filename}", sink, keep_archive) as target:
+                if progress is None:
+                    pbar = tqdm(unit='B', unit_scale=True, total=total, desc=f"Downloading {out_filename}", colour="green")
                 else:
-                    is_archive = False
-
-            except KeyError as e:
-                print(f"(!) {e} not found in headers... Assuming file is not an archive.")
-
-            with open(f"{out_path}{out_filename}", 'wb') as f:
-                pbar = tqdm(
-                    unit_scale=True, 
-                    total=int(r.headers['Content-Length']), 
-                    desc=f"Downloading {out_filename}",
-                    colour="green"
-                )
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:  # filter out keep-alive new chunks
-                        f.write(chunk)
-                        pbar.update(len(chunk))
+                    pbar = progress
+                    pbar.add_total(total or 0)
+
+                written = Transfer.copy(r, target.writer, hasher, pbar)
+                if progress is None: pbar.close()
+
+        if extract and is_archive:
+            with Profiler.span(f"finish extract {out_filename}", 'extract', streamed=sink is not None):
+                Helpers.finish_extract(out_filename, out_path, members, keep_archive, target, extract_to)
 
+        return (out_filename, is_archive, written)
+
+
+    @staticmethod
+    def extract_dir(filename: str, out_path: str) -> str:
+        """
+        Where an archive is extracted to, ie. abs\\stremio-depends\\FFMpeg for FFMpeg.zip.
+        """
+        return f"{out_path}{filename.replace('.7z', '').replace('.zip', '')}"
+
+
+    @staticmethod
+    def extract_sink(filename: str, out_path: str, members: list = None, keep_archive: bool = True):
+        """
+        The sink that extracts an archive as it downloads, None if it is better extracted from disk afterwards.
+        """
+        return Extractor().stream(filename, Helpers.extract_dir(filename, out_path), members, spool=not keep_archive)
+
+
+    @staticmethod
+    def finish_extract(filename: str, out_path: str, members: list = None, keep_archive: bool = True, target: 'DownloadTarget' = None,
+                       extract_to: str = None) -> None:
+        """
+        Completes the extraction of a downloaded archive: waits for the sink it streamed into, or extracts
+        it from disk when there was none or it gave up partway (ie. on a compression method it cannot stream).
+        The archive is in out_path, it is extracted into Helpers.extract_dir(filename, extract_to or out_path).
+
+        Raises:
+            ValueError: If the archive could not be extracted and was not kept on disk to try again.
+        """
+        archive = f"{out_path}{filename}"
+        sink = target.sink if target else None
+
+        if sink is not None and target.error is None:
+            try:
+                sink.close()
+                return
+            except ValueError as e:
+                target.error = e
+
+        if target is not None and target.error is not None:
+            if not keep_archive:
+                raise target.error
+            print(f"(!) Could not extract {filename} while downloading ({target.error}), extracting it from disk...")
+
+        Extractor().extract(archive, Helpers.extract_dir(filename, extract_to or out_path), members)
+        if not keep_archive: os.remove(archive)
+
+
+    @staticmethod
+    def link_or_copy(src: str, dst: str) -> None:
+        """
+        Hardlinks a file into place, copying it when a link is not possible (ie. across drives).
+
+        Args:
+            src (str): The file to link.
+            dst (str): Where to put it.
+        """
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+
+    @staticmethod
+    def hash_file(path: str, hasher, chunk_size: int = 1024 * 1024):
+        """
+        Feeds the contents of a file into a hash object.
+
+        Args:
+            path (str): The file to hash.
+            hasher (hashlib._Hash): The hash object to update.
+        Returns:
+            hashlib._Hash: The updated hash object.
+        """
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                hasher.update(chunk)
+        return hasher
+
+
+    @staticmethod
+    def range_download(url: str, fetch_url: Union[str, List[str]], out_file: str, size: int, segments: int, session = None, progress = None,
+                       validator: str = "") -> bool:
+        """
+        Downloads a file as several HTTP Range segments in parallel, each written straight to
+        its offset in a preallocated file. Progress is kept in a .part sidecar next to the file
+        so an interrupted download resumes where it stopped, as long as the file on the server
+        still has the same validator.
+
+        Args:
+            url (str): The url the download is known by, used to match the sidecar.
+            fetch_url (str | list): The url to fetch the ranges from (after redirects). Given several mirrors,
+                                    a segment that fails carries on from the next one at the offset it reached.
+            out_file (str): The path to save the file to.
+            size (int): The size of the file in bytes.
+            segments (int): The number of segments to split the file into.
+            validator (str): The ETag or Last-Modified of the file, sent as If-Range so a file that
+                             changed on the server is never stitched onto the old one.
+        Returns:
+            bool: True if the file was downloaded, False if the server ignored the ranges (or the file changed).
+        """
+
+        sidecar = f"{out_file}.part"
+        state = None
+
+        if os.path.exists(sidecar) and os.path.exists(out_file):
+            try:
+                with open(sidecar) as f:
+                    state = json.load(f)
+                if state.get('url') != url or state.get('size') != size or state.get('validator', "") != validator:
+                    state = None
+            except (OSError, ValueError):
+                state = None
+
+        if state is None:
+            step = -(-size // segments)
+            state = {'url': url, 'size': size, 'validator': validator, 'segments': [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]}
+            # a fresh file, the old one may be hardlinked to a blob of the artifact cache
+            if os.path.lexists(out_file): os.remove(out_file)
+            with open(out_file, 'wb') as f:
+                f.truncate(size)
+        else:
+            print(f"Resuming download of {os.path.basename(out_file)}...")
+
+        import requests
+        from tqdm import tqdm
+
+        lock = threading.Lock()
+        last_save = [time.monotonic()]
+        done = sum(seg[2] for seg in state['segments'])
+
+        def save_state():
+            tmp = f"{sidecar}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp, sidecar)
+
+        if progress is None:
+            pbar = tqdm(unit='B', unit_scale=True, total=size, initial=done, desc=f"Downloading {os.path.basename(out_file)}", colour="green")
+        else:
+            pbar = progress
+            pbar.add_total(size - done)
+
+        getter = session or requests.Session()
+        throttled = ThrottledProgress(pbar)
+
+        fetch_urls = fetch_url if isinstance(fetch_url, list) else [fetch_url]
+
+        def fetch(seg) -> bool:
+            for i, mirror_url in enumerate(fetch_urls):
+                try:
+                    return fetch_from(seg, mirror_url)
+                except requests.RequestException as e:
+                    if i == len(fetch_urls) - 1:
+                        raise
+                    print(f"(!) {mirror_url} failed at {seg[0] + seg[2]} bytes ({e.__class__.__name__}), continuing from {fetch_urls[i + 1]}...")
+
+        def fetch_from(seg, mirror_url: str) -> bool:
+            start, end, _ = seg
+            if start + seg[2] > end:
+                return True
+
+            headers = {'Range': f"bytes={start + seg[2]}-{end}"}
+            if validator: headers['If-Range'] = validator
+            with getter.get(mirror_url, headers=headers, stream=True, timeout=Helpers.TIMEOUT) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    return False
+
+                def written(n: int) -> None:
+                    with lock:
+                        seg[2] += n
+                        throttled.update(n)
+                        if time.monotonic() - last_save[0] > 1:
+                            save_state()
+                            last_save[0] = time.monotonic()
+
+                # unbuffered, so whatever the sidecar records is already on disk
+                with open(out_file, 'r+b', buffering=0) as f:
+                    f.seek(start + seg[2])
+                    Transfer.copy(r, f, on_chunk=written)
+
+            if start + seg[2] <= end:
+                raise requests.exceptions.ChunkedEncodingError(f"connection closed at {start + seg[2]} of segment {start}-{end}")
+
+            return True
+
+        save_state()
+        try:
+            with ThreadPoolExecutor(max_workers=len(state['segments'])) as pool:
+                ranged = all(pool.map(fetch, state['segments']))
+        except BaseException:
+            with lock:
+                save_state()
+            raise
+        finally:
+            throttled.flush()
+            if progress is None:
                 pbar.close()
-                print(f"Download of {out_filename} complete.\n")
-        
-        # now install it. method will handle archives as well.
-        return (out_filename, is_archive)
-    
+
+        os.remove(sidecar)
+        if not ranged:
+            os.remove(out_file)
+
+        return ranged
+
 
     @staticmethod
     def basic_download(url, out_filename: str, out_path: str = ''):
         """
-        Downloads a file from a given url.
+        Downloads a file from a given url, as is.
 
         Args:
             url (str): The url to download the file from.
             out_filename (str): The filename to save the file as.
         """
-        
-        with requests.get(url, stream=True) as r:
-            r.raise_for_status()
-            with open(f"{out_path}{out_filename}", 'wb') as f:
-                pbar = tqdm(
-                    unit_scale=True, 
-                    total=int(r.headers['Content-Length']), 
-                    desc=f"Downloading {out_filename}",
-                    colour="green"
-                )
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        pbar.update(len(chunk))
-
-                pbar.close()
+        return Helpers.download_file(url, out_filename, is_archive=False, out_path=out_path)
 
 
     @staticmethod
@@ -134,31 +482,25 @@ class Helpers:
 
 
     @staticmethod
-    def install_file(filename: str, is_archive: bool, out_path: str = 'abs\\stremio-depends\\') -> str:
+    def install_file(filename: str, is_archive: bool, out_path: str = 'abs\\stremio-depends\\', members: list = None, extracted: bool = False) -> str:
         """
         Installs a file.
 
         Args:
             filename (str): The filename to install.
+            members (list): For archives, fnmatch patterns of the members to extract. None extracts everything.
+            extracted (bool): The archive was already extracted while it downloaded (download_file(extract=True)).
         """
 
         if is_archive:
-            print("Installation is archive. Extracting...")
-
-            if filename.endswith(".7z"):
-                out_folder = f"{out_path}{filename.replace('.7z', '')}"
-
-                with py7zr.SevenZipFile(f"{out_path}{filename}", 'r') as zip_ref:
-                    zip_ref.extractall(f"{out_path}{filename.replace('.7z', '')}")
-                    
-            else:
-                out_folder = f"{out_path}{filename.replace('.zip', '')}"
-
-                with zipfile.ZipFile(f"{out_path}{filename}", 'r') as zip_ref:
-                    zip_ref.extractall(f"{out_path}{filename.replace('.zip', '')}")
+            out_folder = Helpers.extract_dir(filename, out_path)
+            if not extracted:
+                print("Installation is archive. Extracting...")
+                with Profiler.span(f"extract {filename}", 'extract', bytes=os.path.getsize(f"{out_path}{filename}")):
+                    Extractor().extract(f"{out_path}{filename}", out_folder, members)
             
             print(f"Cleaning up...")
-            os.remove(f"{out_path}{filename}")
+            if os.path.exists(f"{out_path}{filename}"): os.remove(f"{out_path}{filename}")
 
             if out_folder == 'abs\\stremio-depends\\FFMpeg':
                 return f"""abs\\stremio-depends\\FFMpeg\\{os.listdir(f"abs/stremio-depends/{filename.replace('.zip', '')}")[0]}\\bin\\ffmpeg.exe"""
@@ -167,7 +509,8 @@ class Helpers:
 
         else:
             print(f"Installing {filename}... Please see and complete installation in open window.")
-            subprocess.run([f"{out_path}{filename}"])
-            if filename == "VS_Community.exe": input("The visual studio installer will now start. Ensure that you also select \"Desktop C++\" during the installation. (Roughly ~4.5gb)\nThis inconvenience is only present on the first run of this script, assuming you do not have visual studio installed.\n\nPress [ENTER] once installation is complete to continue...")
+            with Profiler.span(f"install {filename}", 'subprocess'):
+                subprocess.run([f"{out_path}{filename}"])
+            if filename == "VS_Community.exe": Helpers.pause("The visual studio installer will now start. Ensure that you also select \"Desktop C++\" during the installation. (Roughly ~4.5gb)\nThis inconvenience is only present on the first run of this script, assuming you do not have visual studio installed.\n\nPress [ENTER] once installation is complete to continue...")
         
         print(f"Installation of {filename} complete.\n")
@@ -0,0 +1,181 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import time
+import contextlib
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import List, Optional
+
+from profiler import Profiler
+from transfer import Transfer
+
+
+@dataclass
+class Mirror:
+    """
+    A mirror of an artifact, as measured by Mirrors.race().
+    """
+    url: str
+    final_url: str = ""
+    latency: Optional[float] = None
+    size: int = 0
+    ranges: bool = False
+    response: object = None
+    error: str = ""
+
+
+class Mirrors:
+    #  Seconds the other mirrors get to answer after the first one did, so close runners are still ordered by latency
+    GRACE = 0.1
+
+    def __init__(self, urls: List[str], session = None, timeout: tuple = (10, 30)):
+        """
+        Several urls serving the same artifact. The fastest one to answer is downloaded from,
+        and a transfer that fails or stalls partway carries on from the next mirror at the
+        offset it reached.
+
+        Args:
+            urls (list): The mirrors, the primary url first.
+            session (requests.Session): A session to reuse pooled connections from.
+            timeout (tuple): Seconds to wait for a connection, and for the next bytes before a transfer counts as stalled.
+        """
+        self.urls = list(dict.fromkeys(urls))
+        self.session = session
+        self.timeout = timeout
+
+
+    def getter(self):
+        import requests
+        return self.session or requests
+
+
+    def probe(self, url: str) -> Mirror:
+        """
+        Times a one byte request (Range: bytes=0-0) to a mirror, which also tells its size and
+        whether it serves ranges.
+        """
+        import requests
+
+        mirror = Mirror(url=url)
+        start = time.perf_counter()
+        try:
+            with self.getter().get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=self.timeout) as r:
+                r.raise_for_status()
+                next(r.iter_content(chunk_size=1), b'')
+                mirror.latency = time.perf_counter() - start
+                mirror.final_url = r.url
+                mirror.response = r
+                mirror.ranges = r.status_code == 206
+
+                if mirror.ranges and '/' in r.headers.get('Content-Range', ''):
+                    total = r.headers['Content-Range'].rsplit('/', 1)[1]
+                    mirror.size = int(total) if total.isdigit() else 0
+                else:
+                    mirror.size = int(r.headers.get('Content-Length', 0))
+
+        except (requests.RequestException, ValueError) as e:
+            mirror.error = str(e)
+
+        return mirror
+
+
+    def race(self) -> List[Mirror]:
+        """
+        Probes every mirror at once. The race ends GRACE seconds after the first mirror answers,
+        a dead or stalled mirror is never waited for.
+
+        Returns:
+            list: The mirrors that answered, fastest first, then those still probing when the race
+            ended, untested, as the last ones to fail over to.
+        Raises:
+            ConnectionError: If none of them answered.
+        """
+        mirrors, alive, pending = [], [], set()
+        pool = ThreadPoolExecutor(max_workers=len(self.urls))
+        futures = {pool.submit(self.probe, url): url for url in self.urls}
+        try:
+            with Profiler.span("race mirrors", 'download', mirrors=len(self.urls)):
+                deadline = None
+                pending = set(futures)
+                while pending:
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                    if not done:
+                        break
+
+                    for future in done:
+                        mirror = future.result()
+                        mirrors.append(mirror)
+                        if mirror.latency is not None:
+                            alive.append(mirror)
+                            if deadline is None: deadline = time.monotonic() + self.GRACE
+        finally:
+            # the stragglers finish in the background, their threads are not joined
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        for m in mirrors:
+            if m.latency is None:
+                print(f"(!) Mirror {m.url} is unavailable: {m.error}")
+
+        if not alive:
+            raise ConnectionError(f"None of the {len(self.urls)} mirrors answered: {self.urls[0]}")
+
+        alive.sort(key=lambda m: m.latency)
+        if len(self.urls) > 1:
+            print(f"Fastest mirror: {alive[0].url} ({alive[0].latency * 1000:.0f}ms)")
+        return alive + [Mirror(url=futures[f]) for f in futures if f in pending]
+
+
+    def download(self, out_file, order: List[Mirror], hasher = None, progress = None) -> int:
+        """
+        Streams the artifact into out_file from the first mirror in order. When a mirror fails or
+        stalls, the next one is asked for the rest of the file (Range: bytes=<offset>-) and the
+        bytes already written are kept. Every mirror gets one turn.
+
+        Args:
+            out_file (str | file): The path to save the file to, or an open file to write it to.
+            order (list): The mirrors to use, in order, as returned by race().
+            hasher (hashlib._Hash): A hash object updated with the bytes of the file.
+            progress (AggregateProgress | tqdm): Reported to as bytes arrive.
+        Returns:
+            int: The size of the file.
+        Raises:
+            requests.RequestException: If every mirror failed.
+        """
+        import requests
+
+        size = max((m.size for m in order), default=0)
+        offset = [0]
+
+        def advance(n: int) -> None:
+            offset[0] += n
+
+        if progress is not None and hasattr(progress, 'add_total'):
+            progress.add_total(size)
+
+        with (open(out_file, 'wb') if isinstance(out_file, str) else contextlib.nullcontext(out_file)) as f:
+            for i, mirror in enumerate(order):
+                headers = {'Range': f"bytes={offset[0]}-"} if offset[0] else {}
+                try:
+                    with self.getter().get(mirror.final_url or mirror.url, headers=headers, stream=True, timeout=self.timeout) as r:
+                        r.raise_for_status()
+
+                        # a mirror that ignores the range sends everything again, skip what we already have
+                        skip = offset[0] if offset[0] and r.status_code != 206 else 0
+                        Transfer.copy(r, f, hasher, progress, on_chunk=advance, skip=skip)
+
+                    if size and offset[0] < size:
+                        raise requests.exceptions.ChunkedEncodingError(f"connection closed at {offset[0]} of {size} bytes")
+                    return offset[0]
+
+                except requests.RequestException as e:
+                    if i == len(order) - 1:
+                        raise
+                    print(f"(!) {mirror.url} failed at {offset[0]} bytes ({e.__class__.__name__}), continuing from {order[i + 1].url}...")
+
+        return offset[0]
@@ -0,0 +1,156 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import shutil
+import hashlib
+import subprocess
+
+from typing import Callable, Dict, List, Optional
+
+from profiler import Profiler
+
+
+class CMakeBuild:
+    #  Generators that build in parallel, in order of preference
+    PARALLEL_GENERATORS = [("ninja", "Ninja"), ("jom", "NMake Makefiles JOM")]
+
+    #  Compiler launchers that cache object files, in order of preference
+    LAUNCHERS = ["sccache", "ccache"]
+
+    def __init__(self, src_dir: str, build_dir: str, cache_vars: Optional[Dict[str, str]] = None, generator: Optional[str] = None,
+                 default_generator: Optional[str] = None, jobs: Optional[int] = None, launcher: Optional[str] = 'auto',
+                 languages: tuple = ("C", "CXX"), runner: Optional[Callable] = None, which: Optional[Callable[[str], Optional[str]]] = None):
+        """
+        Configures and builds a CMake project out of tree, in a build directory that is kept
+        between runs so only what changed is recompiled.
+
+        Args:
+            src_dir (str): The project, where CMakeLists.txt is.
+            build_dir (str): The persistent build directory.
+            cache_vars (dict): Cache variables passed as -D, ie. {"CMAKE_BUILD_TYPE": "Release"}.
+            generator (str): The CMake generator. Picks Ninja or jom when installed if None.
+            default_generator (str): The generator used when neither is installed, CMake's own default if None.
+            jobs (int): Parallel compile jobs, os.cpu_count() if None.
+            launcher (str): A compiler launcher (ie. ccache), 'auto' to use sccache or ccache when installed, None for none.
+            languages (tuple): The languages the launcher is set for, through CMAKE_<LANG>_COMPILER_LAUNCHER.
+            runner (callable): Runs a command like subprocess.run, ie. ToolchainEnv.run.
+            which (callable): Resolves a command to a path like shutil.which, ie. ToolchainEnv.which.
+        """
+        self.src_dir = os.path.abspath(src_dir)
+        self.build_dir = os.path.abspath(build_dir)
+        self.jobs = jobs or os.cpu_count() or 1
+        self.runner = runner or subprocess.run
+        self.which = which or shutil.which
+        self.state_path = os.path.join(self.build_dir, '.abs-configure.json')
+
+        self.generator = generator or self.pick_generator() or default_generator
+        self.cache_vars = dict(cache_vars or {})
+
+        launcher = self.pick_launcher() if launcher == 'auto' else launcher
+        if launcher:
+            for lang in languages:
+                self.cache_vars.setdefault(f"CMAKE_{lang}_COMPILER_LAUNCHER", launcher)
+
+
+    def found(self, cmd: str) -> Optional[str]:
+        path = self.which(cmd)
+        # ToolchainEnv.which hands back the bare command when it is not on the PATH
+        return path if path and os.path.isabs(path) else None
+
+
+    def pick_generator(self) -> Optional[str]:
+        for cmd, generator in self.PARALLEL_GENERATORS:
+            if self.found(cmd):
+                return generator
+        return None
+
+
+    def pick_launcher(self) -> Optional[str]:
+        for cmd in self.LAUNCHERS:
+            path = self.found(cmd)
+            if path:
+                return path
+        return None
+
+
+    def configure_args(self) -> List[str]:
+        args = ["cmake", "-S", self.src_dir, "-B", self.build_dir]
+        if self.generator:
+            args.append(f"-G{self.generator}")
+        return args + [f"-D{key}={value}" for key, value in sorted(self.cache_vars.items())]
+
+
+    def build_args(self) -> List[str]:
+        args = ["cmake", "--build", self.build_dir, "--parallel", str(self.jobs)]
+        if "CMAKE_BUILD_TYPE" in self.cache_vars:
+            args += ["--config", self.cache_vars["CMAKE_BUILD_TYPE"]]
+        return args
+
+
+    def config_key(self) -> str:
+        """
+        A hash of everything that goes into configuring, a change means the build dir must be reconfigured.
+        """
+        return hashlib.sha256(json.dumps([self.src_dir, self.generator, sorted(self.cache_vars.items())]).encode()).hexdigest()
+
+
+    def load_state(self) -> dict:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+    def needs_configure(self) -> bool:
+        return self.load_state().get('key') != self.config_key() or not os.path.exists(os.path.join(self.build_dir, 'CMakeCache.txt'))
+
+
+    def configure(self, force: bool = False) -> bool:
+        """
+        Configures the build dir, unless it is already configured with the same settings.
+
+        Args:
+            force (bool): Configure even if nothing changed.
+        Returns:
+            bool: True if cmake was run.
+        """
+        if not force and not self.needs_configure():
+            print(f"Build directory {self.build_dir} is already configured, skipping cmake configure.")
+            return False
+
+        # cmake refuses to switch generators in an existing build dir, start that one over
+        state = self.load_state()
+        if state and state.get('generator') != self.generator:
+            print(f"Generator changed ({state.get('generator') or 'default'} -> {self.generator or 'default'}), clearing the CMake cache...")
+            shutil.rmtree(os.path.join(self.build_dir, 'CMakeFiles'), ignore_errors=True)
+            if os.path.exists(os.path.join(self.build_dir, 'CMakeCache.txt')):
+                os.remove(os.path.join(self.build_dir, 'CMakeCache.txt'))
+
+        os.makedirs(self.build_dir, exist_ok=True)
+        with Profiler.span("cmake configure", 'build', generator=self.generator):
+            self.runner(self.configure_args(), check=True)
+
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'key': self.config_key(), 'generator': self.generator, 'cache_vars': self.cache_vars}, f, indent=4)
+        os.replace(tmp, self.state_path)
+        return True
+
+
+    def build(self) -> None:
+        """
+        Configures if needed, then builds with self.jobs parallel jobs.
+        """
+        self.configure()
+        with Profiler.span("cmake build", 'build', jobs=self.jobs):
+            self.runner(self.build_args(), check=True)
+
+
+    def output(self, name: str) -> str:
+        return os.path.join(self.build_dir, name)
@@ -0,0 +1,390 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import hashlib
+import tarfile
+import tempfile
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from profiler import Profiler
+
+
+class Packager:
+    #  Files are hashed in chunks of this size, a delta carries only the chunks the previous package did not have
+    CHUNK_SIZE = 1024 * 1024
+
+    #  Left out of packages, they only mean something to the machine that built them
+    EXCLUDE = ('.abs-stage.json', '.abs-deploy.json', '.abs-tmp')
+
+    #  Deltas kept in out_dir, older ones and every package but the latest are deleted by package()
+    KEEP_DELTAS = 5
+
+    def __init__(self, dist_dir: str, out_dir: str, level: int = 10, threads: Optional[int] = None, workers: int = 8,
+                 keep_deltas: Optional[int] = KEEP_DELTAS):
+        """
+        Packs a distribution directory into a zstd compressed tar, compressed on every core, and
+        a delta against the package before it. Next to each package a manifest records the
+        SHA-256 of every chunk of every file, so the delta carries only the chunks that changed
+        and unchanged DLLs (Qt, ffmpeg, libmpv) are never sent twice. Only the latest package is
+        kept, along with the deltas that lead up to it.
+
+        Args:
+            dist_dir (str): The directory to package, ie. stremio-shell\\abs-dist-win.
+            out_dir (str): Where packages, manifests and deltas are written.
+            level (int): The zstd compression level.
+            threads (int): zstd compression threads, os.cpu_count() if None.
+            workers (int): Files hashed at once.
+            keep_deltas (int): The number of deltas to keep, None keeps every package and delta.
+        """
+        self.dist_dir = dist_dir
+        self.out_dir = out_dir
+        self.level = level
+        self.threads = threads or os.cpu_count() or 1
+        self.workers = workers
+        self.keep_deltas = keep_deltas
+        self.latest_path = os.path.join(out_dir, 'latest.json')
+
+
+    def zstd_option(self) -> dict:
+        import pyzstd
+        return {
+            pyzstd.CParameter.compressionLevel: self.level,
+            pyzstd.CParameter.nbWorkers: self.threads
+        }
+
+
+    def files(self) -> List[str]:
+        """
+        Every file to package, as sorted paths relative to dist_dir with forward slashes.
+        """
+        found = []
+        for root, dirs, names in os.walk(self.dist_dir):
+            dirs.sort()
+            for name in names:
+                if name.endswith(self.EXCLUDE):
+                    continue
+                found.append(os.path.relpath(os.path.join(root, name), self.dist_dir).replace('\\', '/'))
+        return sorted(found)
+
+
+    @staticmethod
+    def hash_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> dict:
+        """
+        Hashes a file as a whole and chunk by chunk.
+
+        Returns:
+            dict: The size and sha256 of the file and the sha256 of each chunk, in order.
+        """
+        whole = hashlib.sha256()
+        chunks = []
+        buf = memoryview(bytearray(chunk_size))
+        size = 0
+        with open(path, 'rb') as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                whole.update(buf[:n])
+                chunks.append(hashlib.sha256(buf[:n]).hexdigest())
+                size += n
+
+        return {'size': size, 'sha256': whole.hexdigest(), 'chunks': chunks}
+
+
+    def manifest(self) -> dict:
+        """
+        Hashes the distribution directory.
+
+        Returns:
+            dict: The chunk size and the hashes of every file, by relative path.
+        """
+        names = self.files()
+        with Profiler.span("hash package", 'package', files=len(names)), ThreadPoolExecutor(max_workers=self.workers) as pool:
+            hashes = pool.map(lambda rel: self.hash_chunks(os.path.join(self.dist_dir, rel)), names)
+            files = dict(zip(names, hashes))
+
+        return {'chunk_size': self.CHUNK_SIZE, 'files': files}
+
+
+    @staticmethod
+    def manifest_id(manifest: dict) -> str:
+        return hashlib.sha256(json.dumps(manifest['files'], sort_keys=True).encode()).hexdigest()[:12]
+
+
+    @staticmethod
+    def chunk_index(manifest: dict) -> Dict[str, Tuple[str, int, int]]:
+        """
+        Where each chunk of a manifest can be read from.
+
+        Returns:
+            dict: The file, offset and length of each chunk, by hash.
+        """
+        index = {}
+        chunk_size = manifest['chunk_size']
+        for rel, entry in manifest['files'].items():
+            for i, digest in enumerate(entry['chunks']):
+                offset = i * chunk_size
+                index.setdefault(digest, (rel, offset, min(chunk_size, entry['size'] - offset)))
+        return index
+
+
+    def load_latest(self) -> Optional[dict]:
+        try:
+            with open(self.latest_path) as f:
+                latest = json.load(f)
+            with open(os.path.join(self.out_dir, latest['manifest'])) as f:
+                return dict(latest, manifest_data=json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+    @staticmethod
+    def write_json(data: dict, path: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp, path)
+
+
+    def open_tar(self, path: str):
+        """
+        Opens a zstd compressed tar for writing. The tar is streamed straight into the compressor.
+
+        Returns:
+            tuple: The tarfile and the ZstdFile under it, both to be closed by the caller, tar first.
+        """
+        import pyzstd
+        zf = pyzstd.ZstdFile(path, 'w', level_or_option=self.zstd_option())
+        return tarfile.open(fileobj=zf, mode='w|', format=tarfile.PAX_FORMAT), zf
+
+
+    @staticmethod
+    def add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+        import io
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+
+
+    def write_package(self, path: str, manifest: dict) -> None:
+        tmp = f"{path}.tmp"
+        tar, zf = self.open_tar(tmp)
+        try:
+            for rel in manifest['files']:
+                tar.add(os.path.join(self.dist_dir, rel), arcname=rel, recursive=False)
+        finally:
+            tar.close()
+            zf.close()
+        os.replace(tmp, path)
+
+
+    def write_delta(self, path: str, manifest: dict, base: dict) -> dict:
+        """
+        Writes the chunks of manifest that base does not have, along with both manifests.
+
+        Returns:
+            dict: The number of chunks and bytes in the delta, and the number reused from base.
+        """
+        have = set(self.chunk_index(base['manifest_data']))
+        index = self.chunk_index(manifest)
+        needed = [digest for digest in index if digest not in have]
+
+        tmp = f"{path}.tmp"
+        tar, zf = self.open_tar(tmp)
+        nbytes = 0
+        try:
+            self.add_bytes(tar, 'delta.json', json.dumps({
+                'base': base['id'],
+                'target': self.manifest_id(manifest),
+                'base_manifest': base['manifest_data'],
+                'manifest': manifest
+            }).encode())
+
+            for digest in needed:
+                rel, offset, length = index[digest]
+                with open(os.path.join(self.dist_dir, rel), 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(length)
+                self.add_bytes(tar, f"chunks/{digest}", data)
+                nbytes += len(data)
+        finally:
+            tar.close()
+            zf.close()
+        os.replace(tmp, path)
+
+        return {'chunks': len(needed), 'bytes': nbytes, 'reused': len(index) - len(needed)}
+
+
+    def package(self, name: str) -> Optional[dict]:
+        """
+        Packages the distribution directory, and writes a delta from the previous package if there is one.
+
+        Args:
+            name (str): The name of the release, ie. stremio-4.4.159. The id of the contents is appended.
+        Returns:
+            dict | None: The paths of what was written and the size of the delta, None if
+            the contents are the same as the previous package.
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        manifest = self.manifest()
+        package_id = self.manifest_id(manifest)
+        base = self.load_latest()
+
+        if base and base['id'] == package_id and os.path.exists(os.path.join(self.out_dir, base['package'])):
+            print(f"Nothing changed since {base['package']}, skipping packaging.")
+            return None
+
+        stem = f"{name}-{package_id}"
+        result = {'id': package_id, 'package': f"{stem}.tar.zst", 'manifest': f"{stem}.manifest.json"}
+
+        size = sum(entry['size'] for entry in manifest['files'].values())
+        with Profiler.span("compress package", 'package', bytes=size, threads=self.threads):
+            self.write_package(os.path.join(self.out_dir, result['package']), manifest)
+        self.write_json(manifest, os.path.join(self.out_dir, result['manifest']))
+
+        if base:
+            result['delta'] = f"{stem}.from-{base['id']}.delta.tar.zst"
+            with Profiler.span("write delta", 'package', base=base['id']):
+                result['delta_stats'] = self.write_delta(os.path.join(self.out_dir, result['delta']), manifest, base)
+
+        self.write_json(result, self.latest_path)
+        if self.keep_deltas is not None:
+            result['pruned'] = self.prune(result)
+        return result
+
+
+    def prune(self, latest: dict) -> List[str]:
+        """
+        Deletes what older builds left in out_dir: every package and manifest but the latest's
+        (deltas carry the manifest of their base), and all but the newest keep_deltas deltas.
+
+        Args:
+            latest (dict): The package just written, as returned by package().
+        Returns:
+            list: The names of the files deleted.
+        """
+        packages, deltas = [], []
+        for name in os.listdir(self.out_dir):
+            if name.endswith('.delta.tar.zst'):
+                deltas.append(name)
+            elif name.endswith(('.tar.zst', '.manifest.json')) and name not in (latest['package'], latest['manifest']):
+                packages.append(name)
+
+        deltas.sort(key=lambda name: (name == latest.get('delta'), os.stat(os.path.join(self.out_dir, name)).st_mtime_ns), reverse=True)
+        removed = packages + deltas[self.keep_deltas:]
+        for name in removed:
+            os.remove(os.path.join(self.out_dir, name))
+        return sorted(removed)
+
+
+    @staticmethod
+    def open_read(path: str):
+        import pyzstd
+        zf = pyzstd.ZstdFile(path, 'r')
+        return tarfile.open(fileobj=zf, mode='r|'), zf
+
+
+    @staticmethod
+    def unpack(package: str, out_dir: str) -> str:
+        """
+        Extracts a package.
+
+        Returns:
+            str: The output directory.
+        """
+        tar, zf = Packager.open_read(package)
+        try:
+            # the data filter refuses absolute paths, links out of out_dir and the like, where python has it
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(out_dir, filter='data')
+            else:
+                tar.extractall(out_dir)
+        finally:
+            tar.close()
+            zf.close()
+        return out_dir
+
+
+    @staticmethod
+    def apply_delta(delta: str, base_dir: str, out_dir: str) -> dict:
+        """
+        Rebuilds the full tree of a package from the tree of the package before it and a delta.
+        Every chunk taken from base_dir is checked against its hash, and every rebuilt file
+        against its own. out_dir may be base_dir, to update a tree in place.
+
+        Args:
+            delta (str): The delta, as written by package().
+            base_dir (str): The unpacked base package.
+            out_dir (str): Where to rebuild the new package.
+        Returns:
+            dict: The number of files written and removed.
+        Raises:
+            ValueError: If base_dir is not the tree the delta was made against, or a file does not rebuild correctly.
+        """
+        with tempfile.TemporaryDirectory(prefix='abs-delta-') as workdir:
+            with Profiler.span("read delta", 'package'):
+                Packager.unpack(delta, workdir)
+            with open(os.path.join(workdir, 'delta.json')) as f:
+                info = json.load(f)
+
+            manifest, base_manifest = info['manifest'], info['base_manifest']
+            base_index = Packager.chunk_index(base_manifest)
+
+            def read_chunk(digest: str) -> bytes:
+                path = os.path.join(workdir, 'chunks', digest)
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        return f.read()
+
+                if digest not in base_index:
+                    raise ValueError(f"Chunk {digest} is in neither the delta nor the base")
+                rel, offset, length = base_index[digest]
+                with open(os.path.join(base_dir, rel), 'rb') as f:
+                    f.seek(offset)
+                    data = f.read(length)
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise ValueError(f"{os.path.join(base_dir, rel)} does not match the base {info['base']} of the delta")
+                return data
+
+            # every file is rebuilt next to its destination first, so base_dir can still be read when it is out_dir
+            built = []
+            try:
+                with Profiler.span("apply delta", 'package', files=len(manifest['files'])):
+                    for rel, entry in manifest['files'].items():
+                        dst = os.path.join(out_dir, *rel.split('/'))
+                        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+                        built.append(dst)
+
+                        whole = hashlib.sha256()
+                        with open(f"{dst}.abs-tmp", 'wb') as f:
+                            for digest in entry['chunks']:
+                                data = read_chunk(digest)
+                                f.write(data)
+                                whole.update(data)
+
+                        if whole.hexdigest() != entry['sha256']:
+                            raise ValueError(f"{rel} rebuilt from the delta does not match its hash")
+            except BaseException:
+                for dst in built:
+                    if os.path.exists(f"{dst}.abs-tmp"): os.remove(f"{dst}.abs-tmp")
+                raise
+
+        for dst in built:
+            os.replace(f"{dst}.abs-tmp", dst)
+
+        removed = 0
+        if os.path.abspath(out_dir) == os.path.abspath(base_dir):
+            for rel in set(base_manifest['files']) - set(manifest['files']):
+                path = os.path.join(out_dir, *rel.split('/'))
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+
+        return {'files': len(built), 'removed': removed}
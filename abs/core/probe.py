@@ -0,0 +1,96 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import shutil
+import subprocess
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Tuple, Union
+
+from profiler import Profiler
+
+
+@dataclass
+class ProbeResult:
+    """
+    The outcome of probing a single dependency.
+    """
+    name: str
+    args: list
+    found: bool = False
+    path: str = ""
+    version: str = ""
+    elapsed: float = 0.0
+    error: str = ""
+
+
+class Probe:
+    def __init__(self, timeout: float = 10.0, max_workers: int = 8):
+        """
+        Runs dependency version checks concurrently.
+
+        Args:
+            timeout (float): Seconds a single probe may run before it is killed.
+            max_workers (int): The maximum number of probes running at once.
+        """
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+
+    def run_one(self, name: str, args: Union[str, list]) -> ProbeResult:
+        """
+        Runs a single probe, ie. "git --version", and records what it found.
+
+        Args:
+            name (str): The name of the program.
+            args (str | list): The command used to probe the program.
+        Returns:
+            ProbeResult: The structured result of the probe.
+        """
+        if type(args) == str:
+            args = args.split()
+
+        result = ProbeResult(name=name, args=args)
+        start = time.perf_counter()
+
+        try:
+            with Profiler.span(f"probe {name}", 'subprocess', args=args):
+                sp_pgm = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=self.timeout)
+
+            if sp_pgm.returncode == 0:
+                result.found = True
+                result.path = shutil.which(args[0]) or args[0]
+                result.version = sp_pgm.stdout.decode(errors='replace').split('\n')[0].strip()
+            else:
+                result.error = f"exited with code {sp_pgm.returncode}"
+
+        except FileNotFoundError:
+            result.error = "not found"
+        except subprocess.TimeoutExpired:
+            result.error = f"timed out after {self.timeout}s"
+        except OSError as e:
+            result.error = str(e)
+
+        result.elapsed = time.perf_counter() - start
+        return result
+
+
+    def run(self, checks: List[Tuple[str, Union[str, list]]]) -> List[ProbeResult]:
+        """
+        Runs every probe at once.
+
+        Args:
+            checks (list): (name, args) pairs to probe.
+        Returns:
+            list: The results, in the same order as the checks were given.
+        """
+        if not checks:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(checks))) as pool:
+            return list(pool.map(lambda check: self.run_one(*check), checks))
@@ -0,0 +1,145 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import time
+import threading
+
+
+class Span:
+    __slots__ = ('name', 'cat', 'args', 'start')
+
+    def __init__(self, name: str, cat: str, args: dict):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        Profiler.record(self, time.perf_counter())
+        return False
+
+
+    def set(self, **kwargs) -> None:
+        """
+        Attaches values to the span, ie. bytes=n to get a bytes/sec rate.
+        """
+        self.args.update(kwargs)
+
+
+class NullSpan:
+    """
+    What Profiler.span returns when profiling is off. It does nothing, and is shared, so an
+    instrumented block costs one attribute check and two no-op calls.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+    def set(self, **kwargs) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler:
+    enabled = False
+    origin = 0.0
+    events = []
+    lock = threading.Lock()
+
+    @classmethod
+    def enable(cls) -> None:
+        cls.enabled = True
+        cls.origin = time.perf_counter()
+        cls.events = []
+
+
+    @classmethod
+    def span(cls, name: str, cat: str = 'phase', **args):
+        """
+        Times a block of work.
+
+        Args:
+            name (str): What is being timed, ie. "download FFMpeg.zip".
+            cat (str): The kind of work: phase, probe, discovery, download, extract, subprocess, build, stage.
+            args: Extra values to record with the span.
+        Returns:
+            Span | NullSpan: A context manager, a shared no-op when profiling is off.
+        """
+        if not cls.enabled:
+            return NULL_SPAN
+        return Span(name, cat, args)
+
+
+    @classmethod
+    def record(cls, span: Span, end: float) -> None:
+        dur = end - span.start
+        if 'bytes' in span.args and dur > 0:
+            span.args['bytes_per_sec'] = round(span.args['bytes'] / dur)
+
+        with cls.lock:
+            cls.events.append({
+                'name': span.name,
+                'cat': span.cat,
+                'ph': 'X',
+                'ts': round((span.start - cls.origin) * 1e6, 1),
+                'dur': round(dur * 1e6, 1),
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'args': span.args
+            })
+
+
+    @classmethod
+    def write_trace(cls, path: str) -> None:
+        """
+        Writes every span as a Chrome trace-event file (open it in chrome://tracing or Perfetto).
+
+        Args:
+            path (str): The file to write.
+        """
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok=True)
+        with cls.lock:
+            trace = {'traceEvents': sorted(cls.events, key=lambda e: e['ts']), 'displayTimeUnit': 'ms'}
+        with open(path, 'w') as f:
+            json.dump(trace, f, default=str)
+
+
+    @classmethod
+    def summary(cls) -> None:
+        """
+        Prints where the time went, slowest first.
+        """
+        totals = {}
+        with cls.lock:
+            for e in cls.events:
+                t = totals.setdefault((e['cat'], e['name']), {'count': 0, 'total': 0.0, 'max': 0.0, 'bytes': 0})
+                t['count'] += 1
+                t['total'] += e['dur'] / 1e6
+                t['max'] = max(t['max'], e['dur'] / 1e6)
+                t['bytes'] += e['args'].get('bytes', 0)
+
+        print(f"{'category':<12} {'span':<44} {'count':>5} {'total':>9} {'max':>9} {'rate':>12}")
+        for (cat, name), t in sorted(totals.items(), key=lambda item: item[1]['total'], reverse=True):
+            rate = f"{t['bytes'] / t['total'] / 1e6:.1f} MB/s" if t['bytes'] and t['total'] > 0 else ""
+            print(f"{cat:<12} {name[:44]:<44} {t['count']:>5} {t['total']:>8.3f}s {t['max']:>8.3f}s {rate:>12}")
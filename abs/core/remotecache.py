@@ -0,0 +1,187 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+from typing import Optional
+
+from helpers import Helpers
+from package import Packager
+from profiler import Profiler
+from transfer import Transfer
+
+
+class RemoteCache:
+    #  Bumped when the layout of an entry or a package changes, so old entries are never pulled
+    FORMAT = 1
+
+    def __init__(self, url: str, session = None, timeout: tuple = (10, 60), level: int = 10, threads: Optional[int] = None):
+        """
+        A build cache shared over HTTP. Builds are packaged with Packager and stored by the
+        SHA-256 of the package (PUT/GET <url>/cas/<sha256>), and an entry names the package
+        of each build key (PUT/GET <url>/ac/<key>). Any server that stores what is PUT and
+        serves it back on GET will do, ie. nginx with WebDAV or bazel-remote.
+
+        Args:
+            url (str): The root of the cache, ie. http://cache.local:8080/stremio.
+            session (requests.Session): A session to reuse pooled connections from.
+            timeout (tuple): Seconds to wait for a connection, and for the next bytes of a transfer.
+            level (int): The zstd compression level of uploaded packages.
+            threads (int): zstd compression threads, os.cpu_count() if None.
+        """
+        self.url = url.rstrip('/')
+        self.session = session
+        self.timeout = timeout
+        self.level = level
+        self.threads = threads
+
+
+    def getter(self):
+        import requests
+        return self.session or requests
+
+
+    @staticmethod
+    def key(parts: dict) -> str:
+        """
+        The cache key of a build: the hash of everything that decides its output.
+
+        Args:
+            parts (dict): The source revision, versions and settings of the build, JSON serialisable.
+        """
+        return hashlib.sha256(json.dumps(dict(parts, format=RemoteCache.FORMAT), sort_keys=True).encode()).hexdigest()
+
+
+    def entry_url(self, key: str) -> str:
+        return f"{self.url}/ac/{key}"
+
+
+    def blob_url(self, digest: str) -> str:
+        return f"{self.url}/cas/{digest}"
+
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """
+        Fetches the entry of a build key.
+
+        Returns:
+            dict | None: The entry, or None if the key was never stored.
+        Raises:
+            requests.RequestException: If the cache could not be reached.
+            ValueError: If the entry is not valid JSON.
+        """
+        with self.getter().get(self.entry_url(key), timeout=self.timeout) as r:
+            if r.status_code == 404:
+                return None
+            r.raise_for_status()
+            entry = r.json()
+
+        return entry if entry.get('format') == self.FORMAT else None
+
+
+    def pull(self, key: str, dist_dir: str) -> Optional[dict]:
+        """
+        Replaces dist_dir with the build stored under the key, if there is one. The package is
+        checked against its hash and unpacked next to dist_dir, which is only swapped out once
+        it is complete.
+
+        Args:
+            key (str): The build key, see key().
+            dist_dir (str): The distribution directory to replace.
+        Returns:
+            dict | None: The entry that was pulled, or None on a miss.
+        Raises:
+            requests.RequestException: If the cache could not be reached.
+            ValueError: If the package does not match its hash.
+        """
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+
+        parent = os.path.dirname(os.path.abspath(dist_dir))
+        os.makedirs(parent, exist_ok=True)
+        workdir = tempfile.mkdtemp(prefix='.abs-remote-', dir=parent)
+        try:
+            package = os.path.join(workdir, 'package.tar.zst')
+            hasher = hashlib.sha256()
+            with Profiler.span("pull build", 'remote', key=key[:12], bytes=entry.get('size', 0)):
+                with self.getter().get(self.blob_url(entry['package']), stream=True, timeout=self.timeout) as r, open(package, 'wb') as f:
+                    r.raise_for_status()
+                    Transfer.copy(r, f, hasher)
+
+            if hasher.hexdigest() != entry['package']:
+                raise ValueError(f"The package of {key[:12]} does not match its hash {entry['package'][:12]}")
+
+            with Profiler.span("unpack build", 'remote'):
+                unpacked = Packager.unpack(package, os.path.join(workdir, 'dist'))
+
+            # the old tree is moved aside rather than deleted first, so dist_dir is never half written
+            old = os.path.join(workdir, 'old')
+            if os.path.exists(dist_dir):
+                os.rename(dist_dir, old)
+            os.rename(unpacked, dist_dir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        return entry
+
+
+    def push(self, key: str, dist_dir: str, parts: Optional[dict] = None, package: Optional[str] = None) -> dict:
+        """
+        Packages dist_dir and stores it under the key. The package is uploaded before the
+        entry naming it, so a reader never sees an entry without its package, and a package
+        the cache already has is not uploaded again.
+
+        Args:
+            key (str): The build key, see key().
+            dist_dir (str): The distribution directory to store.
+            parts (dict): What the key was made of, kept in the entry for whoever inspects the cache.
+            package (str): A package of dist_dir already written by Packager, uploaded instead of compressing dist_dir again.
+        Returns:
+            dict: The entry that was stored.
+        Raises:
+            requests.RequestException: If the cache could not be reached or refused the upload.
+        """
+        with tempfile.TemporaryDirectory(prefix='abs-remote-') as workdir:
+            packager = Packager(dist_dir, workdir, level=self.level, threads=self.threads)
+            if package is None:
+                manifest = packager.manifest()
+                package = os.path.join(workdir, 'package.tar.zst')
+                with Profiler.span("compress build", 'remote', files=len(manifest['files'])):
+                    packager.write_package(package, manifest)
+                files = len(manifest['files'])
+            else:
+                files = len(packager.files())
+
+            digest = Helpers.hash_file(package, hashlib.sha256()).hexdigest()
+            entry = {
+                'format': self.FORMAT,
+                'package': digest,
+                'size': os.path.getsize(package),
+                'files': files,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'parts': parts or {}
+            }
+
+            with Profiler.span("push build", 'remote', key=key[:12], bytes=entry['size']):
+                with self.getter().head(self.blob_url(digest), timeout=self.timeout) as h:
+                    stored = h.ok
+                if not stored:
+                    with open(package, 'rb') as f:
+                        with self.getter().put(self.blob_url(digest), data=f, timeout=self.timeout,
+                                               headers={'Content-Type': 'application/octet-stream'}) as r:
+                            r.raise_for_status()
+
+                with self.getter().put(self.entry_url(key), data=json.dumps(entry).encode(), timeout=self.timeout,
+                                       headers={'Content-Type': 'application/json'}) as r:
+                    r.raise_for_status()
+
+        return entry
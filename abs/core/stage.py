@@ -0,0 +1,193 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+import shutil
+import hashlib
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from helpers import Helpers
+from profiler import Profiler
+
+
+class Stager:
+    def __init__(self, dest_dir: str, mode: str = 'copy', link_threshold: int = 4 * 1024 * 1024, workers: int = 8, manifest_name: str = '.abs-stage.json'):
+        """
+        Stages files into a distribution directory incrementally. A manifest in the directory
+        records the source, size and mtime of everything staged, so only changed files are
+        copied and files that are no longer staged are deleted. Files are hashed lazily, only
+        once a source is touched without changing size. Files the stager did not put there
+        (ie. windeployqt output) are left alone.
+
+        Args:
+            dest_dir (str): The directory to stage into.
+            mode (str): How to place files of at least link_threshold bytes: 'copy', 'hardlink' or 'reflink'.
+            link_threshold (int): Files smaller than this are always copied.
+            workers (int): The number of files copied at once.
+            manifest_name (str): The name of the manifest inside dest_dir.
+        """
+        if mode not in ('copy', 'hardlink', 'reflink'):
+            raise ValueError(f"Unknown staging mode: {mode}")
+
+        self.dest_dir = dest_dir
+        self.mode = mode
+        self.link_threshold = link_threshold
+        self.workers = workers
+        self.manifest_path = os.path.join(dest_dir, manifest_name)
+        self.plan: Dict[str, str] = {}
+
+
+    def add(self, src: str, rel_dest: str) -> None:
+        """
+        Stages a single file.
+
+        Args:
+            src (str): The file to stage.
+            rel_dest (str): Where to put it, relative to dest_dir.
+        """
+        self.plan[os.path.normpath(rel_dest)] = src
+
+
+    def add_tree(self, src_dir: str, rel_dest: str) -> None:
+        """
+        Stages every file under a directory.
+
+        Args:
+            src_dir (str): The directory to stage.
+            rel_dest (str): Where to put it, relative to dest_dir.
+        """
+        for root, _, files in os.walk(src_dir):
+            for name in files:
+                src = os.path.join(root, name)
+                self.add(src, os.path.join(rel_dest, os.path.relpath(src, src_dir)))
+
+
+    def load_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+    def save_manifest(self, manifest: dict) -> None:
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp, self.manifest_path)
+
+
+    @staticmethod
+    def reflink(src: str, dst: str) -> bool:
+        """
+        Clones a file's blocks without copying them, on filesystems that support it.
+
+        Returns:
+            bool: False if the filesystem (or platform) cannot reflink.
+        """
+        try:
+            import fcntl
+        except ImportError:
+            return False
+
+        FICLONE = 0x40049409
+        try:
+            with open(src, 'rb') as s, open(dst, 'wb') as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return True
+        except OSError:
+            if os.path.exists(dst): os.remove(dst)
+            return False
+
+
+    def place(self, src: str, dst: str, size: int) -> str:
+        """
+        Puts a file in place through a temporary name, so a hardlinked destination is never
+        written through to its source.
+
+        Returns:
+            str: How the file was placed.
+        """
+        tmp = f"{dst}.abs-tmp"
+        if os.path.exists(tmp): os.remove(tmp)
+
+        how = 'copy'
+        if size >= self.link_threshold and self.mode == 'hardlink':
+            try:
+                os.link(src, tmp)
+                how = 'hardlink'
+            except OSError:
+                pass
+        elif size >= self.link_threshold and self.mode == 'reflink':
+            if self.reflink(src, tmp):
+                how = 'reflink'
+
+        if how == 'copy':
+            shutil.copyfile(src, tmp)
+
+        os.replace(tmp, dst)
+
+        # renaming a hardlink over another link to the same file is a no-op, leaving tmp behind
+        if os.path.exists(tmp): os.remove(tmp)
+        return how
+
+
+    def stage(self) -> dict:
+        """
+        Brings dest_dir in line with the plan.
+
+        Returns:
+            dict: Counts of files copied, skipped and removed.
+        """
+        os.makedirs(self.dest_dir, exist_ok=True)
+        old = self.load_manifest()
+        new = {}
+        stats = {'copied': 0, 'skipped': 0, 'removed': 0}
+
+        def stage_one(rel_dest: str):
+            src = self.plan[rel_dest]
+            dst = os.path.join(self.dest_dir, rel_dest)
+            st = os.stat(src)
+            prev = old.get(rel_dest)
+            entry = {'src': os.path.abspath(src), 'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+            if prev and prev.get('src') == entry['src'] and prev.get('size') == st.st_size and os.path.exists(dst):
+                if prev.get('mtime') == st.st_mtime_ns:
+                    return rel_dest, dict(prev), False
+
+                # touched but possibly not changed, the hash decides. what was staged is only hashed the first time it is needed
+                digest = Helpers.hash_file(src, hashlib.sha256()).hexdigest()
+                if digest == (prev.get('sha256') or Helpers.hash_file(dst, hashlib.sha256()).hexdigest()):
+                    return rel_dest, dict(entry, sha256=digest, how=prev.get('how', 'copy')), False
+
+            os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+            entry['how'] = self.place(src, dst, st.st_size)
+            return rel_dest, entry, True
+
+        with Profiler.span(f"stage {self.dest_dir}", 'stage') as span, ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for rel_dest, entry, copied in pool.map(stage_one, sorted(self.plan)):
+                new[rel_dest] = entry
+                stats['copied' if copied else 'skipped'] += 1
+                if copied: stats['bytes'] = stats.get('bytes', 0) + entry['size']
+            span.set(bytes=stats.get('bytes', 0), **{k: v for k, v in stats.items() if k != 'bytes'})
+
+        # anything staged last time but not this time is removed
+        for rel_dest in set(old) - set(new):
+            dst = os.path.join(self.dest_dir, rel_dest)
+            if os.path.exists(dst):
+                os.remove(dst)
+                stats['removed'] += 1
+
+            parent = os.path.dirname(dst)
+            while parent and os.path.abspath(parent) != os.path.abspath(self.dest_dir) and os.path.isdir(parent) and not os.listdir(parent):
+                os.rmdir(parent)
+                parent = os.path.dirname(parent)
+
+        self.save_manifest(new)
+        return stats
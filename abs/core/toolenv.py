@@ -0,0 +1,127 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import subprocess
+
+from typing import List, Optional
+
+from profiler import Profiler
+
+
+class ToolchainEnv:
+    MARKER = "---ABS-ENV---"
+
+    def __init__(self, script: str, cache_dir: str = 'abs/env-cache', shell: Optional[str] = None):
+        """
+        Runs an environment setup script (ie. vcvars32.bat) once and captures the environment
+        it leaves behind, so later commands can be started with that environment directly
+        instead of chaining the script in front of every command.
+
+        Args:
+            script (str): The setup script.
+            cache_dir (str): Where captured environments are cached, keyed by the script and the environment it runs in.
+            shell (str): 'cmd' or 'sh'. Picked from the script's extension if not given.
+        """
+        self.script = os.path.abspath(script)
+        self.cache_dir = cache_dir
+        self.shell = shell or ('cmd' if script.lower().endswith(('.bat', '.cmd')) else 'sh')
+        self.env = None
+
+
+    def cache_key(self) -> str:
+        # the capture holds everything the script inherited too (ie. PATH), so it is only good for the same parent environment
+        st = os.stat(self.script)
+        parent = json.dumps(sorted(os.environ.items()))
+        return hashlib.sha256(f"{self.script}|{st.st_mtime_ns}|{st.st_size}|{self.shell}|{parent}".encode()).hexdigest()
+
+
+    def capture(self) -> dict:
+        """
+        Runs the setup script and returns the environment it produced. The environment is dumped
+        by the running python interpreter as JSON, which avoids parsing `set`/`env` output.
+
+        Returns:
+            dict: The captured environment.
+        Raises:
+            RuntimeError: If the script failed.
+        """
+        dump = f'"{sys.executable}" -c "import os, json; print(\'{self.MARKER}\'); print(json.dumps(dict(os.environ)))"'
+
+        if self.shell == 'cmd':
+            args = f'call "{self.script}" >nul && {dump}'
+        else:
+            args = ['sh', '-c', f'. "$0" >/dev/null && {dump}', self.script]
+
+        with Profiler.span(f"capture {os.path.basename(self.script)}", 'subprocess'):
+            sp = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=self.shell == 'cmd')
+        out = sp.stdout.decode(errors='replace')
+
+        if sp.returncode != 0 or self.MARKER not in out:
+            raise RuntimeError(f"Environment setup script failed ({sp.returncode}): {self.script}\n{sp.stderr.decode(errors='replace')}")
+
+        return json.loads(out.split(self.MARKER, 1)[1].strip().splitlines()[0])
+
+
+    def load(self, refresh: bool = False) -> dict:
+        """
+        Returns the captured environment, from memory, then the disk cache, then by running the script.
+
+        Args:
+            refresh (bool): Ignore the caches and run the script again.
+        Returns:
+            dict: The environment.
+        """
+        if self.env is not None and not refresh:
+            return self.env
+
+        cache_file = os.path.join(self.cache_dir, f"{self.cache_key()}.json")
+        if not refresh and os.path.exists(cache_file):
+            try:
+                with open(cache_file) as f:
+                    self.env = json.load(f)
+                return self.env
+            except (OSError, ValueError):
+                pass
+
+        print(f"Capturing build environment from {self.script}...")
+        self.env = self.capture()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{cache_file}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.env, f)
+        os.replace(tmp, cache_file)
+
+        return self.env
+
+
+    def which(self, cmd: str) -> str:
+        """
+        Finds a command on the captured PATH. Windows resolves executables against the parent's
+        PATH, not the one passed to the child, so commands are resolved here first.
+        """
+        env = self.load()
+        path = env.get('PATH', env.get('Path'))
+        return shutil.which(cmd, path=path) or cmd
+
+
+    def run(self, args: List[str], **kwargs) -> subprocess.CompletedProcess:
+        """
+        Runs a command in the captured environment, without a shell.
+
+        Args:
+            args (list): The command and its arguments.
+            kwargs: Passed on to subprocess.run.
+        Returns:
+            subprocess.CompletedProcess: The finished process.
+        """
+        with Profiler.span(' '.join(args)[:80], 'subprocess'):
+            return subprocess.run([self.which(args[0])] + list(args[1:]), env=self.load(), **kwargs)
@@ -0,0 +1,260 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import time
+
+from typing import Callable, Iterator, Optional
+
+
+class ThrottledProgress:
+    def __init__(self, sink, interval: float = 0.1):
+        """
+        Collects progress and hands it to a progress bar at most once per interval, instead
+        of redrawing the bar for every chunk.
+
+        Args:
+            sink (tqdm | AggregateProgress): The progress bar to report to.
+            interval (float): Seconds between updates of the bar.
+        """
+        self.sink = sink
+        self.interval = interval
+        self.pending = 0
+        self.last = time.monotonic()
+
+
+    def update(self, n: int) -> None:
+        self.pending += n
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.sink.update(self.pending)
+            self.pending = 0
+            self.last = now
+
+
+    def flush(self) -> None:
+        if self.pending:
+            self.sink.update(self.pending)
+            self.pending = 0
+
+
+class CountingHash:
+    def __init__(self, hasher):
+        """
+        A hash object that also counts the bytes it was given, so a download can be checked against
+        the size it was expected to have as well as its digest.
+
+        Args:
+            hasher (hashlib._Hash): The hash object to update.
+        """
+        self.hasher = hasher
+        self.size = 0
+
+
+    def update(self, data) -> None:
+        self.hasher.update(data)
+        self.size += len(data)
+
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
+
+
+class TeeWriter:
+    def __init__(self, f, sink):
+        """
+        Writes everything to a file and to a sink (ie. a ZipStream). If the sink fails, the file
+        still gets every byte and the error is kept in self.error for the caller to deal with.
+
+        Args:
+            f (file): The file.
+            sink (ZipStream | SpooledArchive): The sink, with write(), close() and abort().
+        """
+        self.f = f
+        self.sink = sink
+        self.error: Optional[Exception] = None
+
+
+    def write(self, data) -> int:
+        n = self.f.write(data)
+        if self.sink is not None:
+            try:
+                self.sink.write(data[:n] if n is not None else data)
+            except (OSError, ValueError) as e:
+                self.error = e
+                self.sink.abort()
+                self.sink = None
+        return n
+
+
+class DownloadTarget:
+    def __init__(self, out_file: str, sink = None, keep: bool = True):
+        """
+        Where a download is written: the file, a sink extracting it as it arrives, or both.
+
+        Args:
+            out_file (str): The file to save the download as.
+            sink (ZipStream | SpooledArchive): A sink to stream the download into, if any.
+            keep (bool): Save the file even when there is a sink.
+        """
+        self.out_file = out_file
+        self.sink = sink
+        self.keep = keep or sink is None
+        self.f = None
+        self.writer = None
+        self.tee: Optional[TeeWriter] = None
+
+        #  Why the sink gave up, if it did
+        self.error: Optional[Exception] = None
+
+
+    def __enter__(self) -> 'DownloadTarget':
+        if self.keep:
+            # a fresh file, the old one may be hardlinked to a blob of the artifact cache
+            if os.path.lexists(self.out_file): os.remove(self.out_file)
+            self.f = open(self.out_file, 'wb')
+        if self.f is not None and self.sink is not None:
+            self.tee = TeeWriter(self.f, self.sink)
+            self.writer = self.tee
+        else:
+            self.writer = self.f if self.f is not None else self.sink
+        return self
+
+
+    def __exit__(self, exc_type, *exc) -> bool:
+        if self.f is not None:
+            self.f.close()
+        if self.tee is not None:
+            self.error = self.tee.error
+
+        # a failed download leaves nothing half extracted behind
+        if exc_type is not None and self.sink is not None and self.error is None:
+            self.sink.abort()
+        return False
+
+
+class Transfer:
+    #  Bounds of the adaptive read size, the buffer is allocated once at the largest
+    MIN_CHUNK = 64 * 1024
+    MAX_CHUNK = 4 * 1024 * 1024
+
+    #  Reads faster than this grow the read size, slower ones shrink it
+    FAST_READ = 0.005
+    SLOW_READ = 0.05
+
+    @staticmethod
+    def chunks(r, chunk_size: int = MIN_CHUNK) -> Iterator[memoryview]:
+        """
+        Yields the body of a streamed response. Plain bodies are read with readinto into one reusable
+        buffer, so no bytes object is allocated per chunk; the read size doubles while reads come back
+        quickly and halves when they block, following the throughput of the link. This bypasses urllib3,
+        so a body shorter than its Content-Length is caught here instead, and a complete body hands its
+        connection back to the pool here, as urllib3 never sees the end of it.
+
+        Args:
+            r (requests.Response): A response opened with stream=True.
+            chunk_size (int): The first read size.
+        Yields:
+            memoryview: The next part of the body. Only valid until the next one is asked for.
+        Raises:
+            requests.exceptions.ChunkedEncodingError: If the body ended before all of it arrived.
+            requests.exceptions.ConnectionError: If the connection failed.
+        """
+        import http.client
+        import requests
+        import urllib3
+
+        raw = r.raw
+        fp = getattr(raw, '_fp', None)
+        encoded = r.headers.get('Content-Encoding', 'identity').lower() not in ('', 'identity')
+
+        try:
+            # compressed bodies have to go through urllib3 to be decoded
+            if encoded or fp is None or not hasattr(fp, 'readinto'):
+                for chunk in raw.stream(chunk_size, decode_content=True):
+                    if chunk:
+                        yield memoryview(chunk)
+                return
+
+            length = r.headers.get('Content-Length', '')
+            length = int(length) if length.isdigit() else None
+            received = 0
+
+            view = memoryview(bytearray(Transfer.MAX_CHUNK))
+            while True:
+                start = time.perf_counter()
+                n = fp.readinto(view[:chunk_size])
+                if not n:
+                    break
+                received += n
+
+                took = time.perf_counter() - start
+                if n == chunk_size and took < Transfer.FAST_READ:
+                    chunk_size = min(chunk_size * 2, Transfer.MAX_CHUNK)
+                elif took > Transfer.SLOW_READ:
+                    chunk_size = max(chunk_size // 2, Transfer.MIN_CHUNK)
+
+                yield view[:n]
+
+            if length is not None and received < length:
+                raise urllib3.exceptions.ProtocolError(f"Connection broken: IncompleteRead({received} bytes read, {length - received} more expected)")
+
+            # otherwise closing the response would close the connection, as if the body was left unread
+            raw.release_conn()
+
+        # the same errors requests raises from iter_content, so callers only catch RequestException
+        except requests.RequestException:
+            raise
+        except (http.client.IncompleteRead, urllib3.exceptions.ProtocolError) as e:
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        except (http.client.HTTPException, urllib3.exceptions.HTTPError, OSError) as e:
+            raise requests.exceptions.ConnectionError(e) from e
+
+
+    @staticmethod
+    def write_all(f, data: memoryview) -> None:
+        # unbuffered files may take less than they are given
+        while data:
+            n = f.write(data)
+            data = data[n:] if n is not None else data[len(data):]
+
+
+    @staticmethod
+    def copy(r, f, hasher = None, progress = None, on_chunk: Optional[Callable[[int], None]] = None, skip: int = 0) -> int:
+        """
+        Streams a response body into an open file.
+
+        Args:
+            r (requests.Response): A response opened with stream=True.
+            f (file): The file to write to, at its current position.
+            hasher (hashlib._Hash): A hash object updated with the bytes written.
+            progress (tqdm | AggregateProgress | ThrottledProgress): Told about the bytes written, at most every 0.1s.
+            on_chunk (callable): Called with the size of every chunk as soon as it is written.
+            skip (int): Bytes at the start of the body to throw away instead of writing.
+        Returns:
+            int: The number of bytes written.
+        """
+        if progress is not None and not isinstance(progress, ThrottledProgress):
+            progress = ThrottledProgress(progress)
+
+        written = 0
+        try:
+            for view in Transfer.chunks(r):
+                if skip:
+                    if len(view) <= skip:
+                        skip -= len(view)
+                        continue
+                    view, skip = view[skip:], 0
+
+                Transfer.write_all(f, view)
+                written += len(view)
+                if hasher is not None: hasher.update(view)
+                if on_chunk is not None: on_chunk(len(view))
+                if progress is not None: progress.update(len(view))
+        finally:
+            if progress is not None: progress.flush()
+
+        return written
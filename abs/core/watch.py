@@ -0,0 +1,352 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import abc
+import sys
+import time
+import fnmatch
+import struct
+
+from typing import Dict, List, Optional, Set
+
+from buildgraph import BuildGraph
+from profiler import Profiler
+
+
+class Watcher(abc.ABC):
+    #  Editor droppings and build by-products that never trigger a rebuild
+    DEFAULT_EXCLUDE = [".git", "abs-dist-win*", "CMakeFiles", ".abs-build.json*", "*.abs-tmp", "*.tmp", "*.swp", "*~"]
+
+    def __init__(self, roots: List[str], exclude: Optional[List[str]] = None):
+        """
+        Reports files that change under a set of directories. Use Watcher.create() to get the
+        best watcher for the platform.
+
+        Args:
+            roots (list): The directories to watch.
+            exclude (list): fnmatch patterns of file and directory names to ignore.
+        """
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.exclude = list(self.DEFAULT_EXCLUDE if exclude is None else exclude)
+
+
+    @staticmethod
+    def create(roots: List[str], exclude: Optional[List[str]] = None, poll: bool = False) -> 'Watcher':
+        """
+        Returns an inotify watcher where the kernel has inotify, a polling one otherwise.
+
+        Args:
+            poll (bool): Poll even where inotify is available.
+        """
+        if not poll and InotifyWatcher.available():
+            try:
+                return InotifyWatcher(roots, exclude)
+            except OSError as e:
+                print(f"(!) inotify is unavailable ({e}), polling for changes instead.")
+        return PollingWatcher(roots, exclude)
+
+
+    def excluded(self, name: str) -> bool:
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.exclude)
+
+
+    @abc.abstractmethod
+    def poll(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Waits up to timeout seconds (forever if None) for changes.
+
+        Returns:
+            set: The paths that changed, empty if none did in time.
+        """
+
+
+    def wait(self, debounce: float = 0.3, max_wait: float = 5.0) -> Set[str]:
+        """
+        Waits for a change, then keeps collecting until nothing has changed for debounce seconds,
+        so a burst of saves (ie. a git checkout) comes back as one set.
+
+        Args:
+            debounce (float): Seconds of quiet that end a burst.
+            max_wait (float): The longest a burst is collected for.
+        Returns:
+            set: The paths that changed.
+        """
+        changes = set()
+        while not changes:
+            changes = self.poll(None)
+
+        deadline = time.monotonic() + max_wait
+        while time.monotonic() < deadline:
+            more = self.poll(min(debounce, max(0.0, deadline - time.monotonic())))
+            if not more:
+                break
+            changes |= more
+        return changes
+
+
+    def close(self) -> None:
+        pass
+
+
+class PollingWatcher(Watcher):
+    def __init__(self, roots: List[str], exclude: Optional[List[str]] = None, interval: float = 0.5):
+        """
+        Finds changes by comparing the size and mtime of every file every interval seconds.
+
+        Args:
+            interval (float): Seconds between scans.
+        """
+        super().__init__(roots, exclude)
+        self.interval = interval
+        self.state = self.scan()
+
+
+    def scan(self) -> Dict[str, tuple]:
+        state = {}
+        for root in self.roots:
+            for path, dirs, files in os.walk(root):
+                dirs[:] = [d for d in dirs if not self.excluded(d)]
+                for name in files:
+                    if self.excluded(name):
+                        continue
+                    full = os.path.join(path, name)
+                    try:
+                        st = os.stat(full)
+                    except OSError:
+                        continue
+                    state[full] = (st.st_size, st.st_mtime_ns)
+        return state
+
+
+    def poll(self, timeout: Optional[float] = None) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self.scan()
+            changed = {path for path in state.keys() | self.state.keys() if state.get(path) != self.state.get(path)}
+            self.state = state
+            if changed:
+                return changed
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic())))
+
+
+class InotifyWatcher(Watcher):
+    #  inotify(7) event masks
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+
+    WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+    #  struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, roots: List[str], exclude: Optional[List[str]] = None):
+        """
+        Finds changes through inotify, called through ctypes so nothing has to be installed.
+        Every directory under the roots gets a watch, new directories as they appear.
+
+        Raises:
+            OSError: If inotify could not be set up, ie. the watch limit was reached.
+        """
+        super().__init__(roots, exclude)
+        # ctypes is only loaded when something is actually watched
+        import ctypes
+        import ctypes.util
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1: {os.strerror(ctypes.get_errno())}")
+
+        self.dirs: Dict[int, str] = {}
+        try:
+            for root in self.roots:
+                self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith('linux')
+
+
+    def add_watch(self, path: str) -> None:
+        import ctypes
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch {path}: {os.strerror(ctypes.get_errno())}")
+        self.dirs[wd] = path
+
+
+    def add_tree(self, root: str) -> None:
+        self.add_watch(root)
+        for path, dirs, _ in os.walk(root):
+            dirs[:] = [d for d in dirs if not self.excluded(d)]
+            for d in dirs:
+                self.add_watch(os.path.join(path, d))
+
+
+    def poll(self, timeout: Optional[float] = None) -> Set[str]:
+        import select
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changes = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            pos = 0
+            while pos + self.EVENT.size <= len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, pos)
+                name = data[pos + self.EVENT.size:pos + self.EVENT.size + length].rstrip(b'\0')
+                pos += self.EVENT.size + length
+
+                # the kernel dropped events, so anything may have changed
+                if mask & self.IN_Q_OVERFLOW:
+                    changes.update(self.roots)
+                    continue
+                if mask & self.IN_IGNORED:
+                    self.dirs.pop(wd, None)
+                    continue
+                if wd not in self.dirs or not name:
+                    continue
+
+                fsname = os.fsdecode(name)
+                if self.excluded(fsname):
+                    continue
+
+                path = os.path.join(self.dirs[wd], fsname)
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        try:
+                            self.add_tree(path)
+                        except OSError:
+                            pass
+                        # files written before the watch was in place are only seen by walking
+                        for sub, _, files in os.walk(path):
+                            changes.update(os.path.join(sub, f) for f in files if not self.excluded(f))
+                    continue
+
+                changes.add(path)
+
+        return changes
+
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class WatchSession:
+    #  Never run by watch mode: clone would check out over the edits being watched, and packages and the
+    #  remote build cache are for releases
+    SKIP_STEPS = ('clone', 'package', 'remote-fetch', 'remote-store')
+
+    def __init__(self, depends, src_dir: str = "stremio-shell", dist_dir: Optional[str] = None, debounce: float = 0.3, poll: bool = False):
+        """
+        Rebuilds the shell whenever its sources change, running only the steps a change affects.
+        The graph, the resolved dependencies and the captured toolchain environment stay in
+        memory between rebuilds, and the stager only copies outputs that changed.
+
+        Args:
+            depends (Depends): The resolved dependencies.
+            src_dir (str): The stremio-shell checkout to watch and build.
+            dist_dir (str): Where to stage the build, src_dir\\abs-dist-win if None.
+            debounce (float): Seconds of quiet after a change before building.
+            poll (bool): Poll for changes even where inotify is available.
+        """
+        self.depends = depends
+        self.src_dir = src_dir
+        self.dist_dir = dist_dir or os.path.join(src_dir, "abs-dist-win")
+        self.debounce = debounce
+        self.poll = poll
+        self.graph: Optional[BuildGraph] = None
+
+
+    def affected(self, paths: Set[str]) -> Set[str]:
+        """
+        The steps that have to run for a set of changed paths, those depending on them included.
+        """
+        steps = set()
+        for path in paths:
+            name = os.path.basename(path)
+            if name == 'server.js':
+                steps.add('stage')
+            elif name == 'stremio.pro':
+                steps.update(('server.js', 'cmake'))
+            else:
+                steps.add('cmake')
+        return self.graph.dependents(steps) - set(self.SKIP_STEPS)
+
+
+    def build(self, steps: Optional[Set[str]] = None) -> bool:
+        """
+        Runs the given steps, every step but SKIP_STEPS if None.
+
+        Returns:
+            bool: True if the build succeeded.
+        """
+        start = time.perf_counter()
+        steps = set(self.graph.steps) - set(self.SKIP_STEPS) if steps is None else steps
+
+        # the first checkout is the one time clone runs
+        if not os.path.exists(os.path.join(self.src_dir, 'stremio.pro')):
+            steps = (self.graph.dependents({'clone'}) - set(self.SKIP_STEPS)) | {'clone'}
+
+        with Profiler.span("watch build", 'watch', steps=sorted(steps)):
+            results = self.graph.run(only=steps)
+
+        failed = [name for name, result in results.items() if result['status'] in ('failed', 'blocked')]
+        ran = [name for name, result in results.items() if result['status'] == 'ran']
+        if failed:
+            BuildGraph.report(results)
+        print(f"[{time.strftime('%H:%M:%S')}] {'FAILED' if failed else 'OK'} in {time.perf_counter() - start:.2f}s"
+              f" (ran: {', '.join(ran) or 'nothing'})")
+        return not failed
+
+
+    def run(self, builds: Optional[int] = None) -> None:
+        """
+        Builds once, then rebuilds on every change until interrupted.
+
+        Args:
+            builds (int): Stop after this many rebuilds, forever if None.
+        """
+        self.graph = self.depends.build_graph(self.src_dir, self.dist_dir)
+        self.build()
+
+        watcher = Watcher.create([self.src_dir], poll=self.poll)
+        print(f"\nWatching {self.src_dir} for changes ({watcher.__class__.__name__}), Ctrl+C to stop...")
+        try:
+            count = 0
+            while builds is None or count < builds:
+                changes = watcher.wait(self.debounce)
+                steps = self.affected(changes)
+                shown = sorted(os.path.relpath(path, self.src_dir) for path in changes)
+                print(f"\n{len(changes)} changed: {', '.join(shown[:5])}{' ...' if len(shown) > 5 else ''}")
+                self.build(steps)
+                count += 1
+        finally:
+            watcher.close()
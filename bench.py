@@ -0,0 +1,69 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import sys
+import json
+import argparse
+
+# append the core directory to the path so we can import from it
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), 'abs', 'core')))
+from benchmarks import Benchmarks
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for startup and the download, extract, discover, stage, deploy, package, remote cache and native build hot paths")
+    parser.add_argument("--only", nargs='+', choices=['startup', 'download', 'extract', 'discover', 'stage', 'deploy', 'package', 'remote', 'native'],
+                        help="run only these suites")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the median is reported (default: 3)")
+    parser.add_argument("--quick", action='store_true', help="smaller payloads, for a fast smoke run")
+    parser.add_argument("--out", default='abs/bench/results.json', help="where to write the results (default: abs/bench/results.json)")
+    parser.add_argument("--baseline", default='abs/bench/baseline.json', help="the results to compare against (default: abs/bench/baseline.json)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="the slowdown flagged as a regression (default: 0.2, ie. 20%%)")
+    parser.add_argument("--import-budget", type=float, default=Benchmarks.IMPORT_BUDGET_MS, metavar="MS",
+                        help=f"the most abs.py may spend importing its modules (default: {Benchmarks.IMPORT_BUDGET_MS:.0f}ms)")
+    parser.add_argument("--save-baseline", action='store_true', help="store these results as the new baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    print("------------------------------ [Automatic Build Script for Stremio: Benchmarks] ------------------------------")
+    results = Benchmarks(repeat=args.repeat, quick=args.quick).run(args.only)
+    Benchmarks.save(results, args.out)
+    print(f"\nResults written to {args.out}")
+
+    # startup has a hard budget on top of the baseline comparison
+    failures = Benchmarks.check_startup(results, args.import_budget)
+    for line in failures:
+        print(f"(!) {line}")
+
+    if args.save_baseline:
+        Benchmarks.save(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 1 if failures else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to store one.")
+        return 1 if failures else 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = Benchmarks.compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n(!) {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print(f"\nNo regressions beyond {args.threshold:.0%}.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
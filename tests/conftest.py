@@ -0,0 +1,19 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import sys
+
+import pytest
+
+# the core modules import each other by name, as abs.py and bench.py set them up
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'abs', 'core')))
+
+
+@pytest.fixture(autouse=True)
+def artifact_cache_dir(tmp_path, monkeypatch):
+    # Depends() opens the artifact cache, which would otherwise be created under the real home directory
+    monkeypatch.setenv('ABS_CACHE_DIR', str(tmp_path / 'artifact-cache'))
@@ -0,0 +1,97 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+
+import pytest
+
+from batch import BatchBuilder
+from buildgraph import BuildGraph
+
+
+class FakeMirror:
+    def __init__(self):
+        self.updates = 0
+
+    def update(self, ref=None):
+        self.updates += 1
+
+
+class FakeDepends:
+    """
+    Stands in for Depends: the same build graph shape, with steps that only write files.
+    """
+    def __init__(self):
+        self.depend_paths = {}
+        self.mirror = FakeMirror()
+
+    def git_mirror(self):
+        return self.mirror
+
+    def build_graph(self, src_dir, dist_dir, ref=None):
+        def clone():
+            os.makedirs(src_dir, exist_ok=True)
+            with open(os.path.join(src_dir, 'stremio.pro'), 'w') as f:
+                f.write(f"ref={ref}\n")
+
+        def cmake():
+            if ref == 'broken':
+                raise RuntimeError("compile error")
+
+        def stage():
+            os.makedirs(dist_dir, exist_ok=True)
+            with open(os.path.join(dist_dir, 'stremio.exe'), 'w') as f:
+                f.write(ref)
+
+        graph = BuildGraph(os.path.join(src_dir, '.abs-build.json'))
+        graph.add('clone', clone, outputs=[os.path.join(src_dir, 'stremio.pro')], key=ref)
+        graph.add('cmake', cmake, deps=['clone'])
+        graph.add('stage', stage, deps=['cmake'])
+        return graph
+
+
+def write_manifest(path, builds, workers=2):
+    path.write_text(json.dumps({'workers': workers, 'builds': builds}))
+    return str(path)
+
+
+def test_failed_build_does_not_block_the_others(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest = BatchBuilder.load_manifest(write_manifest(tmp_path / 'batch.json', [
+        {'name': 'v4.4.159', 'ref': 'v4.4.159'},
+        {'name': 'broken', 'ref': 'broken', 'out': 'dist/broken'},
+        {'name': 'feature/x', 'ref': 'feature/x'},
+    ]))
+    assert manifest['builds'][2].out == os.path.join('dist', 'feature_x')
+
+    dp = FakeDepends()
+    builder = BatchBuilder(dp, manifest['builds'], workers=manifest['workers'], workspace='batch')
+    results = builder.run()
+    assert dp.mirror.updates == 1
+
+    assert [r['name'] for r in results] == ['v4.4.159', 'broken', 'feature/x']
+    assert [r['status'] for r in results] == ['ok', 'failed', 'ok']
+    assert results[1]['steps']['cmake'] == {'status': 'failed', 'elapsed': results[1]['steps']['cmake']['elapsed'], 'error': 'compile error'}
+    assert results[1]['steps']['stage']['status'] == 'blocked'
+    assert (tmp_path / 'dist' / 'feature_x' / 'stremio.exe').read_text() == 'feature/x'
+    assert (tmp_path / 'batch' / 'src' / 'v4.4.159' / 'stremio.pro').exists()
+
+    BatchBuilder.write_results(results, 'out/results.json')
+    with open('out/results.json') as f:
+        written = json.load(f)
+    assert written['ok'] is False
+    assert [b['status'] for b in written['builds']] == ['ok', 'failed', 'ok']
+
+
+@pytest.mark.parametrize('builds', [
+    [],
+    [{'ref': 'master'}],
+    [{'name': 'a'}, {'name': 'a'}],
+])
+def test_malformed_manifest(tmp_path, builds):
+    with pytest.raises(ValueError):
+        BatchBuilder.load_manifest(write_manifest(tmp_path / 'batch.json', builds))
@@ -0,0 +1,100 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+
+import pytest
+
+from buildgraph import BuildGraph
+
+
+@pytest.fixture
+def tree(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'main.cpp').write_text("int main() {}\n")
+    return tmp_path
+
+
+def make_graph(tree, calls, fail=()):
+    """
+    compile <- link <- package, with docs on its own. Each step notes that it ran in calls.
+    """
+    def step(name, output=None):
+        def action():
+            calls.append(name)
+            if name in fail:
+                raise RuntimeError(f"{name} failed")
+            if output:
+                (tree / output).write_text(name)
+        return action
+
+    graph = BuildGraph(str(tree / '.abs-build.json'))
+    graph.add('compile', step('compile', 'main.o'), inputs=[str(tree / 'src')], outputs=[str(tree / 'main.o')])
+    graph.add('link', step('link', 'main.exe'), deps=['compile'], inputs=[str(tree / 'main.o')], outputs=[str(tree / 'main.exe')])
+    graph.add('package', step('package'), deps=['link'])
+    graph.add('docs', step('docs', 'docs.html'), key="v1", outputs=[str(tree / 'docs.html')])
+    return graph
+
+
+def statuses(results):
+    return {name: result['status'] for name, result in results.items()}
+
+
+def test_unchanged_steps_are_skipped(tree):
+    calls = []
+    assert statuses(make_graph(tree, calls).run()) == {'compile': 'ran', 'link': 'ran', 'package': 'ran', 'docs': 'ran'}
+
+    calls.clear()
+    # steps without inputs or key always run
+    assert statuses(make_graph(tree, calls).run()) == {'compile': 'skipped', 'link': 'skipped', 'package': 'ran', 'docs': 'skipped'}
+    assert calls == ['package']
+
+
+def test_changed_input_reruns_its_dependents(tree):
+    make_graph(tree, []).run()
+
+    (tree / 'src' / 'main.cpp').write_text("int main() { return 1; }\n")
+    calls = []
+    results = make_graph(tree, calls).run()
+    assert statuses(results) == {'compile': 'ran', 'link': 'ran', 'package': 'ran', 'docs': 'skipped'}
+    assert calls.index('compile') < calls.index('link') < calls.index('package')
+
+
+def test_missing_output_reruns_the_step(tree):
+    make_graph(tree, []).run()
+    os.remove(tree / 'docs.html')
+    assert statuses(make_graph(tree, []).run())['docs'] == 'ran'
+
+
+def test_failed_dependency_blocks_its_dependents(tree):
+    calls = []
+    results = make_graph(tree, calls, fail={'compile'}).run()
+    assert statuses(results) == {'compile': 'failed', 'link': 'blocked', 'package': 'blocked', 'docs': 'ran'}
+    assert str(results['compile']['error']) == "compile failed"
+    assert 'link' not in calls
+
+    # a failed step keeps no stamp, so it runs again even though nothing changed
+    assert statuses(make_graph(tree, []).run())['compile'] == 'ran'
+
+
+def test_dependents(tree):
+    graph = make_graph(tree, [])
+    assert graph.dependents({'compile'}) == {'compile', 'link', 'package'}
+    assert graph.dependents({'link'}) == {'link', 'package'}
+    assert graph.dependents({'docs'}) == {'docs'}
+
+
+def test_cycles_and_unknown_steps(tree):
+    graph = make_graph(tree, [])
+    graph.add('compile', lambda: None, deps=['package'])
+    with pytest.raises(ValueError):
+        graph.order()
+
+    graph = make_graph(tree, [])
+    graph.add('sign', lambda: None, deps=['notarize'])
+    with pytest.raises(ValueError):
+        graph.run()
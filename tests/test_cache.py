@@ -0,0 +1,170 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import hashlib
+
+import pytest
+import requests
+
+from benchmarks import LocalServer, PayloadHandler
+from cache import ArtifactCache
+from helpers import Helpers
+
+SIZE = 2 * 1024 * 1024
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ArtifactCache(str(tmp_path / 'cache'))
+
+
+def out_dir(tmp_path) -> str:
+    return f"{tmp_path / 'out'}{os.sep}"
+
+
+def test_truncated_download_is_not_cached(server, cache, tmp_path):
+    url = f"{server.url}/{SIZE}?cut={SIZE // 2}"
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        cache.fetch(url, 'payload.bin', out_path=out_dir(tmp_path), is_archive=False)
+    assert cache.lookup(url) is None
+    assert not os.listdir(cache.objects_dir)
+
+
+def test_hit_is_checked_and_copied(server, cache, tmp_path):
+    url = f"{server.url}/{SIZE}"
+    digest = hashlib.sha256(requests.get(url).content).hexdigest()
+
+    cache.fetch(url, 'payload.bin', out_path=out_dir(tmp_path), sha256=digest, is_archive=False)
+    assert cache.lookup(url, digest)['size'] == SIZE
+
+    # a hit is a copy of the blob, writing to it leaves the cache intact
+    cache.fetch(url, 'payload.bin', out_path=out_dir(tmp_path), sha256=digest, is_archive=False)
+    with open(os.path.join(out_dir(tmp_path), 'payload.bin'), 'wb') as f:
+        f.write(b'overwritten')
+    assert cache.lookup(url, digest) is not None
+
+
+def test_damaged_blob_is_downloaded_again(server, cache, tmp_path):
+    url = f"{server.url}/{SIZE}"
+    cache.fetch(url, 'payload.bin', out_path=out_dir(tmp_path), is_archive=False)
+    entry = cache.lookup(url)
+
+    with open(cache.blob_path(entry['sha256']), 'r+b') as f:
+        f.truncate(SIZE // 2)
+    assert cache.lookup(url) is None
+
+    cache.fetch(url, 'payload.bin', out_path=out_dir(tmp_path), is_archive=False)
+    assert os.path.getsize(cache.blob_path(entry['sha256'])) == SIZE
+
+
+def serve_archive(kind: str, tmp_path) -> bytes:
+    src = tmp_path / 'archive-src'
+    for rel in ('ffmpeg/bin/ffmpeg.exe', 'ffmpeg/doc/readme.txt'):
+        (src / rel).parent.mkdir(parents=True, exist_ok=True)
+        (src / rel).write_bytes(os.urandom(64 * 1024))
+
+    archive = tmp_path / f"synthetic.{kind}"
+    if kind == 'zip':
+        import zipfile
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for rel in ('ffmpeg/bin/ffmpeg.exe', 'ffmpeg/doc/readme.txt'):
+                zf.write(src / rel, rel)
+    else:
+        py7zr = pytest.importorskip('py7zr')
+        with py7zr.SevenZipFile(archive, 'w') as sz:
+            sz.writeall(src / 'ffmpeg', 'ffmpeg')
+
+    data = archive.read_bytes()
+    PayloadHandler.payloads[len(data)] = data
+    return data
+
+
+@pytest.mark.parametrize('kind', ['zip', '7z'])
+def test_extracted_archive_is_only_placed_once_it_matches_its_pin(server, cache, tmp_path, kind):
+    data = serve_archive(kind, tmp_path)
+    url = f"{server.url}/{len(data)}.{kind}"
+    out = out_dir(tmp_path)
+
+    with pytest.raises(ValueError):
+        cache.fetch(url, 'FFMpeg.exe', out_path=out, sha256='0' * 64, extract=True, keep_archive=False)
+    assert os.listdir(out) == []
+
+    digest = hashlib.sha256(data).hexdigest()
+    assert cache.fetch(url, 'FFMpeg.exe', out_path=out, sha256=digest, extract=True, keep_archive=False) == (f"FFMpeg.{kind}", True)
+    assert os.listdir(out) == ['FFMpeg']
+    assert os.path.exists(os.path.join(out, 'FFMpeg', 'ffmpeg', 'bin', 'ffmpeg.exe'))
+
+    # a hit extracts from the blob, replacing what was there
+    os.remove(os.path.join(out, 'FFMpeg', 'ffmpeg', 'bin', 'ffmpeg.exe'))
+    cache.fetch(url, 'FFMpeg.exe', out_path=out, sha256=digest, extract=True, members=['*/bin/*'], keep_archive=False)
+    assert os.path.exists(os.path.join(out, 'FFMpeg', 'ffmpeg', 'bin', 'ffmpeg.exe'))
+    assert not os.path.exists(os.path.join(out, 'FFMpeg', 'ffmpeg', 'doc'))
+
+
+def test_pinned_hit_is_only_hashed_again_when_the_blob_changed(server, cache, tmp_path, monkeypatch):
+    url = f"{server.url}/{SIZE}"
+    digest = hashlib.sha256(requests.get(url).content).hexdigest()
+    cache.fetch(url, 'payload.bin', out_path=out_dir(tmp_path), sha256=digest, is_archive=False)
+
+    hashed = []
+    hash_file = Helpers.hash_file
+    monkeypatch.setattr(Helpers, 'hash_file', staticmethod(lambda path, hasher: hashed.append(path) or hash_file(path, hasher)))
+    assert cache.lookup(url, digest) is not None
+    assert hashed == []
+
+    # same size, different bytes and mtime
+    blob = cache.blob_path(digest)
+    with open(blob, 'r+b') as f:
+        f.write(b'\0' * 16)
+    os.utime(blob, ns=(0, 0))
+    assert cache.lookup(url, digest) is None
+    assert hashed == [blob]
+
+
+def test_instances_share_the_index(server, tmp_path):
+    # two runs on one host, each with the index as it was when they started
+    first, second = ArtifactCache(str(tmp_path / 'cache')), ArtifactCache(str(tmp_path / 'cache'))
+    first.fetch(f"{server.url}/{SIZE}", 'a.bin', out_path=out_dir(tmp_path), is_archive=False)
+    second.fetch(f"{server.url}/{SIZE // 2}", 'b.bin', out_path=out_dir(tmp_path), is_archive=False)
+
+    assert first.lookup(f"{server.url}/{SIZE // 2}") is not None
+    assert ArtifactCache(str(tmp_path / 'cache')).lookup(f"{server.url}/{SIZE}") is not None
+
+
+def test_eviction_skips_blobs_in_use(server, tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), max_bytes=SIZE)
+    old, busy, new = (f"{server.url}/{SIZE - i}" for i in range(3))
+    for url in (old, busy):
+        cache.fetch(url, 'payload.bin', out_path=out_dir(tmp_path), is_archive=False)
+
+    # both were used long ago, but a fetch of this process is still placing one of them
+    with cache.locked():
+        for obj in cache.index['objects'].values():
+            obj['atime'] = 0
+        busy_digest = cache.index['urls'][busy]['sha256']
+        cache.save_index()
+    cache.use(busy_digest)
+
+    cache.fetch(new, 'payload.bin', out_path=out_dir(tmp_path), is_archive=False)
+    assert cache.lookup(old) is None
+    assert cache.lookup(busy) is not None and os.path.exists(cache.blob_path(busy_digest))
+    assert cache.lookup(new) is not None
+    cache.release(busy_digest)
+
+
+def test_recently_used_blobs_are_not_evicted(server, tmp_path):
+    cache = ArtifactCache(str(tmp_path / 'cache'), max_bytes=SIZE)
+    for i in range(3):
+        cache.fetch(f"{server.url}/{SIZE - i}", 'payload.bin', out_path=out_dir(tmp_path), is_archive=False)
+    # another process may be placing any of them, the cache stays over its size for now
+    assert all(cache.lookup(f"{server.url}/{SIZE - i}") is not None for i in range(3))
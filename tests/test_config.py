@@ -0,0 +1,93 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+
+import pytest
+
+import config
+from config import ConfigStore
+
+
+@pytest.fixture
+def path(tmp_path) -> str:
+    return str(tmp_path / 'abs.json')
+
+
+def on_disk(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_schema_1_is_migrated_and_written_back(path):
+    with open(path, 'w') as f:
+        json.dump({'DEPENDS': {'git': 'C:\\git\\git.exe'}}, f)
+
+    data = ConfigStore(path).load()
+    assert data['SCHEMA'] == ConfigStore.SCHEMA_VERSION
+    assert data['FINGERPRINTS'] == {} and data['DEPENDS'] == {'git': 'C:\\git\\git.exe'}
+    assert on_disk(path) == data
+
+
+def test_newer_schema_is_refused(path):
+    with open(path, 'w') as f:
+        json.dump({'SCHEMA': ConfigStore.SCHEMA_VERSION + 1}, f)
+    with pytest.raises(ValueError):
+        ConfigStore(path).load()
+
+
+def test_flush_merges_with_other_runs(path):
+    # two runs that loaded the same config, each changing a different key
+    ConfigStore(path).flush(force=True)
+    first, second = ConfigStore(path), ConfigStore(path)
+    first.set('DEPENDS', 'git', 'git')
+    second.set('DEPENDS', 'cmake', 'cmake')
+    second.replace('FINGERPRINTS', {'cmake': [1, 2]})
+
+    assert first.flush() and second.flush()
+    assert not first.flush()
+    assert on_disk(path)['DEPENDS'] == {'git': 'git', 'cmake': 'cmake'}
+    assert on_disk(path)['FINGERPRINTS'] == {'cmake': [1, 2]}
+    assert ConfigStore(path).get('DEPENDS') == second.get('DEPENDS')
+
+
+def test_failed_write_leaves_the_config_intact(path, monkeypatch):
+    store = ConfigStore(path)
+    store.set('DEPENDS', 'git', 'git')
+    store.flush()
+    before = open(path).read()
+
+    def dump(data, f, **kwargs):
+        f.write('{"DEPENDS": {')
+        raise OSError("disk full")
+
+    monkeypatch.setattr(config.json, 'dump', dump)
+    store.set('DEPENDS', 'node', 'node')
+    with pytest.raises(OSError):
+        store.flush()
+
+    assert open(path).read() == before
+    assert sorted(os.listdir(os.path.dirname(path))) == ['abs.json', 'abs.json.lock']
+
+
+@pytest.mark.parametrize('contents', ['{"DEPENDS": {"git": ', '', '[]'])
+def test_corrupt_config_is_moved_aside(path, contents):
+    with open(path, 'w') as f:
+        f.write(contents)
+
+    store = ConfigStore(path)
+    assert store.load() == {'SCHEMA': ConfigStore.SCHEMA_VERSION}
+    assert not store.exists()
+
+    backups = [name for name in os.listdir(os.path.dirname(path)) if name.startswith('abs.json.corrupt-')]
+    assert len(backups) == 1
+    assert open(os.path.join(os.path.dirname(path), backups[0])).read() == contents
+
+    # the first time setup writes a fresh one
+    store.replace('DEPENDS', {'git': 'git'})
+    store.flush()
+    assert on_disk(path)['DEPENDS'] == {'git': 'git'}
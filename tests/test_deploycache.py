@@ -0,0 +1,80 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import sys
+import shutil
+
+import pytest
+
+from deploycache import DeployCache
+
+# like windeployqt, files already next to the exe with the same size are left alone
+STUB = """
+import os, sys, shutil
+qt, exe = sys.argv[1], sys.argv[-1]
+for root, _, files in os.walk(qt):
+    for name in files:
+        src = os.path.join(root, name)
+        dst = os.path.join(os.path.dirname(exe), os.path.relpath(src, qt))
+        if os.path.exists(dst) and os.path.getsize(dst) == os.path.getsize(src):
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(src, dst)
+"""
+
+QT_FILES = ['Qt5Core.dll', 'Qt5Gui.dll', os.path.join('platforms', 'qwindows.dll'), os.path.join('qml', 'QtQuick.2', 'qmldir')]
+
+
+@pytest.fixture
+def setup(tmp_path):
+    qt = tmp_path / 'qt'
+    for rel in QT_FILES:
+        (qt / rel).parent.mkdir(parents=True, exist_ok=True)
+        (qt / rel).write_bytes(rel.encode() * 100)
+
+    stub = tmp_path / 'windeployqt_stub.py'
+    stub.write_text(STUB)
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'main.qml').write_text("import QtQuick 2.7\nItem {}\n")
+    dist = tmp_path / 'dist'
+    dist.mkdir()
+    (dist / 'stremio.exe').write_bytes(b'MZ not really an exe')
+
+    def deployer() -> DeployCache:
+        return DeployCache([sys.executable, str(stub), str(qt)], str(dist), qml_dir=str(src),
+                           cache_root=str(tmp_path / 'cache'), args=["{exe}"], mode='copy')
+    return deployer, qt, dist
+
+
+def test_stale_dist_records_every_file(setup):
+    deployer, qt, dist = setup
+    # an earlier deployment the tool considers up to date, as left by a build before the cache existed
+    shutil.copytree(qt, dist, dirs_exist_ok=True)
+
+    assert not deployer().deploy()
+    key = deployer().key()
+    assert deployer().load_entry(key)['files'] == sorted(QT_FILES)
+    assert not os.path.exists(os.path.join(deployer().entry_dir(key), 'files', 'stremio.exe'))
+
+    # replayed into a dist without them, every file comes back
+    for rel in QT_FILES:
+        os.remove(dist / rel)
+    assert deployer().deploy()
+    for rel in QT_FILES:
+        assert (dist / rel).read_bytes() == (qt / rel).read_bytes()
+    assert (dist / 'stremio.exe').read_bytes() == b'MZ not really an exe'
+
+
+def test_changed_binary_is_recorded_again(setup):
+    deployer, qt, dist = setup
+    assert not deployer().deploy()
+    assert deployer().deploy()
+
+    (dist / 'stremio.exe').write_bytes(b'MZ a different build')
+    assert not deployer().deploy()
+    assert len(os.listdir(deployer().cache_root)) == 2
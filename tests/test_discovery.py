@@ -0,0 +1,92 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+
+import pytest
+
+from discovery import DiscoveryIndex
+
+PATTERNS = {
+    'openssl': ["Program Files (x86)\\OpenSSL-Win*\\bin\\openssl.exe", "Program Files\\OpenSSL-Win*\\bin\\openssl.exe"],
+    'qt': ["Qt\\Qt5.12.7\\5.12.7\\msvc*\\bin\\windeployqt.exe"],
+    'cmake': ["Program Files\\CMake\\bin\\cmake.exe"],
+}
+
+
+def touch(path) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'')
+    return str(path)
+
+
+@pytest.fixture
+def drives(tmp_path):
+    c, d = tmp_path / 'C', tmp_path / 'D'
+    c.mkdir()
+    d.mkdir()
+    found = {
+        'openssl32': touch(c / 'Program Files (x86)' / 'OpenSSL-Win32' / 'bin' / 'openssl.exe'),
+        'openssl64': touch(d / 'Program Files' / 'OpenSSL-Win64' / 'bin' / 'openssl.exe'),
+        'qt': touch(d / 'Qt' / 'Qt5.12.7' / '5.12.7' / 'msvc2017' / 'bin' / 'windeployqt.exe'),
+    }
+    # close, but not matching
+    touch(c / 'Program Files' / 'OpenSSL' / 'bin' / 'openssl.exe')
+    touch(c / 'Qt' / 'Qt5.12.7' / '5.12.7' / 'mingw73_32' / 'bin' / 'windeployqt.exe')
+    return [str(c), str(d)], found
+
+
+def test_wildcards_and_roots(drives, tmp_path):
+    roots, found = drives
+    index = DiscoveryIndex(roots, PATTERNS, index_path=str(tmp_path / 'discovery.json'))
+
+    assert index.find('openssl') == [found['openssl32'], found['openssl64']]
+    assert index.find('openssl', root=roots[1]) == [found['openssl64']]
+    assert index.find('qt') == [found['qt']]
+    assert index.find('cmake') == []
+    assert index.find('unknown') == []
+
+    assert index.root_of(found['openssl32']) == roots[0]
+    assert index.root_of(found['qt']) == roots[1]
+    assert index.root_of(os.path.join(roots[0], 'elsewhere.exe')) is None
+
+
+def test_saved_index_is_reused_until_a_directory_changes(drives, tmp_path, monkeypatch):
+    roots, _ = drives
+    path = str(tmp_path / 'discovery.json')
+    DiscoveryIndex(roots, PATTERNS, index_path=path).load()
+
+    scans = []
+    scan = DiscoveryIndex.scan
+    monkeypatch.setattr(DiscoveryIndex, 'scan', lambda self: scans.append(1) or scan(self))
+
+    assert DiscoveryIndex(roots, PATTERNS, index_path=path).find('cmake') == []
+    assert scans == []
+
+    # installing cmake creates "CMake" in a directory the index listed, changing its mtime
+    cmake = touch(tmp_path / 'C' / 'Program Files' / 'CMake' / 'bin' / 'cmake.exe')
+    assert DiscoveryIndex(roots, PATTERNS, index_path=path).find('cmake') == [cmake]
+    assert scans == [1]
+
+
+def test_created_root_invalidates_the_index(drives, tmp_path):
+    roots, _ = drives
+    path = str(tmp_path / 'discovery.json')
+    missing = str(tmp_path / 'E')
+    assert DiscoveryIndex(roots + [missing], PATTERNS, index_path=path).find('cmake') == []
+
+    cmake = touch(tmp_path / 'E' / 'Program Files' / 'CMake' / 'bin' / 'cmake.exe')
+    assert DiscoveryIndex(roots + [missing], PATTERNS, index_path=path).find('cmake') == [cmake]
+
+
+def test_changed_patterns_invalidate_the_index(drives, tmp_path):
+    roots, _ = drives
+    path = str(tmp_path / 'discovery.json')
+    DiscoveryIndex(roots, PATTERNS, index_path=path).load()
+
+    patterns = dict(PATTERNS, qt=["Qt\\Qt5.12.7\\5.12.7\\mingw*\\bin\\windeployqt.exe"])
+    assert DiscoveryIndex(roots, patterns, index_path=path).find('qt') == [
+        os.path.join(roots[0], 'Qt', 'Qt5.12.7', '5.12.7', 'mingw73_32', 'bin', 'windeployqt.exe')]
@@ -0,0 +1,114 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import time
+import threading
+
+import pytest
+
+from benchmarks import LocalServer, PayloadHandler
+from depends import Depends
+from downloader import DownloadManager
+from helpers import Helpers
+
+SIZE = 256 * 1024
+
+
+class TrackingHandler(PayloadHandler):
+    """
+    Counts the connections it accepts and the most requests it served at once.
+    """
+    lock = threading.Lock()
+    connections = 0
+    active = 0
+    most_active = 0
+
+    def setup(self) -> None:
+        with TrackingHandler.lock:
+            TrackingHandler.connections += 1
+        super().setup()
+
+
+    def do_GET(self) -> None:
+        with TrackingHandler.lock:
+            TrackingHandler.active += 1
+            TrackingHandler.most_active = max(TrackingHandler.most_active, TrackingHandler.active)
+        try:
+            super().do_GET()
+        finally:
+            with TrackingHandler.lock:
+                TrackingHandler.active -= 1
+
+
+@pytest.fixture
+def server():
+    TrackingHandler.connections = TrackingHandler.active = TrackingHandler.most_active = 0
+    with LocalServer(TrackingHandler) as server:
+        yield server
+
+
+def out_dir(tmp_path) -> str:
+    return f"{tmp_path / 'out'}{os.sep}"
+
+
+def test_concurrency_is_bounded(server, tmp_path):
+    manager = DownloadManager(max_workers=2)
+    for i in range(6):
+        manager.add(f"tool{i}", f"{server.url}/{SIZE}?delay=0.2", f"tool{i}.exe", out_path=out_dir(tmp_path))
+
+    jobs = list(manager.run())
+    assert sorted(job.name for job in jobs) == [f"tool{i}" for i in range(6)]
+    assert all(job.error is None for job in jobs)
+    assert TrackingHandler.most_active == 2
+    # the session is shared, so there are never more connections than workers
+    assert TrackingHandler.connections == 2
+    for i in range(6):
+        assert os.path.getsize(os.path.join(out_dir(tmp_path), f"tool{i}.exe")) == SIZE
+
+
+def test_one_session_for_every_download(server, tmp_path):
+    manager = DownloadManager(max_workers=1)
+    for i in range(4):
+        manager.add(f"tool{i}", f"{server.url}/{SIZE}", f"tool{i}.exe", out_path=out_dir(tmp_path))
+    assert all(job.error is None for job in manager.run())
+    assert TrackingHandler.connections == 1
+
+
+def test_failed_job_does_not_stop_the_others(server, tmp_path):
+    manager = DownloadManager(max_workers=2)
+    manager.add("missing", f"{server.url}/missing", "missing.exe", out_path=out_dir(tmp_path))
+    manager.add("truncated", f"{server.url}/{SIZE}?cut=1000", "truncated.exe", out_path=out_dir(tmp_path))
+    manager.add("git", f"{server.url}/{SIZE}", "git.exe", out_path=out_dir(tmp_path))
+
+    jobs = {job.name: job for job in manager.run()}
+    assert jobs['missing'].error is not None
+    assert jobs['truncated'].error is not None
+    assert jobs['git'].error is None
+    assert os.path.getsize(os.path.join(out_dir(tmp_path), 'git.exe')) == SIZE
+
+
+def test_each_download_is_installed_as_it_arrives(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    start = time.monotonic()
+    installed = {}
+
+    def install_file(filename, is_archive, out_path='abs\\stremio-depends\\', members=None, extracted=False):
+        installed[filename] = time.monotonic() - start
+        return f"installed\\{filename}"
+
+    monkeypatch.setattr(Helpers, 'install_file', staticmethod(install_file))
+
+    dp = Depends()
+    dp.download_segments = 1
+    dp.pending_downloads = [("CMake", f"{server.url}/{SIZE}?delay=1.5"), ("Git", f"{server.url}/{SIZE}")]
+    dp.fetch_pending()
+
+    assert set(installed) == {"CMake.exe", "Git.exe"}
+    # git is installed while cmake is still downloading
+    assert installed["Git.exe"] < 1.0 <= installed["CMake.exe"]
+    assert dp.depend_paths['git'] == "installed\\Git.exe"
+    assert dp.pending_downloads == []
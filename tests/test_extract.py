@@ -0,0 +1,145 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from extract import Extractor, ZipStream
+
+FILES = {
+    'mpv/bin/libmpv-2.dll': os.urandom(256 * 1024),
+    'mpv/bin/mpv.exe': b'mpv' * 50000,
+    'mpv/doc/readme.txt': b'read me\n' * 100,
+}
+EVIL = '../evil.txt'
+
+
+class Unseekable(io.RawIOBase):
+    """
+    A write-only file, zipfile then writes each member's sizes in a data descriptor after it, as a streamed download would have them.
+    """
+    def __init__(self, f):
+        self.f = f
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self.f.write(data)
+
+
+def build(tmp_path, kind: str, evil: bool = False, descriptors: bool = False) -> str:
+    archive = str(tmp_path / f"archive.{kind}")
+    files = dict(FILES, **({EVIL: b'escaped'} if evil else {}))
+
+    if kind == 'zip':
+        with open(archive, 'wb') as raw:
+            with zipfile.ZipFile(Unseekable(raw) if descriptors else raw, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for name, data in files.items():
+                    zf.writestr(name, data)
+    else:
+        py7zr = pytest.importorskip('py7zr')
+        with py7zr.SevenZipFile(archive, 'w') as sz:
+            for name, data in files.items():
+                # writestr refuses a name that escapes, write does not check the name it is given
+                (tmp_path / 'member').write_bytes(data)
+                sz.write(tmp_path / 'member', name)
+
+    return archive
+
+
+def tree(root) -> dict:
+    found = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                found[os.path.relpath(path, root).replace(os.sep, '/')] = f.read()
+    return found
+
+
+@pytest.mark.parametrize('name, safe', [
+    ('mpv/bin/mpv.exe', True),
+    ('mpv\\bin\\mpv.exe', True),
+    ('../evil.txt', False),
+    ('mpv/../../evil.txt', False),
+    ('..\\evil.txt', False),
+    ('/etc/evil', False),
+    ('C:/Windows/evil.dll', False),
+])
+def test_safe_target(tmp_path, name, safe):
+    target = Extractor.safe_target(str(tmp_path), name)
+    assert (target is not None) == safe
+    if safe:
+        assert os.path.commonpath([str(tmp_path), target]) == str(tmp_path)
+
+
+@pytest.mark.parametrize('kind', ['zip', '7z'])
+@pytest.mark.parametrize('members', [None, ['*/bin/*'], ['mpv\\bin\\libmpv-2.dll']])
+def test_extract_selects_members(tmp_path, kind, members):
+    archive = build(tmp_path, kind)
+    out = tmp_path / 'out'
+    Extractor(workers=2).extract(archive, str(out), members)
+
+    wanted = {name for name in FILES if not members or name in Extractor.select(list(FILES), members)}
+    assert tree(out) == {name: FILES[name] for name in wanted}
+
+
+@pytest.mark.parametrize('kind', ['zip', '7z'])
+def test_extract_rejects_members_outside_the_output(tmp_path, kind):
+    archive = build(tmp_path, kind, evil=True)
+    out = tmp_path / 'deep' / 'out'
+    Extractor().extract(archive, str(out))
+
+    assert tree(out) == FILES
+    assert not os.path.exists(tmp_path / 'deep' / 'evil.txt')
+
+
+@pytest.mark.parametrize('descriptors', [False, True])
+@pytest.mark.parametrize('members', [None, ['*/bin/*']])
+def test_zip_streamed_matches_extracted(tmp_path, descriptors, members):
+    archive = build(tmp_path, 'zip', evil=True, descriptors=descriptors)
+    Extractor().extract(archive, str(tmp_path / 'after'), members)
+
+    # fed in pieces that split headers and compressed data alike, as a download would
+    sink = Extractor().stream('archive.zip', str(tmp_path / 'streamed'), members)
+    with open(archive, 'rb') as f:
+        while chunk := f.read(4093):
+            sink.write(chunk)
+    sink.close()
+
+    assert tree(tmp_path / 'streamed') == tree(tmp_path / 'after')
+    assert sorted(sink.extracted) == sorted(tree(tmp_path / 'after'))
+    assert not os.path.exists(tmp_path / 'evil.txt')
+
+
+def test_7z_spooled_matches_extracted(tmp_path):
+    archive = build(tmp_path, '7z', evil=True)
+    Extractor().extract(archive, str(tmp_path / 'after'))
+
+    sink = Extractor().stream('archive.7z', str(tmp_path / 'streamed'))
+    with open(archive, 'rb') as f:
+        sink.write(f.read())
+    sink.close()
+
+    assert tree(tmp_path / 'streamed') == tree(tmp_path / 'after') == FILES
+    assert Extractor().stream('archive.7z', str(tmp_path), spool=False) is None
+
+
+def test_zip_stream_cut_short_leaves_no_partial_member(tmp_path):
+    archive = build(tmp_path, 'zip')
+    with open(archive, 'rb') as f:
+        data = f.read()
+
+    # stops halfway through the big member
+    sink = ZipStream(str(tmp_path / 'out'))
+    sink.write(data[:len(FILES['mpv/bin/libmpv-2.dll']) // 2])
+    with pytest.raises(ValueError):
+        sink.close()
+    assert tree(tmp_path / 'out') == {}
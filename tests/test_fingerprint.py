@@ -0,0 +1,69 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import hashlib
+
+import pytest
+
+from depends import Depends
+from fingerprint import Fingerprint
+
+
+@pytest.fixture
+def depends(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('ABS_FINGERPRINT_HASH', raising=False)
+    # mpv has no version to probe, a changed fingerprint is simply refreshed
+    tool = tmp_path / 'libmpv-2.dll'
+    tool.write_bytes(b'a' * 4096)
+    dp = Depends()
+    dp.depend_paths = {'mpv': str(tool)}
+    return dp, tool
+
+
+def rewrite_in_place(path, data: bytes) -> None:
+    """
+    Changes a file without changing its size or mtime, which a stat alone cannot tell.
+    """
+    st = os.stat(path)
+    path.write_bytes(data)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def test_hash_is_only_checked_when_asked_for(depends, monkeypatch):
+    dp, tool = depends
+    monkeypatch.setenv('ABS_FINGERPRINT_HASH', '1')
+    dp = Depends()
+    dp.depend_paths = {'mpv': str(tool)}
+    assert dp.fingerprint_hash
+
+    dp.record_fingerprints()
+    recorded = dict(dp.fingerprints)
+    assert recorded['mpv']['sha256'] == hashlib.sha256(b'a' * 4096).hexdigest()
+    assert not dp.verify_fingerprints(recorded)
+
+    rewrite_in_place(tool, b'b' * 4096)
+    assert Fingerprint.matches(recorded['mpv'])
+
+    # a stat alone misses the change
+    dp.fingerprint_hash = False
+    assert not dp.verify_fingerprints(recorded)
+
+    dp.fingerprint_hash = True
+    assert dp.verify_fingerprints(recorded)
+    assert dp.fingerprints['mpv']['sha256'] == hashlib.sha256(b'b' * 4096).hexdigest()
+
+
+def test_fingerprints_without_a_hash_get_one(depends):
+    dp, tool = depends
+    dp.record_fingerprints()
+    recorded = dict(dp.fingerprints)
+    assert 'sha256' not in recorded['mpv']
+
+    dp.fingerprint_hash = True
+    assert dp.verify_fingerprints(recorded)
+    assert dp.fingerprints['mpv']['sha256'] == hashlib.sha256(b'a' * 4096).hexdigest()
@@ -0,0 +1,104 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import subprocess
+
+import pytest
+
+from gitmirror import GitMirror
+
+
+def git(*args, cwd=None) -> str:
+    return subprocess.run(["git", "-c", "protocol.file.allow=always", "-c", "user.name=abs", "-c", "user.email=abs@localhost", *args],
+                          cwd=cwd, check=True, stdout=subprocess.PIPE).stdout.decode().strip()
+
+
+def commit(repo: str, name: str, text: str, message: str) -> str:
+    with open(os.path.join(repo, name), 'w') as f:
+        f.write(text)
+    git("add", "-A", cwd=repo)
+    git("commit", "--quiet", "-m", message, cwd=repo)
+    return git("rev-parse", "HEAD", cwd=repo)
+
+
+@pytest.fixture
+def upstream(tmp_path):
+    """
+    A bare upstream with one submodule, also bare, and a v1 tag on the first commit.
+    """
+    work = tmp_path / 'work'
+    lib = tmp_path / 'lib-work'
+    for repo in (work, lib):
+        git("init", "--quiet", "-b", "master", str(repo))
+    commit(str(lib), 'lib.txt', 'lib', 'lib')
+    git("clone", "--quiet", "--bare", str(lib), str(tmp_path / 'lib.git'))
+
+    commit(str(work), 'f.txt', 'a', 'first')
+    git("submodule", "--quiet", "add", str(tmp_path / 'lib.git'), 'lib', cwd=str(work))
+    git("commit", "--quiet", "-m", "submodule", cwd=str(work))
+    git("tag", "v1", cwd=str(work))
+    git("clone", "--quiet", "--bare", str(work), str(tmp_path / 'upstream.git'))
+    return {'url': str(tmp_path / 'upstream.git'), 'work': str(work), 'root': tmp_path}
+
+
+def push_commit(upstream: dict, text: str) -> str:
+    rev = commit(upstream['work'], 'f.txt', text, text)
+    git("push", "--quiet", upstream['url'], "master", cwd=upstream['work'])
+    return rev
+
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('mode', GitMirror.MODES)
+def test_workspace_checks_out_with_submodules(upstream, mode):
+    mirror = GitMirror(upstream['url'], mirror_root=str(upstream['root'] / 'mirror'))
+    dest = str(upstream['root'] / f"ws-{mode}")
+
+    assert mirror.workspace(dest, mode=mode)
+    assert read(os.path.join(dest, 'f.txt')) == 'a'
+    assert read(os.path.join(dest, 'lib', 'lib.txt')) == 'lib'
+    if mode == 'shallow':
+        assert git("rev-list", "--count", "HEAD", cwd=dest) == "1"
+
+
+@pytest.mark.parametrize('mode', GitMirror.MODES)
+def test_workspace_moves_to_ref_and_follows_upstream(upstream, mode):
+    dest = str(upstream['root'] / f"ws-{mode}")
+    GitMirror(upstream['url'], mirror_root=str(upstream['root'] / 'mirror')).workspace(dest, mode=mode)
+
+    rev = push_commit(upstream, 'b')
+    mirror = GitMirror(upstream['url'], mirror_root=str(upstream['root'] / 'mirror'))
+    assert mirror.workspace(dest, mode=mode)
+    assert git("rev-parse", "HEAD", cwd=dest) == rev
+
+    assert mirror.workspace(dest, 'v1', mode=mode)
+    assert read(os.path.join(dest, 'f.txt')) == 'a'
+
+
+@pytest.mark.parametrize('mode', GitMirror.MODES)
+def test_workspace_keeps_local_edits(upstream, mode):
+    dest = str(upstream['root'] / f"ws-{mode}")
+    GitMirror(upstream['url'], mirror_root=str(upstream['root'] / 'mirror')).workspace(dest, mode=mode)
+    with open(os.path.join(dest, 'f.txt'), 'w') as f:
+        f.write('edited')
+
+    push_commit(upstream, 'b')
+    mirror = GitMirror(upstream['url'], mirror_root=str(upstream['root'] / 'mirror'))
+    assert not mirror.workspace(dest, mode=mode)
+    assert read(os.path.join(dest, 'f.txt')) == 'edited'
+
+    with pytest.raises(ValueError):
+        mirror.workspace(dest, 'v1', mode=mode)
+    assert read(os.path.join(dest, 'f.txt')) == 'edited'
+
+
+def test_unknown_mode(upstream):
+    with pytest.raises(ValueError):
+        GitMirror(upstream['url'], mirror_root=str(upstream['root'] / 'mirror')).workspace(str(upstream['root'] / 'ws'), mode='sparse')
@@ -0,0 +1,39 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import time
+
+import pytest
+
+from benchmarks import LocalServer
+from mirrors import Mirrors
+
+SIZE = 1024 * 1024
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def test_race_does_not_wait_for_a_stalled_mirror(server):
+    slow = f"{server.url}/{SIZE}?delay=3"
+    fast = f"{server.url}/{SIZE}"
+
+    start = time.perf_counter()
+    order = Mirrors([slow, fast, f"{server.url}/missing"], timeout=(5, 5)).race()
+    assert time.perf_counter() - start < 1.5
+
+    # the fastest first, the one still probing last as an untested fallback, the dead one left out
+    assert [m.url for m in order] == [fast, slow]
+    assert order[0].size == SIZE and order[0].ranges
+    assert order[1].latency is None
+
+
+def test_race_without_any_mirror(server):
+    with pytest.raises(ConnectionError):
+        Mirrors([f"{server.url}/missing"], timeout=(2, 2)).race()
@@ -0,0 +1,113 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+
+import pytest
+
+from package import Packager
+
+pytest.importorskip('pyzstd')
+
+MB = Packager.CHUNK_SIZE
+
+
+@pytest.fixture
+def dist(tmp_path):
+    root = tmp_path / 'dist'
+    (root / 'plugins').mkdir(parents=True)
+    (root / 'stremio.exe').write_bytes(os.urandom(MB // 2))
+    (root / 'Qt5Core.dll').write_bytes(os.urandom(3 * MB))
+    (root / 'plugins' / 'qjpeg.dll').write_bytes(os.urandom(1024))
+    (root / '.abs-stage.json').write_text('{}')
+    return root
+
+
+def tree(root) -> dict:
+    found = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename), 'rb') as f:
+                found[os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/')] = f.read()
+    return found
+
+
+def packaged(dist) -> dict:
+    return {rel: data for rel, data in tree(dist).items() if not rel.endswith(Packager.EXCLUDE)}
+
+
+def test_delta_rebuilds_a_changed_dll(dist, tmp_path):
+    out = tmp_path / 'packages'
+    first = Packager(str(dist), str(out), threads=1).package('stremio')
+    base = Packager.unpack(str(out / first['package']), str(tmp_path / 'base'))
+    assert tree(base) == packaged(dist)
+
+    # one chunk in the middle of the DLL changes
+    with open(dist / 'Qt5Core.dll', 'r+b') as f:
+        f.seek(MB + 100)
+        f.write(b'patched')
+
+    second = Packager(str(dist), str(out), threads=1).package('stremio')
+    assert second['delta_stats']['chunks'] == 1 and second['delta_stats']['bytes'] == MB
+
+    assert Packager.apply_delta(str(out / second['delta']), base, str(tmp_path / 'rebuilt')) == {'files': 3, 'removed': 0}
+    assert tree(tmp_path / 'rebuilt') == packaged(dist)
+
+
+def test_delta_removes_a_file_in_place(dist, tmp_path):
+    out = tmp_path / 'packages'
+    first = Packager(str(dist), str(out), threads=1).package('stremio')
+    base = Packager.unpack(str(out / first['package']), str(tmp_path / 'base'))
+
+    os.remove(dist / 'plugins' / 'qjpeg.dll')
+    second = Packager(str(dist), str(out), threads=1).package('stremio')
+    assert second['delta_stats']['chunks'] == 0
+
+    assert Packager.apply_delta(str(out / second['delta']), base, base) == {'files': 2, 'removed': 1}
+    assert tree(base) == packaged(dist)
+
+
+def test_delta_refuses_the_wrong_base(dist, tmp_path):
+    out = tmp_path / 'packages'
+    first = Packager(str(dist), str(out), threads=1).package('stremio')
+    base = Packager.unpack(str(out / first['package']), str(tmp_path / 'base'))
+    (dist / 'stremio.exe').write_bytes(os.urandom(MB // 2))
+    second = Packager(str(dist), str(out), threads=1).package('stremio')
+
+    with open(os.path.join(base, 'Qt5Core.dll'), 'r+b') as f:
+        f.write(b'not the base')
+    with pytest.raises(ValueError):
+        Packager.apply_delta(str(out / second['delta']), base, str(tmp_path / 'rebuilt'))
+    assert not os.path.exists(tmp_path / 'rebuilt' / 'Qt5Core.dll')
+
+
+def test_only_the_latest_package_and_newest_deltas_are_kept(dist, tmp_path):
+    out = tmp_path / 'packages'
+    results = []
+    for _ in range(5):
+        (dist / 'stremio.exe').write_bytes(os.urandom(MB // 2))
+        results.append(Packager(str(dist), str(out), threads=1, keep_deltas=2).package('stremio'))
+
+    latest = results[-1]
+    assert sorted(os.listdir(out)) == sorted([latest['package'], latest['manifest'], 'latest.json',
+                                              results[-2]['delta'], latest['delta']])
+    assert Packager(str(dist), str(out), keep_deltas=2).package('stremio') is None
+
+    # the kept delta still applies to the package it was made from
+    (dist / 'stremio.exe').write_bytes(os.urandom(MB // 2))
+    base = Packager.unpack(str(out / latest['package']), str(tmp_path / 'base'))
+    newer = Packager(str(dist), str(out), threads=1, keep_deltas=2).package('stremio')
+    assert newer['pruned'] == sorted([latest['package'], latest['manifest'], results[-2]['delta']])
+    Packager.apply_delta(str(out / newer['delta']), base, base)
+    assert tree(base) == packaged(dist)
+
+
+def test_pruning_can_be_turned_off(dist, tmp_path):
+    out = tmp_path / 'packages'
+    for _ in range(3):
+        (dist / 'stremio.exe').write_bytes(os.urandom(MB // 2))
+        Packager(str(dist), str(out), threads=1, keep_deltas=None).package('stremio')
+    assert len(os.listdir(out)) == 3 * 2 + 2 + 1
@@ -0,0 +1,106 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+
+import pytest
+import requests
+
+from benchmarks import LocalServer, PayloadHandler
+from helpers import Helpers
+
+SIZE = 4 * 1024 * 1024
+SEGMENTS = 4
+
+
+class VersionedHandler(PayloadHandler):
+    """
+    A PayloadHandler that tags the file with an ETag and honours If-Range, recording the ranges asked for.
+    """
+    etag = '"v1"'
+    ranges = True
+    requested = []
+
+    def respond(self, body: bool) -> None:
+        if self.command == 'GET': self.requested.append(self.headers.get('Range'))
+        # a server that ignores ranges, or whose file no longer matches If-Range, sends the whole file
+        if not self.ranges or self.headers.get('If-Range', self.etag) != self.etag:
+            del self.headers['Range']
+        super().respond(body)
+
+
+    def end_headers(self) -> None:
+        self.send_header('ETag', self.etag)
+        super().end_headers()
+
+
+@pytest.fixture
+def handler():
+    return type('Handler', (VersionedHandler,), {'payloads': {}, 'requested': []})
+
+
+@pytest.fixture
+def server(handler):
+    with LocalServer(handler) as server:
+        yield server
+
+
+def interrupted(server, out_file: str, validator: str = '"v1"') -> dict:
+    # every segment is cut off halfway, leaving the sidecar behind
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        Helpers.range_download('payload', f"{server.url}/{SIZE}?cut={SIZE // SEGMENTS // 2}", out_file, SIZE, SEGMENTS, validator=validator)
+    with open(f"{out_file}.part") as f:
+        return json.load(f)
+
+
+def test_resumes_from_the_sidecar(server, handler, tmp_path):
+    out_file = str(tmp_path / 'payload.bin')
+    state = interrupted(server, out_file)
+    assert all(0 < done < end - start + 1 for start, end, done in state['segments'])
+
+    handler.requested.clear()
+    assert Helpers.range_download('payload', f"{server.url}/{SIZE}", out_file, SIZE, SEGMENTS, validator='"v1"')
+    assert sorted(handler.requested) == sorted(f"bytes={start + done}-{end}" for start, end, done in state['segments'])
+    assert open(out_file, 'rb').read() == handler.payloads[SIZE]
+    assert not os.path.exists(f"{out_file}.part")
+
+
+def test_server_ignoring_ranges_falls_back_to_a_stream(server, handler, tmp_path):
+    handler.ranges = False
+    out_file = str(tmp_path / 'payload.bin')
+    assert not Helpers.range_download('payload', f"{server.url}/{SIZE}", out_file, SIZE, SEGMENTS)
+    assert not os.path.exists(out_file) and not os.path.exists(f"{out_file}.part")
+
+    # it still advertises Accept-Ranges, so download_file only finds out from the 200
+    Helpers.download_file(f"{server.url}/{SIZE}", 'payload.bin', is_archive=False, out_path=f"{tmp_path}{os.sep}", segments=SEGMENTS)
+    assert open(out_file, 'rb').read() == handler.payloads[SIZE]
+
+
+def test_changed_file_starts_over(server, handler, tmp_path):
+    out_file = str(tmp_path / 'payload.bin')
+    interrupted(server, out_file)
+
+    # a new version of the file went up in between
+    handler.etag = '"v2"'
+    handler.payloads[SIZE] = bytes(reversed(handler.payloads[SIZE]))
+    handler.requested.clear()
+    Helpers.download_file(f"{server.url}/{SIZE}", 'payload.bin', is_archive=False, out_path=f"{tmp_path}{os.sep}", segments=SEGMENTS)
+
+    step = SIZE // SEGMENTS
+    assert sorted(handler.requested) == sorted(f"bytes={start}-{start + step - 1}" for start in range(0, SIZE, step))
+    assert open(out_file, 'rb').read() == handler.payloads[SIZE]
+    assert not os.path.exists(f"{out_file}.part")
+
+
+def test_file_changing_mid_download_is_not_stitched(server, handler, tmp_path):
+    out_file = str(tmp_path / 'payload.bin')
+    interrupted(server, out_file)
+
+    # resuming with the old validator, the server sends the whole new file instead of the ranges
+    handler.etag = '"v2"'
+    assert not Helpers.range_download('payload', f"{server.url}/{SIZE}", out_file, SIZE, SEGMENTS, validator='"v1"')
+    assert not os.path.exists(out_file) and not os.path.exists(f"{out_file}.part")
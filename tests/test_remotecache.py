@@ -0,0 +1,115 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import hashlib
+
+import pytest
+
+from benchmarks import CacheHandler, LocalServer
+from package import Packager
+from remotecache import RemoteCache
+
+KEY = RemoteCache.key({'rev': 'abc123', 'server.js': '4.4.159', 'toolchain': {'qt': '5.12.7'}})
+
+
+class CountingCacheHandler(CacheHandler):
+    #  The paths PUT to, in order
+    puts = []
+
+    def do_PUT(self) -> None:
+        CountingCacheHandler.puts.append(self.path)
+        super().do_PUT()
+
+
+@pytest.fixture
+def cache():
+    CacheHandler.store.clear()
+    CountingCacheHandler.puts.clear()
+    with LocalServer(CountingCacheHandler) as server:
+        yield RemoteCache(f"{server.url}/stremio", level=3)
+    CacheHandler.store.clear()
+
+
+@pytest.fixture
+def dist(tmp_path):
+    dist = tmp_path / 'dist'
+    (dist / 'platforms').mkdir(parents=True)
+    (dist / 'stremio.exe').write_bytes(b'MZ' + os.urandom(300_000))
+    (dist / 'platforms' / 'qwindows.dll').write_bytes(b'qwindows' * 1000)
+    # machine local, never pushed
+    (dist / '.abs-stage.json').write_text('{}')
+    return dist
+
+
+def tree(path) -> dict:
+    found = {}
+    for root, _, names in os.walk(path):
+        for name in names:
+            full = os.path.join(root, name)
+            with open(full, 'rb') as f:
+                found[os.path.relpath(full, path)] = f.read()
+    return found
+
+
+def test_miss(cache, tmp_path):
+    assert cache.lookup(KEY) is None
+    assert cache.pull(KEY, str(tmp_path / 'pulled')) is None
+    assert not (tmp_path / 'pulled').exists()
+
+
+def test_push_then_pull(cache, dist, tmp_path):
+    entry = cache.push(KEY, str(dist), {'rev': 'abc123'})
+    assert entry['files'] == 2 and entry['parts'] == {'rev': 'abc123'}
+
+    # an older build in the way is replaced as a whole
+    pulled = tmp_path / 'pulled'
+    pulled.mkdir()
+    (pulled / 'stale.dll').write_bytes(b'old')
+
+    assert cache.pull(KEY, str(pulled)) == entry
+    expected = tree(dist)
+    del expected['.abs-stage.json']
+    assert tree(pulled) == expected
+
+
+def test_pull_rejects_a_package_that_does_not_match_its_hash(cache, dist, tmp_path):
+    entry = cache.push(KEY, str(dist))
+    blob = f"/stremio/cas/{entry['package']}"
+    CacheHandler.store[blob] = CacheHandler.store[blob][:-10] + b'0' * 10
+
+    pulled = tmp_path / 'pulled'
+    pulled.mkdir()
+    (pulled / 'stremio.exe').write_bytes(b'the local build')
+    with pytest.raises(ValueError):
+        cache.pull(KEY, str(pulled))
+
+    # the local build is left as it was, and nothing half unpacked is left next to it
+    assert tree(pulled) == {'stremio.exe': b'the local build'}
+    assert set(os.listdir(tmp_path)) == {'dist', 'pulled'}
+
+
+def test_push_of_a_stored_package_only_writes_the_entry(cache, dist):
+    entry = cache.push(KEY, str(dist))
+    assert CountingCacheHandler.puts == [f"/stremio/cas/{entry['package']}", f"/stremio/ac/{KEY}"]
+
+    other = RemoteCache.key({'rev': 'def456'})
+    CountingCacheHandler.puts.clear()
+    assert cache.push(other, str(dist))['package'] == entry['package']
+    assert CountingCacheHandler.puts == [f"/stremio/ac/{other}"]
+
+
+def test_push_reuses_a_written_package(cache, dist, tmp_path):
+    packager = Packager(str(dist), str(tmp_path / 'packages'), level=3)
+    result = packager.package('stremio-4.4.159')
+    package = os.path.join(packager.out_dir, result['package'])
+    with open(package, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    entry = cache.push(KEY, str(dist), package=package)
+    assert entry['package'] == digest and entry['files'] == 2
+    assert cache.pull(KEY, str(tmp_path / 'pulled'))['package'] == digest
+    assert (tmp_path / 'pulled' / 'stremio.exe').read_bytes() == (dist / 'stremio.exe').read_bytes()
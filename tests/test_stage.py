@@ -0,0 +1,104 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import json
+
+import pytest
+
+import stage
+from stage import Stager
+
+FILES = {
+    'stremio.exe': b'exe' * 1000,
+    'lib/libmpv-2.dll': os.urandom(64 * 1024),
+    'lib/plugins/qjpeg.dll': os.urandom(1024),
+}
+
+
+@pytest.fixture
+def src(tmp_path):
+    root = tmp_path / 'src'
+    for rel, data in FILES.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel).write_bytes(data)
+    return root
+
+
+def plan(src, dist, **kwargs) -> Stager:
+    stager = Stager(str(dist), **kwargs)
+    stager.add_tree(str(src), '.')
+    return stager
+
+
+def manifest(dist) -> dict:
+    with open(dist / '.abs-stage.json') as f:
+        return json.load(f)
+
+
+def test_stage_copies_and_records_the_manifest(src, tmp_path):
+    dist = tmp_path / 'dist'
+    assert plan(src, dist).stage() == {'copied': 3, 'skipped': 0, 'removed': 0, 'bytes': sum(map(len, FILES.values()))}
+
+    for rel, data in FILES.items():
+        assert (dist / rel).read_bytes() == data
+        entry = manifest(dist)[os.path.normpath(rel)]
+        assert entry['src'] == os.path.abspath(src / rel) and entry['size'] == len(data) and entry['how'] == 'copy'
+        # nothing is hashed until it has to be
+        assert 'sha256' not in entry
+
+
+def test_unchanged_files_are_skipped(src, tmp_path, monkeypatch):
+    dist = tmp_path / 'dist'
+    plan(src, dist).stage()
+
+    monkeypatch.setattr(Stager, 'place', lambda *args: pytest.fail("an unchanged file was placed again"))
+    assert plan(src, dist).stage() == {'copied': 0, 'skipped': 3, 'removed': 0}
+
+
+def test_touched_files_are_hashed_once(src, tmp_path):
+    dist = tmp_path / 'dist'
+    plan(src, dist).stage()
+
+    # a rebuild that wrote the same bytes
+    os.utime(src / 'stremio.exe', ns=(0, 0))
+    assert plan(src, dist).stage()['skipped'] == 3
+    assert manifest(dist)['stremio.exe']['sha256']
+
+    # same size, different bytes
+    (src / 'lib' / 'plugins' / 'qjpeg.dll').write_bytes(os.urandom(1024))
+    assert plan(src, dist).stage()['copied'] == 1
+    assert (dist / 'lib' / 'plugins' / 'qjpeg.dll').read_bytes() == (src / 'lib' / 'plugins' / 'qjpeg.dll').read_bytes()
+
+
+def test_files_no_longer_staged_are_removed(src, tmp_path):
+    dist = tmp_path / 'dist'
+    plan(src, dist).stage()
+    (dist / 'lib' / 'windeployqt.txt').write_text("not ours")
+
+    os.remove(src / 'lib' / 'plugins' / 'qjpeg.dll')
+    assert plan(src, dist).stage()['removed'] == 1
+    assert not os.path.exists(dist / 'lib' / 'plugins')
+    assert (dist / 'lib' / 'windeployqt.txt').exists()
+    assert os.path.normpath('lib/plugins/qjpeg.dll') not in manifest(dist)
+
+
+def test_hardlinks_large_files_and_falls_back_to_a_copy(src, tmp_path, monkeypatch):
+    dist = tmp_path / 'dist'
+    plan(src, dist, mode='hardlink', link_threshold=4096).stage()
+    assert os.path.samefile(dist / 'lib' / 'libmpv-2.dll', src / 'lib' / 'libmpv-2.dll')
+    assert not os.path.samefile(dist / 'lib' / 'plugins' / 'qjpeg.dll', src / 'lib' / 'plugins' / 'qjpeg.dll')
+
+    # ie. the build and dist directories are on different drives
+    def link(*args):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(stage.os, 'link', link)
+    fallback = tmp_path / 'fallback'
+    plan(src, fallback, mode='hardlink', link_threshold=4096).stage()
+    assert not os.path.samefile(fallback / 'lib' / 'libmpv-2.dll', src / 'lib' / 'libmpv-2.dll')
+    assert (fallback / 'lib' / 'libmpv-2.dll').read_bytes() == FILES['lib/libmpv-2.dll']
+    assert manifest(fallback)[os.path.normpath('lib/libmpv-2.dll')]['how'] == 'copy'
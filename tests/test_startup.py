@@ -0,0 +1,17 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+from benchmarks import Benchmarks
+
+
+def test_startup_stays_light():
+    # the best of a few runs, a busy machine should not fail the budget
+    runs = [Benchmarks.import_profile() for _ in range(3)]
+    seconds = min(run[0] for run in runs)
+    heavy = runs[-1][2]
+
+    assert heavy == [], f"abs.py --help loads {', '.join(heavy)}, which should only load when needed"
+    assert seconds * 1000 < Benchmarks.IMPORT_BUDGET_MS, f"abs.py spends {seconds * 1000:.1f}ms importing, over the {Benchmarks.IMPORT_BUDGET_MS:.0f}ms budget"
@@ -0,0 +1,73 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+from toolenv import ToolchainEnv
+
+pytestmark = pytest.mark.skipif(shutil.which('sh') is None, reason="needs a POSIX sh")
+
+
+@pytest.fixture
+def script(tmp_path):
+    script = tmp_path / 'setenv.sh'
+    # every run leaves a line in runs.log, so a capture served from the cache leaves none
+    script.write_text(f'echo run >> "{tmp_path / "runs.log"}"\nexport ABS_TOOLCHAIN=v1\n')
+    return script
+
+
+def runs(tmp_path) -> int:
+    log = tmp_path / 'runs.log'
+    return len(log.read_text().splitlines()) if log.exists() else 0
+
+
+def test_capture_is_cached_until_the_script_changes(script, tmp_path):
+    cache_dir = str(tmp_path / 'env-cache')
+
+    env = ToolchainEnv(str(script), cache_dir=cache_dir).load()
+    assert env['ABS_TOOLCHAIN'] == 'v1'
+    assert runs(tmp_path) == 1
+
+    # a new instance, as on the next startup, reads the disk cache
+    assert ToolchainEnv(str(script), cache_dir=cache_dir).load()['ABS_TOOLCHAIN'] == 'v1'
+    assert runs(tmp_path) == 1
+
+    script.write_text(script.read_text().replace('v1', 'v2.0'))
+    assert ToolchainEnv(str(script), cache_dir=cache_dir).load()['ABS_TOOLCHAIN'] == 'v2.0'
+    assert runs(tmp_path) == 2
+
+
+def test_parent_environment_change_is_captured_again(script, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'env-cache')
+    monkeypatch.setenv('ABS_PARENT', 'a')
+    assert ToolchainEnv(str(script), cache_dir=cache_dir).load()['ABS_PARENT'] == 'a'
+
+    monkeypatch.setenv('ABS_PARENT', 'b')
+    assert ToolchainEnv(str(script), cache_dir=cache_dir).load()['ABS_PARENT'] == 'b'
+    assert runs(tmp_path) == 2
+
+    monkeypatch.delenv('ABS_PARENT')
+    assert 'ABS_PARENT' not in ToolchainEnv(str(script), cache_dir=cache_dir).load()
+    assert runs(tmp_path) == 3
+
+
+def test_run_uses_the_captured_environment(script, tmp_path):
+    env = ToolchainEnv(str(script), cache_dir=str(tmp_path / 'env-cache'))
+    sp = env.run([sys.executable, '-c', "import os; print(os.environ['ABS_TOOLCHAIN'])"], stdout=subprocess.PIPE)
+    assert sp.stdout.decode().strip() == 'v1'
+
+
+def test_failing_script(tmp_path):
+    script = tmp_path / 'broken.sh'
+    script.write_text('exit 3\n')
+    with pytest.raises(RuntimeError):
+        ToolchainEnv(str(script), cache_dir=str(tmp_path / 'env-cache')).load()
+    # nothing is cached for a failed capture
+    assert not (tmp_path / 'env-cache').exists()
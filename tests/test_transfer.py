@@ -0,0 +1,61 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+import hashlib
+
+import pytest
+import requests
+
+from benchmarks import LocalServer, PayloadHandler
+from helpers import Helpers
+
+SIZE = 4 * 1024 * 1024
+
+
+@pytest.fixture(scope='module')
+def server():
+    with LocalServer() as server:
+        yield server
+
+
+def test_download_file_whole_body(server, tmp_path):
+    hasher = hashlib.sha256()
+    Helpers.download_file(f"{server.url}/{SIZE}", 'payload.bin', is_archive=False, out_path=f"{tmp_path}{os.sep}", hasher=hasher)
+    assert os.path.getsize(tmp_path / 'payload.bin') == SIZE
+    assert hasher.hexdigest() == hashlib.sha256(PayloadHandler.payloads[SIZE]).hexdigest()
+
+
+def test_download_file_refuses_truncated_body(server, tmp_path):
+    # the server promises SIZE bytes and closes the connection halfway
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        Helpers.download_file(f"{server.url}/{SIZE}?cut={SIZE // 2}", 'payload.bin', is_archive=False, out_path=f"{tmp_path}{os.sep}")
+
+
+def test_download_file_unknown_length(server, tmp_path):
+    Helpers.download_file(f"{server.url}/{SIZE}?chunked=1", 'payload.bin', is_archive=False, out_path=f"{tmp_path}{os.sep}")
+    assert os.path.getsize(tmp_path / 'payload.bin') == SIZE
+
+
+class CountingHandler(PayloadHandler):
+    #  A handler is set up once per accepted connection
+    connections = 0
+
+    def setup(self) -> None:
+        CountingHandler.connections += 1
+        super().setup()
+
+
+def test_downloads_reuse_one_connection(tmp_path):
+    from downloader import DownloadManager
+
+    session = DownloadManager.make_session(4)
+    with LocalServer(CountingHandler) as server:
+        for i, query in enumerate(['', '?chunked=1', '']):
+            Helpers.download_file(f"{server.url}/{SIZE}{query}", f'payload{i}.bin', is_archive=False, out_path=f"{tmp_path}{os.sep}",
+                                  session=session, segments=1)
+            assert os.path.getsize(tmp_path / f'payload{i}.bin') == SIZE
+    assert CountingHandler.connections == 1
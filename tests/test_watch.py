@@ -0,0 +1,68 @@
+# Title:    Stremio Windows Build Script
+# Author:   ShoobyDoo
+# Date:     2023-03-13
+# Edited:   2023-03-18
+# Version:  0.1.0
+
+import os
+
+import pytest
+
+from depends import Depends
+from watch import InotifyWatcher, PollingWatcher, WatchSession, Watcher
+
+WATCHERS = [
+    PollingWatcher,
+    pytest.param(InotifyWatcher, marks=pytest.mark.skipif(not InotifyWatcher.available(), reason="inotify is linux only")),
+]
+
+
+@pytest.fixture
+def src(tmp_path):
+    src = tmp_path / 'stremio-shell'
+    (src / 'src').mkdir(parents=True)
+    (src / 'stremio.pro').write_text("VERSION=4.4.160\n")
+    (src / 'src' / 'main.cpp').write_text("int main() {}\n")
+    return src
+
+
+def make_watcher(cls, src):
+    return cls([str(src)], interval=0.05) if cls is PollingWatcher else cls([str(src)])
+
+
+def test_watcher_is_abstract():
+    with pytest.raises(TypeError):
+        Watcher(['.'])
+
+
+@pytest.mark.parametrize('cls', WATCHERS)
+def test_watcher_reports_changes(cls, src):
+    watcher = make_watcher(cls, src)
+    try:
+        assert watcher.poll(0.1) == set()
+
+        (src / 'src' / 'main.cpp').write_text("int main() { return 1; }\n")
+        (src / 'server.js').write_text("// server\n")
+        assert watcher.wait(debounce=0.2) == {str(src / 'src' / 'main.cpp'), str(src / 'server.js')}
+
+        # files in new directories and removed files are seen, excluded names are not
+        (src / 'src' / 'ui').mkdir()
+        (src / 'src' / 'ui' / 'main.qml').write_text("Item {}\n")
+        (src / 'stremio.pro').unlink()
+        (src / 'main.cpp.swp').write_text("")
+        (src / 'abs-dist-win').mkdir()
+        (src / 'abs-dist-win' / 'stremio.exe').write_text("")
+        assert watcher.wait(debounce=0.2) == {str(src / 'src' / 'ui' / 'main.qml'), str(src / 'stremio.pro')}
+    finally:
+        watcher.close()
+
+
+def test_affected_steps(src, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session = WatchSession(Depends(), str(src))
+    session.graph = session.depends.build_graph(session.src_dir, session.dist_dir)
+
+    # clone and package never run in watch mode
+    assert session.affected({str(src / 'server.js')}) == {'stage', 'windeployqt'}
+    assert session.affected({str(src / 'src' / 'main.cpp')}) == {'cmake', 'stage', 'windeployqt'}
+    assert session.affected({str(src / 'stremio.pro')}) == {'server.js', 'cmake', 'stage', 'windeployqt'}